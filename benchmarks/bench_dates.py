@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Date and datetime parsing and formatting: strptime/strftime vs the codec's fixed-format functions.
+
+Usage: python benchmarks/bench_dates.py [number]
+"""
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tes.codec import (  # noqa: E402
+    DATE_FORMAT, DATETIME_FORMAT,
+    format_date, format_datetime, parse_date, parse_datetime,
+)
+
+# A quote response repeats a handful of distinct dates (birth dates, segment times) many times.
+DATES = ['19{:02d}-{:02d}-{:02d}'.format(70 + i % 30, 1 + i % 12, 1 + i % 28) for i in range(64)]
+DATETIMES = ['2020-07-{:02d}T{:02d}:{:02d}:00'.format(1 + i % 28, i % 24, i % 60) for i in range(64)]
+
+
+def run(name, fn, items, number):
+    elapsed = timeit.timeit(lambda: [fn(o) for o in items], number=number)
+    per_item = elapsed / number / len(items) * 1e9
+    print('{:<34} {:8.0f} ns/op'.format(name, per_item))
+    return per_item
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    dates = [parse_date(s) for s in DATES]
+    datetimes = [parse_datetime(s) for s in DATETIMES]
+    pairs = (
+        ('parse date', DATES,
+         lambda s: datetime.datetime.strptime(s, DATE_FORMAT).date(), parse_date),
+        ('parse datetime', DATETIMES,
+         lambda s: datetime.datetime.strptime(s, DATETIME_FORMAT), parse_datetime),
+        ('parse datetime, no memo', DATETIMES,
+         lambda s: datetime.datetime.strptime(s, DATETIME_FORMAT), parse_datetime.__wrapped__),
+        ('format date', dates,
+         lambda d: d.strftime(DATE_FORMAT), format_date),
+        ('format datetime', datetimes,
+         lambda d: d.strftime(DATETIME_FORMAT), format_datetime),
+    )
+    for name, items, slow, fast in pairs:
+        baseline = run(name + ' (stdlib)', slow, items, number)
+        optimized = run(name + ' (codec)', fast, items, number)
+        print('{:<34} {:8.2f}x'.format('speedup', baseline / optimized))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Decoding throughput of a large QuoteResponse: reflective decode vs compiled decoders.
+
+The lazy decoder is measured reading only policy_id, rate and status of each policy.
+
+Usage: python benchmarks/bench_decode.py [policies]
+"""
+import copy
+import datetime
+import json
+import numbers
+import os
+import sys
+import timeit
+from decimal import Decimal
+from enum import Enum
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tes import BaseModel, QuoteResponse, lazy  # noqa: E402
+from tes.codec import get_list_args  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', 'tests', 'test_api_responses', 'quote', 'quote.json')
+
+
+def reflective_decode(cls, dct):
+    """BaseModel.decode as it was before the compiled decoders."""
+    def cast(json_value, target_type):
+        if json_value is None:
+            return None
+        if target_type == Decimal:
+            return Decimal(json_value)
+        if isinstance(json_value, bool) or isinstance(json_value, numbers.Number):
+            return json_value
+        if isinstance(json_value, str):
+            if target_type == datetime.date:
+                return datetime.datetime.strptime(json_value, '%Y-%m-%d').date()
+            if target_type == datetime.datetime:
+                return datetime.datetime.strptime(json_value, '%Y-%m-%dT%H:%M:%S')
+            if issubclass(target_type, Enum):
+                return target_type[json_value]
+            return json_value
+        if issubclass(target_type, BaseModel):
+            return reflective_decode(target_type, json_value)
+        raise NotImplementedError
+
+    params = {}
+    for attr_name, attr_type in cls.__attrs__.items():
+        type_args = get_list_args(attr_type)
+        if len(type_args):
+            params[attr_name] = [cast(o, type_args[0]) for o in dct.get(attr_name, [])]
+        else:
+            params[attr_name] = cast(dct.get(attr_name), attr_type)
+    return cls(**params)
+
+
+def large_quote(policies):
+    with open(FIXTURE, encoding='utf-8') as f:
+        resp = json.load(f)
+    sample = resp['quotes'][0]['policies']
+    resp['quotes'][0]['policies'] = [copy.deepcopy(sample[i % len(sample)]) for i in range(policies)]
+    return resp
+
+
+def lazy_partial_read(resp):
+    quote_response = lazy(QuoteResponse).decode(resp)
+    for quote in quote_response.quotes:
+        for policy in quote.policies:
+            policy.policy_id, policy.rate, policy.status
+    return quote_response
+
+
+def main():
+    policies = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    resp = large_quote(policies)
+    number = 20
+    results = {}
+    for name, fn in (('reflective', lambda: reflective_decode(QuoteResponse, resp)),
+                     ('compiled', lambda: QuoteResponse.decode(resp)),
+                     ('lazy', lambda: lazy_partial_read(resp))):
+        fn()  # warm up, compiles decoders
+        results[name] = min(timeit.repeat(fn, number=number, repeat=5)) / number
+        print('{:<12} {:8.2f} ms/decode {:10.0f} policies/s'.format(
+            name, results[name] * 1e3, policies / results[name]))
+    print('speedup: {:.2f}x, lazy partial read: {:.2f}x'.format(
+        results['reflective'] / results['compiled'], results['reflective'] / results['lazy']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Memory taken by a large decoded policy set: regular models vs compact (slotted) models.
+
+Usage: python benchmarks/bench_memory.py [policies]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tes import QuoteResponse, slotted  # noqa: E402
+from bench_decode import large_quote  # noqa: E402
+
+
+def measure(cls, resp):
+    gc.collect()
+    tracemalloc.start()
+    decoded = cls.decode(resp)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del decoded
+    return size
+
+
+def main():
+    policies = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    resp = large_quote(policies)
+    # Compile decoders outside of the measurements.
+    QuoteResponse.decode(large_quote(1))
+    slotted(QuoteResponse).decode(large_quote(1))
+    results = {}
+    for name, cls in (('regular', QuoteResponse), ('slotted', slotted(QuoteResponse))):
+        results[name] = measure(cls, resp)
+        print('{:<8} {:8.2f} MiB {:8.0f} bytes/policy'.format(
+            name, results[name] / 2 ** 20, results[name] / policies))
+    print('saving: {:.0%}'.format(1 - results['slotted'] / results['regular']))
+
+
+if __name__ == '__main__':
+    main()
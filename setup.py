@@ -1,9 +1,6 @@
 # -*- coding: utf-8 -*-
 from setuptools import setup
 import os
-import sys
-if sys.version_info[0] < 3:
-    from io import open
 
 here = os.path.abspath(os.path.dirname(__file__))
 
@@ -12,9 +9,11 @@ packages = ['tes']
 requires = [
     'requests>=2.21.0, <3',
 ]
-if sys.version_info[0] < 3:
-    requires.append('enum34>=1.0, <2')
-    requires.append('typing>=3.5, <4')
+extras = {
+    'async': ['aiohttp>=3.6, <4'],
+    'orjson': ['orjson>=3, <4'],
+    'ujson': ['ujson>=4, <6'],
+}
 test_requirements = [
     'pytest>=5.4',
 ]
@@ -40,7 +39,9 @@ setup(
     packages=packages,
     package_dir={'tes': 'tes'},
     include_package_data=True,
+    python_requires='>=3.7',
     install_requires=requires,
+    extras_require=extras,
     license=about['__license__'],
     zip_safe=False,
     classifiers=[
@@ -48,10 +49,7 @@ setup(
         'Intended Audience :: Developers',
         'Natural Language :: English',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
     ],
@@ -4,7 +4,8 @@ from .__version__ import (
     __author__, __author_email__, __license__
 )
 
-from .client import AlfaStrahTESClient, MultiJSONEncoder
+from .client import AlfaStrahTESClient, ApiResult, MultiJSONEncoder
+from .async_client import AsyncAlfaStrahTESClient, AiohttpTransport, TransportResponse
 from .models import (
     BaseModel, ApiRequest, ApiProblem,
     InsuranceProduct, Amount, PolicyStatus, Operator,
@@ -17,9 +18,24 @@ from .models import (
     QuoteRequest, QuoteResponse, Quote, CreateRequest,
     CreateResponse, UpdateRequest, UpdateResponse, ConfirmRequest,
     SaleWithoutInsuranceRequest, SaleWithoutInsuranceResponse, ServiceClass, SportKind,
-    CancellationType,
+    CancellationType, lazy, slotted, memoized, memoize, frozen, freeze,
+)
+from .cache import TTLCache, QuoteCache, CacheBackend, LRUCacheBackend
+from .serializers import (
+    Serializer, StdlibSerializer, OrjsonSerializer, UjsonSerializer,
+    get_serializer,
+)
+from .retry import RetryPolicy
+from .deadline import Deadline
+from .breaker import CircuitBreaker, CircuitState
+from .hedging import HedgingPolicy
+from .singleflight import SingleFlight, AsyncSingleFlight
+from .ratelimit import RateLimiter
+from .pipeline import PolicyPipeline, AsyncPolicyPipeline
+from .exceptions import (
+    TESException, AuthErrorException, TransportErrorException, ConnectErrorException,
+    DeadlineExceededException, CircuitOpenException, RateLimitExceededException,
 )
-from .exceptions import TESException, AuthErrorException
 
 # Set default logging handler to avoid "No handler found" warnings.
 import logging
@@ -0,0 +1,528 @@
+# -*- coding: utf-8 -*-
+
+"""
+tes.async_client
+~~~~~~~~~~~~~~~~
+
+This module contains the asyncio client of TES API.
+"""
+import asyncio
+import itertools
+import time
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from .client import BaseClient, DEFAULT_POOL_MAXSIZE, DEFAULT_TIMEOUT, IDEMPOTENT_METHODS, succeeded
+from .deadline import Deadline
+from .exceptions import TESException, ConnectErrorException, DeadlineExceededException, TransportErrorException
+from .singleflight import AsyncSingleFlight
+from .models import (
+    Amount, ConfirmRequest, CreateRequest, CreateResponse, InsuranceProduct,
+    Policy, QuoteRequest, QuoteResponse,
+)
+
+
+class TransportResponse(object):
+    """HTTP response returned by an async transport."""
+
+    def __init__(self, status_code, content, headers=None):
+        """Init.
+
+        :param status_code: HTTP status code, e.g. 200.
+        :type status_code: int
+        :param content: Response body.
+        :type content: bytes
+        :param headers: Response headers.
+        :type headers: Mapping or None
+        """
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers if headers is not None else {}
+
+
+def is_connect_timeout(e):
+    """Returns True if the given aiohttp error is a timeout of connecting, so the request surely wasn't sent."""
+    connection_timeout_error = getattr(aiohttp, 'ConnectionTimeoutError', None)
+    if connection_timeout_error is not None:
+        return isinstance(e, connection_timeout_error)
+    # Before aiohttp 3.10 a connect timeout is a ServerTimeoutError told apart by its message only.
+    return isinstance(e, aiohttp.ServerTimeoutError) and str(e).startswith('Connection timeout')
+
+
+class AiohttpTransport(object):
+    """Async HTTP transport on top of a pooled :class:`aiohttp.ClientSession`.
+
+    Any object with the same ``request()`` and ``close()`` coroutines can be used as a transport
+    of :class:`AsyncAlfaStrahTESClient`.
+    """
+
+    def __init__(self, limit=DEFAULT_POOL_MAXSIZE, keepalive_timeout=15):
+        """Init.
+
+        :param limit: Maximum number of simultaneous connections.
+        :type limit: int
+        :param keepalive_timeout: Time in seconds to keep an idle connection open.
+        :type keepalive_timeout: float
+        """
+        if aiohttp is None:
+            raise ImportError('aiohttp is required for AiohttpTransport, install it with "pip install tes[async]"')
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+
+    def _get_session(self):
+        # The session binds to the running event loop, so it is created on first use.
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def request(self, method, url, headers=None, params=None, data=None, verify=True, timeout=None):
+        """Sends a request.
+
+        :param timeout: Connect and read timeouts in seconds.
+        :type timeout: tuple[float, float] or None
+        :return: HTTP response.
+        :rtype: TransportResponse
+        """
+        if params:
+            params = {k: str(v) for k, v in params.items()}
+        if timeout is not None:
+            timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        session = self._get_session()
+        try:
+            async with session.request(method, url, headers=headers, params=params, data=data,
+                                       ssl=None if verify else False, timeout=timeout) as r:
+                content = await r.read()
+                return TransportResponse(r.status, content, r.headers)
+        except aiohttp.ClientConnectorError as e:
+            raise ConnectErrorException(str(e) or type(e).__name__)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if is_connect_timeout(e):
+                raise ConnectErrorException(str(e) or type(e).__name__)
+            raise TransportErrorException(str(e) or type(e).__name__)
+
+    async def close(self):
+        """Closes pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncAlfaStrahTESClient(BaseClient):
+    """Asyncio client of TES API, the coroutine twin of :class:`AlfaStrahTESClient`."""
+
+    def __init__(self, api_key, verify_ssl=True, transport=None, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 serializer=None, keep_raw_response=False, products_cache=None, quote_cache=None,
+                 compact=False, lazy=False, retry=None, timeout=DEFAULT_TIMEOUT, circuit_breaker=None,
+                 hedging=None, single_flight=False, rate_limiter=None):
+        """Init.
+
+        :param api_key: API key.
+        :type api_key: str
+        :param verify_ssl: Verify the server's TLS certificate, default: true.
+        :type verify_ssl: bool
+        :param transport: (optional) Async HTTP transport, see :class:`AiohttpTransport`.
+            The client doesn't close a transport it was given.
+        :type transport: AiohttpTransport or None
+        :param pool_maxsize: Maximum number of simultaneous connections, ignored if `transport` is specified.
+        :type pool_maxsize: int
+        :param serializer: (optional) JSON backend or its name, e.g. 'orjson', see :func:`get_serializer`.
+        :type serializer: Serializer or str or None
+        :param keep_raw_response: Keep JSON API response in :attr:`ApiResult.resp` of successful calls.
+        :type keep_raw_response: bool
+        :param products_cache: (optional) Cache of :meth:`get_products` results keyed by product type.
+        :type products_cache: TTLCache or None
+        :param quote_cache: (optional) Cache of :meth:`quote` results.
+        :type quote_cache: QuoteCache or None
+        :param compact: Decode API responses into compact models, see :func:`slotted`.
+        :type compact: bool
+        :param lazy: Decode API responses lazily, see :func:`lazy`.
+        :type lazy: bool
+        :param retry: (optional) Retry policy of failed calls, see :class:`RetryPolicy`.
+        :type retry: RetryPolicy or None
+        :param timeout: Connect and read timeouts in seconds of each attempt, a number sets both of them.
+        :type timeout: float or tuple[float, float] or None
+        :param circuit_breaker: (optional) Circuit breaker of API endpoints, see :class:`CircuitBreaker`.
+        :type circuit_breaker: CircuitBreaker or None
+        :param hedging: (optional) Hedging policy of :meth:`quote`, :meth:`get_policy` and :meth:`get_products`,
+            see :class:`HedgingPolicy`. The losing request is cancelled.
+        :type hedging: HedgingPolicy or None
+        :param single_flight: Concurrent identical idempotent calls share one HTTP round trip
+            and the same decoded result, which must not be modified.
+            A call that ran out of its caller's deadline is made again by the others, see :class:`SingleFlight`.
+        :type single_flight: bool
+        :param rate_limiter: (optional) Client-side rate limiter of every attempt, see :class:`RateLimiter`.
+        :type rate_limiter: RateLimiter or None
+        """
+        BaseClient.__init__(self, api_key, verify_ssl=verify_ssl, serializer=serializer,
+                            keep_raw_response=keep_raw_response, compact=compact, lazy=lazy, retry=retry,
+                            timeout=timeout, circuit_breaker=circuit_breaker, hedging=hedging,
+                            rate_limiter=rate_limiter)
+        self.pool_maxsize = pool_maxsize
+        self.products_cache = products_cache
+        self.quote_cache = quote_cache
+        self._own_transport = transport is None
+        self.transport = transport if transport is not None else AiohttpTransport(limit=pool_maxsize)
+        self.single_flight = AsyncSingleFlight() if single_flight else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """Releases pooled connections held by the client's own transport."""
+        if self._own_transport:
+            await self.transport.close()
+
+    async def send(self, method, path,
+                   params=None, data=None, resp_cls=None, idempotent=None, timeout=None, deadline=None,
+                   hedge=False):
+        """Constructs and sends a request to API Gateway.
+
+        See :meth:`AlfaStrahTESClient.send`.
+        Unlike the sync client, an attempt in flight is cancelled when the deadline passes.
+
+        :rtype: ApiResult
+        """
+        req = self.encode_request(data)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        deadline = Deadline.coerce(deadline)
+        if self.single_flight is not None and idempotent:
+            return await self.single_flight.do(
+                self.make_call_key(method, path, params, req, resp_cls),
+                lambda: self._send(method, path, params, req, resp_cls, idempotent, timeout, deadline, hedge),
+                timeout=deadline.remaining() if deadline is not None else None)
+        return await self._send(method, path, params, req, resp_cls, idempotent, timeout, deadline, hedge)
+
+    async def _send(self, method, path, params, req, resp_cls, idempotent, timeout, deadline, hedge):
+        """Sends a request, repeating failed attempts according to the retry policy."""
+        send_once = self._send_hedged if hedge and idempotent and self.hedging is not None else self._send_once
+        attempt = 1
+        while True:
+            if deadline is not None:
+                deadline.check()
+            try:
+                result = await send_once(method, path, params, req, resp_cls, timeout, deadline)
+            except TransportErrorException as e:
+                if deadline is not None and deadline.expired:
+                    raise DeadlineExceededException(str(e))
+                delay = self.get_retry_delay(attempt, idempotent, error=e, deadline=deadline)
+                if delay is None:
+                    raise
+            else:
+                delay = self.get_retry_delay(attempt, idempotent, result=result, deadline=deadline)
+                if delay is None:
+                    result.attempts = attempt
+                    return result
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _send_once(self, method, path, params, req, resp_cls, timeout, deadline, sending=None, hedged=False):
+        endpoint = self.get_endpoint(path)
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async(endpoint, self.get_rate_limit_timeout(deadline))
+        timeout = self.make_timeout(timeout, deadline)
+        self.before_attempt(endpoint)
+        if sending is not None:
+            sending.set()
+        started = time.monotonic()
+        coro = self.transport.request(method, self.make_url(path),
+                                      headers=self.make_headers(), params=params, data=req,
+                                      verify=self.verify_ssl, timeout=timeout)
+        try:
+            if deadline is None:
+                r = await coro
+            else:
+                try:
+                    r = await asyncio.wait_for(coro, deadline.remaining())
+                except asyncio.TimeoutError:
+                    raise DeadlineExceededException('Deadline exceeded')
+            result = self.make_result(method, path, params, req, r, resp_cls, time.monotonic() - started)
+        except BaseException as e:
+            self.after_attempt(endpoint, error=e, hedged=hedged)
+            raise
+        self.after_attempt(endpoint, result=result, hedged=hedged)
+        return result
+
+    async def _send_hedged(self, method, path, params, req, resp_cls, timeout, deadline):
+        args = (method, path, params, req, resp_cls, timeout, deadline)
+        sending = asyncio.Event()
+        first = asyncio.ensure_future(self._send_once(*args, sending=sending, hedged=True))
+        first.add_done_callback(lambda _: sending.set())
+        tasks = [first]
+        try:
+            # The delay counts from the moment the request is sent, see AlfaStrahTESClient._send_hedged.
+            await sending.wait()
+            done, _ = await asyncio.wait(tasks, timeout=self.hedging.get_delay(self.get_endpoint(path)))
+            if done or not self.hedging.start_hedge():
+                return await first
+            hedged = asyncio.ensure_future(self._send_once(*args, hedged=True))
+            hedged.add_done_callback(lambda _: self.hedging.finish_hedge())
+            tasks.append(hedged)
+            # The first successful response wins, or the first failure if both requests failed.
+            winner = None
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if task in done and (winner is None or not succeeded(winner) and succeeded(task)):
+                        winner = task
+                if succeeded(winner):
+                    break
+            self.hedging.record_hedge(won=winner is hedged)
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def request(self, method, path,
+                      params=None, data=None, resp_cls=None, idempotent=None, timeout=None, deadline=None,
+                      hedge=False):
+        """Constructs and sends a request to API Gateway.
+
+        See :meth:`AlfaStrahTESClient.request`.
+        """
+        result = await self.send(method, path, params=params, data=data, resp_cls=resp_cls, idempotent=idempotent,
+                                 timeout=timeout, deadline=deadline, hedge=hedge)
+        result.raise_for_error()
+        return result.data
+
+    async def get_products(self, product_type=None, timeout=None, deadline=None):
+        """Returns list of available insurance products.
+
+        See :meth:`AlfaStrahTESClient.get_products`.
+
+        :rtype: list[InsuranceProduct]
+        """
+        if self.products_cache is not None:
+            return list(await self.products_cache.get_async(
+                product_type, lambda: self._get_products(product_type, timeout=timeout, deadline=deadline),
+                refresh_loader=lambda: self._get_products(product_type, timeout=timeout)))
+        return await self._get_products(product_type, timeout=timeout, deadline=deadline)
+
+    async def _get_products(self, product_type, timeout=None, deadline=None):
+        if product_type:
+            path = '/products/{type}'.format(type=product_type)
+        else:
+            path = '/products'
+        products = await self.request('GET', path, resp_cls=InsuranceProduct, timeout=timeout, deadline=deadline,
+                                      hedge=True)
+        return products
+
+    async def quote(self, session_id=None, product=None, insureds=None,
+                    segments=None, booking_price=None, currency=None, service_class=None,
+                    country=None, sport=None, fare_type=None, luggage_type=None,
+                    fare_code=None, manager_name=None, manager_code=None, opt=None,
+                    selling_page=None, end_date=None, acquisition_channel=None, timeout=None, deadline=None):
+        """Calculates the cost of one or more insurance policies.
+
+        See :meth:`AlfaStrahTESClient.quote`.
+
+        :rtype: QuoteResponse
+        """
+        quote_request = QuoteRequest(
+            session_id=session_id, product=product, insureds=insureds,
+            segments=segments, booking_price=booking_price, currency=currency, service_class=service_class,
+            country=country, sport=sport, fare_type=fare_type, luggage_type=luggage_type,
+            fare_code=fare_code, manager_name=manager_name, manager_code=manager_code, opt=opt,
+            selling_page=selling_page, end_date=end_date, acquisition_channel=acquisition_channel
+        )
+        return await self.quote_one(quote_request, timeout=timeout, deadline=deadline)
+
+    async def quote_one(self, quote_request, timeout=None, deadline=None):
+        """Calculates the cost of insurance policies for the given quote request.
+
+        See :meth:`AlfaStrahTESClient.quote_one`.
+
+        :rtype: QuoteResponse
+        """
+        path = '/policies/quote'
+        if self.quote_cache is None:
+            return await self.request('POST', path, data=quote_request, resp_cls=QuoteResponse, idempotent=True,
+                                      timeout=timeout, deadline=deadline, hedge=True)
+        key = self.quote_cache.make_key(quote_request)
+        if self.quote_cache.serves(quote_request):
+            content = self.quote_cache.get(key)
+            if content is not None:
+                return self.decode_cached_quote(content, quote_request)
+        result = await self.send('POST', path, data=quote_request, resp_cls=QuoteResponse, idempotent=True,
+                                 timeout=timeout, deadline=deadline, hedge=True)
+        result.raise_for_error()
+        self.quote_cache.set(key, result.content)
+        return result.data
+
+    async def quote_many(self, quote_requests, max_concurrency=None, timeout=None, deadline=None):
+        """Calculates the cost of insurance policies for several quote requests concurrently.
+
+        See :meth:`AlfaStrahTESClient.quote_many`.
+
+        :rtype: list[QuoteResponse or TESException]
+        """
+        deadline = Deadline.coerce(deadline)
+        return await self._map(lambda quote_request: self.quote_one(quote_request, timeout=timeout, deadline=deadline),
+                               quote_requests, max_concurrency)
+
+    async def _map(self, fn, items, max_concurrency=None):
+        """Awaits the given coroutine function for every item concurrently, capturing :class:`TESException`."""
+        semaphore = asyncio.Semaphore(max_concurrency or self.pool_maxsize)
+
+        async def call(item):
+            async with semaphore:
+                try:
+                    return await fn(item)
+                except TESException as e:
+                    return e
+
+        return list(await asyncio.gather(*(call(item) for item in items)))
+
+    async def _imap_unordered(self, fn, items, max_concurrency=None):
+        """Awaits the given coroutine function for every item concurrently, yielding
+        (item, result or :class:`TESException`) in order of completion.
+
+        See :meth:`AlfaStrahTESClient._imap_unordered`.
+        """
+        limit = max_concurrency or self.pool_maxsize
+        items = iter(items)
+        in_flight = {}
+
+        async def call(item):
+            try:
+                return await fn(item)
+            except TESException as e:
+                return e
+
+        def submit(n):
+            for item in itertools.islice(items, n):
+                in_flight[asyncio.ensure_future(call(item))] = item
+
+        try:
+            submit(limit)
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                completed = [(in_flight.pop(task), task.result()) for task in done]
+                submit(len(done))
+                for item_result in completed:
+                    yield item_result
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def create(self, insureds, session_id=None, product=None,
+                     insurer=None, segments=None, booking_price=None, currency=None,
+                     discounted_rate=None, service_class=None, pnr=None, customer_email=None,
+                     customer_phone=None, payment_type=None, sale_session=None, country=None,
+                     issuance_city=None, sport=None, fare_type=None, luggage_type=None,
+                     fare_code=None, manager_name=None, manager_code=None, begin_date=None,
+                     end_date=None, external_id=None, opt=None, selling_page=None,
+                     acquisition_channel=None, timeout=None, deadline=None):
+        """Creates one or more insurance policies.
+
+        See :meth:`AlfaStrahTESClient.create`.
+
+        :rtype: CreateResponse
+        """
+        path = '/policies'
+        create_request = CreateRequest(
+            insureds, session_id=session_id, product=product, insurer=insurer,
+            segments=segments, booking_price=booking_price, currency=currency, discounted_rate=discounted_rate,
+            service_class=service_class, pnr=pnr, customer_email=customer_email, customer_phone=customer_phone,
+            payment_type=payment_type, sale_session=sale_session, country=country, issuance_city=issuance_city,
+            sport=sport, fare_type=fare_type, luggage_type=luggage_type, fare_code=fare_code,
+            manager_name=manager_name, manager_code=manager_code, begin_date=begin_date, end_date=end_date,
+            external_id=external_id, opt=opt, selling_page=selling_page, acquisition_channel=acquisition_channel
+        )
+        resp = await self.request('POST', path, data=create_request, resp_cls=CreateResponse,
+                                  idempotent=external_id is not None, timeout=timeout, deadline=deadline)
+        return resp
+
+    async def confirm(self, policy_id, session_id=None, timeout=None, deadline=None):
+        """Confirms insurance policy.
+
+        See :meth:`AlfaStrahTESClient.confirm`.
+
+        :rtype: bool
+        """
+        path = '/policies/{policy_id}/confirm'.format(policy_id=policy_id)
+        confirm_request = ConfirmRequest(session_id=session_id)
+        # Confirming a policy already confirmed by a lost attempt fails instead of returning True.
+        _ = await self.request('PUT', path, data=confirm_request, idempotent=False, timeout=timeout,
+                                 deadline=deadline)
+        return True
+
+    async def confirm_many(self, policy_ids, session_id=None, max_concurrency=None, timeout=None, deadline=None):
+        """Confirms several insurance policies concurrently.
+
+        See :meth:`AlfaStrahTESClient.confirm_many`.
+
+        :rtype: list[tuple[int, bool or TESException]]
+        """
+        policy_ids = list(policy_ids)
+        deadline = Deadline.coerce(deadline)
+        outcomes = await self._map(
+            lambda policy_id: self.confirm(policy_id, session_id=session_id, timeout=timeout, deadline=deadline),
+            policy_ids, max_concurrency)
+        return list(zip(policy_ids, outcomes))
+
+    async def cancel(self, policy_id,
+                     type=None, is_ext_id=None, local_date_time=None, body=None, timeout=None, deadline=None):
+        """Cancel insurance policy.
+
+        See :meth:`AlfaStrahTESClient.cancel`.
+
+        :rtype: Amount
+        """
+        params = self.make_cancel_params(type=type, is_ext_id=is_ext_id, local_date_time=local_date_time)
+        path = '/policies/{policy_id}'.format(policy_id=policy_id)
+        resp = await self.request('DELETE', path, data=body, params=params, resp_cls=Amount, idempotent=False,
+                                  timeout=timeout, deadline=deadline)
+        return resp
+
+    async def cancel_many(self, policy_ids, type=None, is_ext_id=None, local_date_time=None, body=None,
+                          max_concurrency=None, timeout=None, deadline=None):
+        """Cancels several insurance policies concurrently.
+
+        See :meth:`AlfaStrahTESClient.cancel_many`.
+
+        :rtype: list[tuple[int or str, Amount or TESException]]
+        """
+        policy_ids = list(policy_ids)
+        deadline = Deadline.coerce(deadline)
+        outcomes = await self._map(
+            lambda policy_id: self.cancel(policy_id, type=type, is_ext_id=is_ext_id, local_date_time=local_date_time,
+                                          body=body, timeout=timeout, deadline=deadline),
+            policy_ids, max_concurrency)
+        return list(zip(policy_ids, outcomes))
+
+    async def get_policy(self, policy_id, is_ext_id=None, timeout=None, deadline=None):
+        """Retrieves insurance policy info by the given id.
+
+        See :meth:`AlfaStrahTESClient.get_policy`.
+
+        :rtype: Policy
+        """
+        params = {'is_ext_id': is_ext_id} if is_ext_id is not None else None
+        path = '/policies/{policy_id}'.format(policy_id=policy_id)
+        policy = await self.request('GET', path, params=params, resp_cls=Policy, timeout=timeout, deadline=deadline,
+                                    hedge=True)
+        return policy
+
+    async def get_policies(self, policy_ids, max_concurrency=None, is_ext_id=None, timeout=None, deadline=None):
+        """Retrieves insurance policies by the given ids concurrently, yielding them as they arrive.
+
+        See :meth:`AlfaStrahTESClient.get_policies`, usage: ``async for policy_id, policy in client.get_policies(ids)``.
+
+        :rtype: AsyncIterator[tuple[int or str, Policy or TESException]]
+        """
+        deadline = Deadline.coerce(deadline)
+        async for item_result in self._imap_unordered(
+                lambda policy_id: self.get_policy(policy_id, is_ext_id=is_ext_id, timeout=timeout, deadline=deadline),
+                policy_ids, max_concurrency):
+            yield item_result
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""
+tes.breaker
+~~~~~~~~~~~
+
+This module contains the circuit breaker of API endpoints.
+"""
+import threading
+import time
+from enum import Enum
+
+from .exceptions import CircuitOpenException
+
+
+class CircuitState(Enum):
+    """State of a circuit."""
+
+    # Calls pass through, failures are counted.
+    CLOSED = 'CLOSED'
+    # Calls fail fast with CircuitOpenException.
+    OPEN = 'OPEN'
+    # A limited number of trial calls pass through, their outcome closes or opens the circuit again.
+    HALF_OPEN = 'HALF_OPEN'
+
+
+class _Circuit(object):
+    __slots__ = ('state', 'failures', 'opened_at', 'trials', 'stats')
+
+    def __init__(self):
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trials = 0
+        self.stats = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+
+class CircuitBreaker(object):
+    """Circuit breaker with a separate circuit for every endpoint, e.g. '/policies/quote'.
+
+    A circuit opens after `failure_threshold` consecutive failed calls, i.e. transport errors
+    or responses with a server error status. While it is open, calls of the endpoint fail fast
+    with :class:`CircuitOpenException`. After `recovery_timeout` seconds the circuit becomes half-open
+    and lets `half_open_max_calls` trial calls through: a successful trial closes the circuit,
+    a failed one opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, half_open_max_calls=1,
+                 failure_status_codes=None, clock=time.monotonic):
+        """Init.
+
+        :param failure_threshold: Number of consecutive failures that opens a circuit.
+        :type failure_threshold: int
+        :param recovery_timeout: Time in seconds a circuit stays open before trial calls are let through.
+        :type recovery_timeout: float
+        :param half_open_max_calls: Maximum number of trial calls in flight while a circuit is half-open.
+        :type half_open_max_calls: int
+        :param failure_status_codes: (optional) HTTP status codes counted as failures,
+            default: 429 and all server errors.
+        :type failure_status_codes: Iterable[int] or None
+        :param clock: Function returning current time in seconds.
+        :type clock: callable
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.failure_status_codes = frozenset(failure_status_codes) if failure_status_codes is not None else None
+        self.clock = clock
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def _get_circuit(self, endpoint):
+        circuit = self._circuits.get(endpoint)
+        if circuit is None:
+            circuit = self._circuits[endpoint] = _Circuit()
+        return circuit
+
+    def _update_state(self, circuit):
+        if circuit.state == CircuitState.OPEN and self.clock() - circuit.opened_at >= self.recovery_timeout:
+            circuit.state = CircuitState.HALF_OPEN
+            circuit.trials = 0
+
+    def _open(self, circuit):
+        circuit.state = CircuitState.OPEN
+        circuit.opened_at = self.clock()
+        circuit.stats['opened'] += 1
+
+    def is_failure_status(self, status_code):
+        """Returns True if a response with the given status code is counted as a failure."""
+        if status_code is None:
+            return False
+        if self.failure_status_codes is not None:
+            return status_code in self.failure_status_codes
+        return status_code == 429 or status_code >= 500
+
+    def before_call(self, endpoint):
+        """Lets a call of the given endpoint through, or raises :class:`CircuitOpenException`.
+
+        Every call let through must be followed by :meth:`record_success`, :meth:`record_failure`
+        or :meth:`record_cancel`.
+        """
+        with self._lock:
+            circuit = self._get_circuit(endpoint)
+            self._update_state(circuit)
+            if circuit.state == CircuitState.CLOSED:
+                return
+            if circuit.state == CircuitState.HALF_OPEN and circuit.trials < self.half_open_max_calls:
+                circuit.trials += 1
+                return
+            circuit.stats['rejected'] += 1
+        raise CircuitOpenException('Circuit is open for {}'.format(endpoint))
+
+    def record_success(self, endpoint):
+        """Records a successful call of the given endpoint."""
+        with self._lock:
+            circuit = self._get_circuit(endpoint)
+            circuit.stats['successes'] += 1
+            circuit.failures = 0
+            if circuit.state == CircuitState.HALF_OPEN:
+                circuit.state = CircuitState.CLOSED
+                circuit.trials = 0
+
+    def record_failure(self, endpoint):
+        """Records a failed call of the given endpoint."""
+        with self._lock:
+            circuit = self._get_circuit(endpoint)
+            circuit.stats['failures'] += 1
+            circuit.failures += 1
+            if circuit.state == CircuitState.HALF_OPEN:
+                self._open(circuit)
+            elif circuit.state == CircuitState.CLOSED and circuit.failures >= self.failure_threshold:
+                self._open(circuit)
+
+    def record_cancel(self, endpoint):
+        """Records a call of the given endpoint that was abandoned before its outcome was known."""
+        with self._lock:
+            circuit = self._get_circuit(endpoint)
+            if circuit.state == CircuitState.HALF_OPEN and circuit.trials > 0:
+                circuit.trials -= 1
+
+    def state(self, endpoint):
+        """Returns state of the circuit of the given endpoint.
+
+        :rtype: CircuitState
+        """
+        with self._lock:
+            circuit = self._get_circuit(endpoint)
+            self._update_state(circuit)
+            return circuit.state
+
+    def is_open(self, endpoint):
+        """Returns True if calls of the given endpoint fail fast, e.g. to skip an optional upsell."""
+        return self.state(endpoint) == CircuitState.OPEN
+
+    def reset(self, endpoint=None):
+        """Closes the circuit of the given endpoint, or all circuits if not specified."""
+        with self._lock:
+            if endpoint is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(endpoint, None)
+
+    @property
+    def stats(self):
+        """State and counters of every circuit, keyed by endpoint.
+
+        :rtype: dict
+        """
+        with self._lock:
+            stats = {}
+            for endpoint, circuit in self._circuits.items():
+                self._update_state(circuit)
+                stats[endpoint] = dict(circuit.stats, state=circuit.state.name,
+                                       consecutive_failures=circuit.failures)
+            return stats
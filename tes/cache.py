@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+
+"""
+tes.cache
+~~~~~~~~~
+
+This module contains in-process caches of API responses.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from .codec import encode_value, is_frozen
+
+
+class TTLCache(object):
+    """In-process cache with time-to-live and stale-while-revalidate refresh.
+
+    A value is fresh for `ttl` seconds after it was loaded. During the following `stale_ttl` seconds
+    the stale value is still returned, while a fresh one is loaded in the background.
+    After that the value is loaded again on the caller's critical path.
+    """
+
+    def __init__(self, ttl=3600, stale_ttl=None, clock=time.monotonic):
+        """Init.
+
+        :param ttl: Time in seconds a loaded value is fresh.
+        :type ttl: float
+        :param stale_ttl: Time in seconds a stale value is served while it is refreshed in background,
+            default: `ttl`. Zero disables background refresh.
+        :type stale_ttl: float or None
+        :param clock: Function returning current time in seconds.
+        :type clock: callable
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl if stale_ttl is not None else ttl
+        self.clock = clock
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._entries = {}
+        self._refreshing = set()
+        # The event loop keeps only weak references to tasks, a refresh in background must not be collected.
+        self._refresh_tasks = set()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        """Returns (found, value, refresh) for the given key and updates the counters."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, loaded_at = entry
+                age = self.clock() - loaded_at
+                if age < self.ttl:
+                    self.hits += 1
+                    return True, value, False
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    refresh = key not in self._refreshing
+                    self._refreshing.add(key)
+                    return True, value, refresh
+            self.misses += 1
+            return False, None, False
+
+    def get(self, key, loader, refresh_loader=None):
+        """Returns cached value of the given key, loading it with `loader()` if needed.
+
+        :param key: Cache key.
+        :param loader: Function returning value of the key.
+        :type loader: callable
+        :param refresh_loader: (optional) Function used to refresh a stale value in background, default: `loader`.
+            Unlike `loader`, it must not be bound to the caller, e.g. to the caller's deadline.
+        :type refresh_loader: callable or None
+        """
+        found, value, refresh = self._lookup(key)
+        if refresh:
+            thread = threading.Thread(target=self._refresh, args=(key, refresh_loader or loader))
+            thread.daemon = True
+            thread.start()
+        if found:
+            return value
+        value = loader()
+        self.set(key, value)
+        return value
+
+    async def get_async(self, key, loader, refresh_loader=None):
+        """Coroutine version of :meth:`get`, `loader` and `refresh_loader` are coroutine functions."""
+        found, value, refresh = self._lookup(key)
+        if refresh:
+            task = asyncio.ensure_future(self._refresh_async(key, refresh_loader or loader))
+            self._refresh_tasks.add(task)
+            task.add_done_callback(self._refresh_tasks.discard)
+        if found:
+            return value
+        value = await loader()
+        self.set(key, value)
+        return value
+
+    def _refresh(self, key, loader):
+        try:
+            value = loader()
+        except Exception:
+            self._refreshed(key, failed=True)
+        else:
+            self.set(key, value)
+            self._refreshed(key)
+
+    async def _refresh_async(self, key, loader):
+        try:
+            value = await loader()
+        except Exception:
+            self._refreshed(key, failed=True)
+        else:
+            self.set(key, value)
+            self._refreshed(key)
+
+    def _refreshed(self, key, failed=False):
+        with self._lock:
+            self._refreshing.discard(key)
+            if failed:
+                self.refresh_errors += 1
+            else:
+                self.refreshes += 1
+
+    def set(self, key, value):
+        """Stores value of the given key."""
+        with self._lock:
+            self._entries[key] = (value, self.clock())
+
+    def invalidate(self, key=None):
+        """Removes the given key from the cache, or all keys if not specified."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    @property
+    def stats(self):
+        """Cache counters.
+
+        :rtype: dict
+        """
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+        }
+
+
+class CacheBackend(object):
+    """Storage of a cache that can be shared by several processes, e.g. on top of Redis or memcached.
+
+    Keys are strings and values are bytes.
+    """
+
+    def get(self, key):
+        """Returns value of the given key, or None if there is no such key or it has expired.
+
+        :rtype: bytes or None
+        """
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        """Stores value of the given key for `ttl` seconds."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Removes the given key."""
+        raise NotImplementedError
+
+    def clear(self):
+        """Removes all keys."""
+        raise NotImplementedError
+
+
+class LRUCacheBackend(CacheBackend):
+    """In-process cache storage, bounded by the number of keys with least recently used eviction."""
+
+    def __init__(self, maxsize=1024, clock=time.monotonic):
+        """Init.
+
+        :param maxsize: Maximum number of keys.
+        :type maxsize: int
+        :param clock: Function returning current time in seconds.
+        :type clock: callable
+        """
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, self.clock() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class QuoteCache(object):
+    """Cache of quote responses keyed by canonical form of :class:`QuoteRequest`.
+
+    Raw response bodies are stored, so every hit is decoded into new model instances.
+    Keys of frozen requests, see :func:`tes.models.frozen`, are computed once and looked up by the request itself.
+    """
+
+    def __init__(self, ttl=300, maxsize=1024, backend=None, ignore_session_id=False, prefix='tes:quote:'):
+        """Init.
+
+        :param ttl: Time in seconds a quote response is cached.
+        :type ttl: float
+        :param maxsize: Maximum number of cached responses, ignored if `backend` is specified.
+        :type maxsize: int
+        :param backend: (optional) Cache storage shared by several processes, :class:`LRUCacheBackend` by default.
+        :type backend: CacheBackend or None
+        :param ignore_session_id: Requests that differ in session id only share the same cached response,
+            which is returned with the session id of the request. Requests without session id are sent to the API,
+            so they get a session id issued by the server.
+        :type ignore_session_id: bool
+        :param prefix: Prefix of the cache keys.
+        :type prefix: str
+        """
+        self.ttl = ttl
+        self.backend = backend if backend is not None else LRUCacheBackend(maxsize)
+        self.ignore_session_id = ignore_session_id
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def make_key(self, quote_request):
+        """Returns stable hash of the given request, the same in every process.
+
+        :type quote_request: QuoteRequest
+        :rtype: str
+        """
+        if not is_frozen(quote_request):
+            return self._make_key(quote_request)
+        with self._lock:
+            key = self._keys.get(quote_request)
+            if key is not None:
+                self._keys.move_to_end(quote_request)
+                return key
+        key = self._make_key(quote_request)
+        with self._lock:
+            self._keys[quote_request] = key
+            if len(self._keys) > self._maxsize:
+                self._keys.popitem(last=False)
+        return key
+
+    def _make_key(self, quote_request):
+        dct = encode_value(quote_request)
+        if self.ignore_session_id:
+            # The dict may be the memoized fragment of the request, see :func:`tes.models.memoized`.
+            dct = dict(dct)
+            dct.pop('session_id', None)
+        canonical = json.dumps(dct, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return self.prefix + hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def serves(self, quote_request):
+        """Returns True if a cached response can be returned for the given request, see `ignore_session_id`.
+
+        :type quote_request: QuoteRequest
+        :rtype: bool
+        """
+        return not self.ignore_session_id or quote_request.session_id is not None
+
+    def get(self, key):
+        """Returns cached response body of the given key.
+
+        :rtype: bytes or None
+        """
+        content = self.backend.get(key)
+        with self._lock:
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return content
+
+    def set(self, key, content):
+        """Stores response body of the given key."""
+        self.backend.set(key, content, self.ttl)
+
+    def invalidate(self, quote_request=None):
+        """Removes response of the given request from the cache, or all responses if not specified."""
+        if quote_request is None:
+            self.backend.clear()
+        else:
+            self.backend.delete(self.make_key(quote_request))
+
+    @property
+    def stats(self):
+        """Cache counters.
+
+        :rtype: dict
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -1,14 +1,24 @@
 # -*- coding: utf-8 -*-
-import datetime
-from decimal import Decimal
-from enum import Enum
+import itertools
 import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
 
-from .exceptions import TESException, AuthErrorException
+from .codec import encode_value, format_datetime
+from .deadline import Deadline
+from .exceptions import (
+    TESException, AuthErrorException, ConnectErrorException, DeadlineExceededException,
+    TransportErrorException,
+)
+from .serializers import get_serializer
+from .singleflight import SingleFlight
 from .models import (
-    ApiRequest, ApiProblem, InsuranceProduct,
+    ApiRequest, ApiProblem, BaseModel, InsuranceProduct,
     Person, Policy, Segment, Amount,
     ServiceClass, SportKind, FareType, Opt,
     AcquisitionChannel, CancellationType, Declaration,
@@ -17,33 +27,611 @@ from .models import (
     ConfirmRequest, CreateRequest, CreateResponse, QuoteRequest,
     QuoteResponse,
 )
+from .models import lazy, slotted
 
 DEFAULT_CURRENCY = 'RUB'
 DEFAULT_COUNTRY = 'RU'
 DEFAULT_MANAGER = 'AlfaStrahTESClient'
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_TIMEOUT = (10, 60)
+
+# Repeating a request with one of these methods has the same effect as sending it once.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+
+class ApiResult(object):
+    """Result of a single API call: request, response, status and timing."""
+
+    def __init__(self, method, path, params=None, req=None,
+                 status_code=None, headers=None, content=None, resp=None, data=None, elapsed=None, attempts=1):
+        """Init.
+
+        :param method: HTTP method, e.g. 'GET'.
+        :type method: str
+        :param path: API path, e.g. '/products'.
+        :type path: str
+        :param params: Query parameters.
+        :type params: Dict or None
+        :param req: Serialized request body.
+        :type req: bytes or None
+        :param status_code: HTTP status code, e.g. 200.
+        :type status_code: int or None
+        :param headers: Response headers.
+        :type headers: Mapping or None
+        :param content: Response body.
+        :type content: bytes or None
+        :param resp: JSON API response.
+            Kept for failed calls, or if the client was asked to keep raw responses.
+        :type resp: dict or list or None
+        :param data: Decoded API response, e.g. :class:`Policy`.
+        :param elapsed: Time in seconds between sending the request and parsing the response.
+        :type elapsed: float or None
+        :param attempts: Number of attempts made, see :class:`RetryPolicy`.
+        :type attempts: int
+        """
+        self.method = method
+        self.path = path
+        self.params = params
+        self.req = req
+        self.status_code = status_code
+        self.headers = headers if headers is not None else {}
+        self.content = content
+        self.resp = resp
+        self.data = data
+        self.elapsed = elapsed
+        self.attempts = attempts
 
+    @property
+    def ok(self):
+        """True if the call succeeded."""
+        return self.status_code is None or self.status_code == 200
+
+    def raise_for_error(self):
+        """Raises :class:`TESException`, if the call failed."""
+        BaseClient.raise_for_status(self.status_code, self.resp)
+
+
+class BaseClient(object):
+    """Base of the TES API clients: request building and error handling shared by sync and async clients."""
 
-class AlfaStrahTESClient:
     api_host = 'https://vesta.alfastrah.ru'
     base_path = '/travel-ext-services/api/v2'
 
-    def __init__(self, api_key, verify_ssl=True):
+    def __init__(self, api_key, verify_ssl=True, serializer=None, keep_raw_response=False,
+                 compact=False, lazy=False, retry=None, timeout=DEFAULT_TIMEOUT, circuit_breaker=None,
+                 hedging=None, rate_limiter=None):
+        if compact and lazy:
+            raise ValueError('compact and lazy decoding can\'t be used together')
         self.api_key = api_key
         self.verify_ssl = verify_ssl
-        self.req = self.resp = self.status_code = None
+        self.serializer = get_serializer(serializer)
+        self.keep_raw_response = keep_raw_response
+        self.compact = compact
+        self.lazy = lazy
+        self.retry = retry
+        self.timeout = timeout
+        self.circuit_breaker = circuit_breaker
+        self.hedging = hedging
+        self.rate_limiter = rate_limiter
 
-    def raise_for_error(self):
-        """Raises stored :class:`TESException`, if one occurred."""
-        if self.status_code is None or self.status_code == 200:
+    @staticmethod
+    def get_endpoint(path):
+        """Returns endpoint of the given API path, e.g. '/policies' for '/policies/21684956/confirm'.
+
+        Calls of the same endpoint share a circuit of the circuit breaker.
+        """
+        if path.startswith('/policies/quote'):
+            return '/policies/quote'
+        return '/' + path.lstrip('/').split('/', 1)[0]
+
+    @staticmethod
+    def make_call_key(method, path, params, req, resp_cls):
+        """Returns key of a call, identical calls in flight share the same HTTP round trip, see `single_flight`."""
+        return method, path, tuple(sorted(params.items())) if params else None, req, resp_cls
+
+    @staticmethod
+    def get_rate_limit_timeout(deadline):
+        """Returns maximum time in seconds an attempt may wait for the rate limiter, see :meth:`RateLimiter.reserve`."""
+        return deadline.remaining() if deadline is not None else None
+
+    def before_attempt(self, endpoint):
+        """Raises :class:`CircuitOpenException` if the circuit of the given endpoint is open."""
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.before_call(endpoint)
+
+    def after_attempt(self, endpoint, result=None, error=None, hedged=False):
+        """Records outcome of an attempt in the circuit breaker, and its latency for the hedging policy.
+
+        :param result: Result of the attempt.
+        :type result: ApiResult or None
+        :param error: Error the attempt raised, e.g. asyncio.CancelledError.
+        :type error: BaseException or None
+        :param hedged: The attempt belongs to a hedged call. Only latencies of successful attempts of hedged calls
+            are recorded, so slow writes and fast errors of the same endpoint don't skew the hedge delay.
+        :type hedged: bool
+        """
+        if self.hedging is not None and hedged and result is not None and result.ok:
+            self.hedging.record(endpoint, result.elapsed)
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return
+        if error is not None:
+            # An attempt abandoned at the caller's deadline says nothing about the endpoint health.
+            if isinstance(error, TESException) and not isinstance(error, DeadlineExceededException):
+                breaker.record_failure(endpoint)
+            else:
+                breaker.record_cancel(endpoint)
+        elif breaker.is_failure_status(result.status_code):
+            breaker.record_failure(endpoint)
+        else:
+            breaker.record_success(endpoint)
+
+    def make_timeout(self, timeout=None, deadline=None):
+        """Returns connect and read timeouts of an attempt.
+
+        :param timeout: Timeout of the call, default: client's `timeout`.
+        :type timeout: float or tuple[float, float] or None
+        :param deadline: Deadline of the call, the timeouts are cut to the time left before it.
+        :type deadline: Deadline or None
+        :rtype: tuple[float, float] or None
+        :raises DeadlineExceededException: If the deadline has passed.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if timeout is not None and not isinstance(timeout, tuple):
+            timeout = (timeout, timeout)
+        if deadline is not None:
+            return deadline.cap(timeout if timeout is not None else (None, None))
+        return timeout
+
+    def get_retry_delay(self, attempt, idempotent, result=None, error=None, deadline=None):
+        """Returns delay in seconds before the next attempt of a failed call, or None to give up.
+
+        :param attempt: Number of the failed attempt, starting from 1.
+        :type attempt: int
+        :param idempotent: The call can be safely repeated after it was processed.
+        :type idempotent: bool
+        :param result: Result of the failed attempt.
+        :type result: ApiResult or None
+        :param error: Error the failed attempt raised.
+        :type error: TESException or None
+        :param deadline: Deadline of the call, there is no next attempt if the delay doesn't end before it.
+        :type deadline: Deadline or None
+        :rtype: float or None
+        """
+        if self.retry is None:
+            return None
+        if error is not None:
+            delay = self.retry.get_delay(attempt, idempotent, error=error)
+        elif result.ok:
+            return None
+        else:
+            delay = self.retry.get_delay(attempt, idempotent, status_code=result.status_code, headers=result.headers)
+        if delay is not None and deadline is not None and delay >= deadline.remaining():
+            return None
+        return delay
+
+    def response_class(self, resp_cls):
+        """Returns the class API responses of the given class are decoded into, see `compact` and `lazy`."""
+        if isinstance(resp_cls, type) and issubclass(resp_cls, BaseModel):
+            if self.compact:
+                return slotted(resp_cls)
+            if self.lazy:
+                return lazy(resp_cls)
+        return resp_cls
+
+    def make_url(self, path):
+        """Returns URL of the given API path."""
+        return '{api_host}{base_path}{path}'.format(api_host=self.api_host, base_path=self.base_path, path=path)
+
+    def make_headers(self):
+        """Returns HTTP headers sent with every request."""
+        return {
+            'X-API-Key': self.api_key,
+            'Content-Type': 'application/json',
+        }
+
+    @staticmethod
+    def make_cancel_params(type=None, is_ext_id=None, local_date_time=None):
+        """Returns query parameters of the cancel request."""
+        params = dict()
+        if type is not None:
+            params['type'] = type.name
+        if is_ext_id is not None:
+            params['is_ext_id'] = is_ext_id
+        if local_date_time is not None:
+            params['local_date_time'] = format_datetime(local_date_time)
+        return params
+
+    def encode_request(self, data):
+        """Serializes request body.
+
+        :param data: Request body.
+        :type data: ApiRequest or None
+        :rtype: bytes or None
+        """
+        return self.serializer.dumps(data) if data is not None else None
+
+    def parse_response(self, content):
+        """Parses response body once.
+
+        :param content: Response body.
+        :type content: bytes
+        :return: JSON Python object or None, if the body is not JSON.
+        """
+        try:
+            return self.serializer.loads(content)
+        except ValueError:
+            return None
+
+    def decode_cached_quote(self, content, quote_request):
+        """Decodes the cached quote response of the given request.
+
+        Requests that differ in session id only share the cached response if the cache ignores session ids,
+        so the session id of the response is replaced with the one of the request, see :meth:`QuoteCache.serves`.
+
+        :param content: Cached response body.
+        :type content: bytes
+        :param quote_request: Quote request.
+        :type quote_request: QuoteRequest
+        :rtype: QuoteResponse
+        """
+        resp = decode_response(self.parse_response(content), self.response_class(QuoteResponse))
+        if self.quote_cache.ignore_session_id:
+            resp.session_id = quote_request.session_id
+        return resp
+
+    def make_result(self, method, path, params, req, r, resp_cls, elapsed):
+        """Makes the result of an API call from the given HTTP response.
+
+        :param r: HTTP response, e.g. :class:`requests.Response`.
+        :param resp_cls: Response class, see :meth:`AlfaStrahTESClient.request`.
+        :type resp_cls: class or None
+        :rtype: ApiResult
+        """
+        resp = self.parse_response(r.content)
+        result = ApiResult(method, path, params=params, req=req,
+                           status_code=r.status_code, headers=r.headers, content=r.content, resp=resp,
+                           elapsed=elapsed)
+        if not result.ok:
+            return result
+        if resp_cls is not None:
+            result.data = decode_response(resp, self.response_class(resp_cls))
+            if not self.keep_raw_response:
+                result.resp = None
+        else:
+            result.data = resp
+        return result
+
+    @staticmethod
+    def raise_for_status(status_code, resp):
+        """Raises :class:`TESException` if the given status code is an error.
+
+        :param status_code: HTTP status code.
+        :type status_code: int or None
+        :param resp: JSON API response.
+        :type resp: dict or None
+        """
+        if status_code is None or status_code == 200:
             return
-        api_problem = ApiProblem(**self.resp) if self.resp is not None else ApiProblem()
-        if self.status_code == 401:
+        api_problem = ApiProblem(**resp) if isinstance(resp, dict) else ApiProblem()
+        if status_code == 401:
             raise AuthErrorException(api_problem.detail or 'Unauthorized')
         else:
             raise TESException(api_problem.detail or 'Unknown problem')
 
+
+class AlfaStrahTESClient(BaseClient):
+    """TES API client.
+
+    The client is thread-safe: every call makes its own :class:`ApiResult`.
+    The `req`, `resp` and `status_code` attributes are a compatibility view of the last result
+    in the current thread.
+    """
+
+    def __init__(self, api_key, verify_ssl=True, session=None,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 keep_raw_response=False, serializer=None, track_last_result=True, products_cache=None,
+                 quote_cache=None, compact=False, lazy=False, retry=None, timeout=DEFAULT_TIMEOUT,
+                 circuit_breaker=None, hedging=None, single_flight=False, rate_limiter=None):
+        """Init.
+
+        :param api_key: API key.
+        :type api_key: str
+        :param verify_ssl: Verify the server's TLS certificate, default: true.
+        :type verify_ssl: bool
+        :param session: (optional) HTTP session used to send requests.
+            Any object providing ``request()`` and ``close()`` in the manner of :class:`requests.Session`
+            can be used, e.g. a local stand-in in tests. The client doesn't close a session it was given.
+            If not specified, a keep-alive session with a pooled :class:`HTTPAdapter` is created.
+        :type session: requests.Session or None
+        :param pool_connections: Number of connection pools to cache, ignored if `session` is specified.
+        :type pool_connections: int
+        :param pool_maxsize: Maximum number of connections to keep in a pool, ignored if `session` is specified.
+        :type pool_maxsize: int
+        :param keep_raw_response: Keep JSON API response in `resp` even when it was decoded into models.
+            The raw response of a failed request is always kept for error reporting.
+        :type keep_raw_response: bool
+        :param serializer: (optional) JSON backend or its name, e.g. 'orjson', see :func:`get_serializer`.
+            The standard :mod:`json` backend is used by default.
+        :type serializer: Serializer or str or None
+        :param track_last_result: Keep the last result of each thread
+            for the `last_result`, `req`, `resp` and `status_code` attributes, default: true.
+        :type track_last_result: bool
+        :param products_cache: (optional) Cache of :meth:`get_products` results keyed by product type,
+            e.g. ``TTLCache(ttl=3600)``.
+        :type products_cache: TTLCache or None
+        :param quote_cache: (optional) Cache of :meth:`quote` results, see :class:`QuoteCache`.
+        :type quote_cache: QuoteCache or None
+        :param compact: Decode API responses into compact models, see :func:`slotted`.
+        :type compact: bool
+        :param lazy: Decode API responses lazily, attributes are cast on first access, see :func:`lazy`.
+            Can't be used together with `compact`.
+        :type lazy: bool
+        :param retry: (optional) Retry policy of failed calls, e.g. ``RetryPolicy(max_attempts=3)``.
+            Calls are not retried by default.
+        :type retry: RetryPolicy or None
+        :param timeout: Connect and read timeouts in seconds of each attempt, a number sets both of them.
+            None disables the timeouts.
+        :type timeout: float or tuple[float, float] or None
+        :param circuit_breaker: (optional) Circuit breaker of API endpoints, see :class:`CircuitBreaker`.
+            Calls of an endpoint with an open circuit fail fast with :class:`CircuitOpenException`.
+        :type circuit_breaker: CircuitBreaker or None
+        :param hedging: (optional) Hedging policy of :meth:`quote`, :meth:`get_policy` and :meth:`get_products`,
+            see :class:`HedgingPolicy`. A running request can't be interrupted, so the response of the losing one
+            is discarded when it arrives. Hedged attempts run on up to 2 * `pool_maxsize` worker threads,
+            calls made while all of them are busy are sent without hedging.
+        :type hedging: HedgingPolicy or None
+        :param single_flight: Concurrent identical idempotent calls, e.g. polling of the same policy,
+            share one HTTP round trip and the same decoded result, which must not be modified.
+            A call that ran out of its caller's deadline is made again by the others, see :class:`SingleFlight`.
+        :type single_flight: bool
+        :param rate_limiter: (optional) Client-side rate limiter of every attempt, see :class:`RateLimiter`.
+            It can be shared by several clients.
+        :type rate_limiter: RateLimiter or None
+        """
+        BaseClient.__init__(self, api_key, verify_ssl=verify_ssl, serializer=serializer,
+                            keep_raw_response=keep_raw_response, compact=compact, lazy=lazy, retry=retry,
+                            timeout=timeout, circuit_breaker=circuit_breaker, hedging=hedging,
+                            rate_limiter=rate_limiter)
+        self.pool_maxsize = pool_maxsize
+        self.track_last_result = track_last_result
+        self.products_cache = products_cache
+        self.quote_cache = quote_cache
+        self._own_session = session is None
+        self.session = session if session is not None else self.create_session(pool_connections, pool_maxsize)
+        self._local = threading.local()
+        self._hedge_executor = None
+        self._hedge_executor_lock = threading.Lock()
+        # Free workers of the hedge executor, calls never queue for a worker.
+        self._hedge_workers = threading.BoundedSemaphore(pool_maxsize * 2)
+        self.single_flight = SingleFlight() if single_flight else None
+
+    @property
+    def last_result(self):
+        """Result of the last call made in the current thread.
+
+        :rtype: ApiResult or None
+        """
+        return getattr(self._local, 'result', None)
+
+    def _get_legacy(self, name, get):
+        """Returns attribute of the legacy view of the last call in the current thread, unless it was assigned."""
+        assigned = getattr(self._local, 'assigned', None)
+        if assigned and name in assigned:
+            return assigned[name]
+        result = self.last_result
+        return get(result) if result is not None else None
+
+    def _set_legacy(self, name, value):
+        """Assigns attribute of the legacy view in the current thread, until the next call."""
+        assigned = getattr(self._local, 'assigned', None)
+        if assigned is None:
+            assigned = self._local.assigned = {}
+        assigned[name] = value
+
+    @property
+    def req(self):
+        """Serialized request body of the last call in the current thread, decoded into str."""
+        return self._get_legacy('req', lambda result: result.req.decode('utf-8') if result.req is not None else None)
+
+    @req.setter
+    def req(self, value):
+        self._set_legacy('req', value)
+
+    @property
+    def resp(self):
+        """JSON API response of the last call in the current thread, see `keep_raw_response`."""
+        return self._get_legacy('resp', lambda result: result.resp)
+
+    @resp.setter
+    def resp(self, value):
+        self._set_legacy('resp', value)
+
+    @property
+    def status_code(self):
+        """HTTP status code of the last call in the current thread."""
+        return self._get_legacy('status_code', lambda result: result.status_code)
+
+    @status_code.setter
+    def status_code(self, value):
+        self._set_legacy('status_code', value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def create_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE):
+        """Creates a keep-alive HTTP session with a connection pool.
+
+        :param pool_connections: Number of connection pools to cache.
+        :type pool_connections: int
+        :param pool_maxsize: Maximum number of connections to keep in a pool.
+        :type pool_maxsize: int
+        :return: HTTP session.
+        :rtype: requests.Session
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['Connection'] = 'keep-alive'
+        return session
+
+    def close(self):
+        """Releases pooled connections held by the client's own session."""
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+            self._hedge_executor = None
+        if self._own_session:
+            self.session.close()
+
+    def raise_for_error(self):
+        """Raises stored :class:`TESException`, if one occurred in the last call of the current thread."""
+        if self.last_result is not None:
+            self.last_result.raise_for_error()
+
+    def send(self, method, path,
+             params=None, data=None, resp_cls=None, idempotent=None, timeout=None, deadline=None, hedge=False):
+        """Constructs and sends a request to API Gateway.
+
+        Unlike :meth:`request`, doesn't raise :class:`TESException` in case of API error.
+        Failed attempts are repeated according to the client's retry policy.
+
+        :return: Result of the call, see :meth:`request` for the parameters.
+        :rtype: ApiResult
+        :raises DeadlineExceededException: If the deadline has passed.
+        """
+        req = self.encode_request(data)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        deadline = Deadline.coerce(deadline)
+        if self.single_flight is not None and idempotent:
+            result = self.single_flight.do(
+                self.make_call_key(method, path, params, req, resp_cls),
+                lambda: self._send(method, path, params, req, resp_cls, idempotent, timeout, deadline, hedge),
+                timeout=deadline.remaining() if deadline is not None else None)
+        else:
+            result = self._send(method, path, params, req, resp_cls, idempotent, timeout, deadline, hedge)
+        if self.track_last_result:
+            self._local.result = result
+            self._local.assigned = None
+        return result
+
+    def _send(self, method, path, params, req, resp_cls, idempotent, timeout, deadline, hedge):
+        """Sends a request, repeating failed attempts according to the retry policy."""
+        send_once = self._send_hedged if hedge and idempotent and self.hedging is not None else self._send_once
+        attempt = 1
+        while True:
+            if deadline is not None:
+                deadline.check()
+            try:
+                result = send_once(method, path, params, req, resp_cls, timeout, deadline)
+            except TransportErrorException as e:
+                if deadline is not None and deadline.expired:
+                    raise DeadlineExceededException(str(e))
+                delay = self.get_retry_delay(attempt, idempotent, error=e, deadline=deadline)
+                if delay is None:
+                    raise
+            else:
+                delay = self.get_retry_delay(attempt, idempotent, result=result, deadline=deadline)
+                if delay is None:
+                    result.attempts = attempt
+                    return result
+            time.sleep(delay)
+            attempt += 1
+
+    def _send_once(self, method, path, params, req, resp_cls, timeout, deadline, sending=None, hedged=False):
+        endpoint = self.get_endpoint(path)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(endpoint, self.get_rate_limit_timeout(deadline))
+        timeout = self.make_timeout(timeout, deadline)
+        self.before_attempt(endpoint)
+        if sending is not None:
+            sending.set()
+        started = time.monotonic()
+        try:
+            try:
+                r = self.session.request(method, self.make_url(path),
+                                         headers=self.make_headers(), params=params, data=req, verify=self.verify_ssl,
+                                         timeout=timeout)
+            except requests.RequestException as e:
+                if deadline is not None and deadline.expired:
+                    # The timeouts were cut to the caller's deadline, it's not a failure of the endpoint.
+                    raise DeadlineExceededException('Deadline exceeded')
+                if is_connect_error(e):
+                    raise ConnectErrorException(str(e))
+                raise TransportErrorException(str(e))
+            result = self.make_result(method, path, params, req, r, resp_cls, time.monotonic() - started)
+        except BaseException as e:
+            self.after_attempt(endpoint, error=e, hedged=hedged)
+            raise
+        self.after_attempt(endpoint, result=result, hedged=hedged)
+        return result
+
+    def _submit_hedged(self, *args, **kwargs):
+        """Sends an attempt of a hedged call on a free worker of the hedge executor.
+
+        :return: Future of the attempt, or None if every worker is busy.
+        :rtype: concurrent.futures.Future or None
+        """
+        if not self._hedge_workers.acquire(blocking=False):
+            return None
+        try:
+            with self._hedge_executor_lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(max_workers=self.pool_maxsize * 2)
+                future = self._hedge_executor.submit(self._send_once, *args, hedged=True, **kwargs)
+        except BaseException:
+            self._hedge_workers.release()
+            raise
+        future.add_done_callback(lambda _: self._hedge_workers.release())
+        return future
+
+    def _send_hedged(self, method, path, params, req, resp_cls, timeout, deadline):
+        args = (method, path, params, req, resp_cls, timeout, deadline)
+        sending = threading.Event()
+        first = self._submit_hedged(*args, sending=sending)
+        if first is None:
+            # A busy client sends the call on the caller's thread without hedging,
+            # rather than queuing it behind other calls past its deadline.
+            return self._send_once(*args)
+        first.add_done_callback(lambda _: sending.set())
+        # The delay counts from the moment the request is sent, not from the time it waited for
+        # the rate limiter, so a busy client doesn't hedge its own queuing.
+        sending.wait()
+        done, _ = wait([first], timeout=self.hedging.get_delay(self.get_endpoint(path)))
+        if done or not self.hedging.start_hedge():
+            return first.result()
+        try:
+            hedged = self._submit_hedged(*args)
+        except BaseException:
+            self.hedging.finish_hedge()
+            raise
+        if hedged is None:
+            self.hedging.finish_hedge()
+            return first.result()
+        hedged.add_done_callback(lambda _: self.hedging.finish_hedge())
+        futures = [first, hedged]
+        # The first successful response wins, or the first failure if both requests failed.
+        winner = None
+        pending = futures
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in futures:
+                if future in done and (winner is None or not succeeded(winner) and succeeded(future)):
+                    winner = future
+            if succeeded(winner):
+                break
+        self.hedging.record_hedge(won=winner is hedged)
+        return winner.result()
+
     def request(self, method, path,
-                params=None, data=None, resp_cls=None):
+                params=None, data=None, resp_cls=None, idempotent=None, timeout=None, deadline=None, hedge=False):
         """Constructs and sends a request to API Gateway.
 
         :param method: HTTP method, e.g. 'GET', 'POST', 'PUT', 'DELETE'.
@@ -58,49 +646,56 @@ class AlfaStrahTESClient:
             This class must contain a static "decode()" method
             that will be called to convert a JSON Python object (API Response) to an instance of this class.
         :type resp_cls: class or None
+        :param idempotent: The call can be safely repeated after it was processed,
+            default: true for GET, PUT and DELETE requests, see :class:`RetryPolicy`.
+        :type idempotent: bool or None
+        :param timeout: (optional) Connect and read timeouts in seconds of each attempt, default: client's `timeout`.
+        :type timeout: float or tuple[float, float] or None
+        :param deadline: (optional) Time in seconds the call must complete in, including retries, or a shared deadline.
+        :type deadline: float or Deadline or None
+        :param hedge: Hedge the call according to the client's hedging policy, if it is idempotent.
+        :type hedge: bool
         :return: JSON API response.
         :rtype: class
         """
-        self.req = json.dumps(data, cls=MultiJSONEncoder) if data is not None else None
-        self.resp = None
-        url = '{api_host}{base_path}{path}'.format(api_host=self.api_host, base_path=self.base_path, path=path)
-        headers = {
-            'X-API-Key': self.api_key,
-            'Content-Type': 'application/json',
-        }
-        r = requests.request(method, url,
-                             headers=headers, params=params, data=self.req, verify=self.verify_ssl)
-        try:
-            self.resp = r.json()
-        except ValueError:
-            self.resp = None
-        self.status_code = r.status_code
-        self.raise_for_error()
-        if resp_cls is not None:
-            return json.loads(r.content, cls=MultiJSONDecoder, target_type=resp_cls)
-        return self.resp
+        result = self.send(method, path, params=params, data=data, resp_cls=resp_cls, idempotent=idempotent,
+                           timeout=timeout, deadline=deadline, hedge=hedge)
+        result.raise_for_error()
+        return result.data
 
-    def get_products(self, product_type=None):
+    def get_products(self, product_type=None, timeout=None, deadline=None):
         """Returns list of available insurance products.
 
         :param product_type: (optional) Returns list of insurance products of the given type only, if specified,
             e.g. 'AIR'.
         :type product_type: str or None
+        :param timeout: (optional) Connect and read timeouts in seconds of each attempt, default: client's `timeout`.
+        :type timeout: float or tuple[float, float] or None
+        :param deadline: (optional) Time in seconds the call must complete in, including retries, or a shared deadline.
+        :type deadline: float or Deadline or None
         :returns: List of available insurance products.
         :rtype: list[InsuranceProduct]
         """
+        if self.products_cache is not None:
+            return list(self.products_cache.get(
+                product_type, lambda: self._get_products(product_type, timeout=timeout, deadline=deadline),
+                refresh_loader=lambda: self._get_products(product_type, timeout=timeout)))
+        return self._get_products(product_type, timeout=timeout, deadline=deadline)
+
+    def _get_products(self, product_type, timeout=None, deadline=None):
         if product_type:
             path = '/products/{type}'.format(type=product_type)
         else:
             path = '/products'
-        products = self.request('GET', path, resp_cls=InsuranceProduct)
+        products = self.request('GET', path, resp_cls=InsuranceProduct, timeout=timeout, deadline=deadline,
+                                hedge=True)
         return products
 
     def quote(self, session_id=None, product=None, insureds=None,
               segments=None, booking_price=None, currency=None, service_class=None,
               country=None, sport=None, fare_type=None, luggage_type=None,
               fare_code=None, manager_name=None, manager_code=None, opt=None,
-              selling_page=None, end_date=None, acquisition_channel=None):
+              selling_page=None, end_date=None, acquisition_channel=None, timeout=None, deadline=None):
         """Calculates the cost of one or more insurance policies.
 
         :param session_id: Session id, e.g. '88c70099-8e11-4325-9239-9c027195c069'.
@@ -139,11 +734,14 @@ class AlfaStrahTESClient:
         :type end_date: datetime.datetime or None
         :param acquisition_channel: Acquisition (data collection) channel.
         :type acquisition_channel: AcquisitionChannel or None
+        :param timeout: (optional) Connect and read timeouts in seconds of each attempt, default: client's `timeout`.
+        :type timeout: float or tuple[float, float] or None
+        :param deadline: (optional) Time in seconds the call must complete in, including retries, or a shared deadline.
+        :type deadline: float or Deadline or None
 
         :return: List of quotes.
         :rtype: QuoteResponse
         """
-        path = '/policies/quote'
         quote_request = QuoteRequest(
             session_id=session_id, product=product, insureds=insureds,
             segments=segments, booking_price=booking_price, currency=currency, service_class=service_class,
@@ -151,8 +749,95 @@ class AlfaStrahTESClient:
             fare_code=fare_code, manager_name=manager_name, manager_code=manager_code, opt=opt,
             selling_page=selling_page, end_date=end_date, acquisition_channel=acquisition_channel
         )
-        resp = self.request('POST', path, data=quote_request, resp_cls=QuoteResponse)
-        return resp
+        return self.quote_one(quote_request, timeout=timeout, deadline=deadline)
+
+    def quote_one(self, quote_request, timeout=None, deadline=None):
+        """Calculates the cost of insurance policies for the given quote request, see :meth:`quote`.
+
+        :param quote_request: Quote request.
+        :type quote_request: QuoteRequest
+        :param timeout: (optional) Connect and read timeouts in seconds of each attempt, default: client's `timeout`.
+        :type timeout: float or tuple[float, float] or None
+        :param deadline: (optional) Time in seconds the call must complete in, including retries, or a shared deadline.
+        :type deadline: float or Deadline or None
+        :rtype: QuoteResponse
+        """
+        # Quote calculation has no side effects, so it is safe to repeat.
+        path = '/policies/quote'
+        if self.quote_cache is None:
+            return self.request('POST', path, data=quote_request, resp_cls=QuoteResponse, idempotent=True,
+                                timeout=timeout, deadline=deadline, hedge=True)
+        key = self.quote_cache.make_key(quote_request)
+        if self.quote_cache.serves(quote_request):
+            content = self.quote_cache.get(key)
+            if content is not None:
+                return self.decode_cached_quote(content, quote_request)
+        result = self.send('POST', path, data=quote_request, resp_cls=QuoteResponse, idempotent=True,
+                           timeout=timeout, deadline=deadline, hedge=True)
+        result.raise_for_error()
+        self.quote_cache.set(key, result.content)
+        return result.data
+
+    def quote_many(self, quote_requests, max_concurrency=None, timeout=None, deadline=None):
+        """Calculates the cost of insurance policies for several quote requests in parallel.
+
+        The requests share the client's connection pool.
+
+        :param quote_requests: List of quote requests.
+        :type quote_requests: list[QuoteRequest]
+        :param max_concurrency: (optional) Maximum number of requests in flight,
+            default: maximum number of connections in the pool.
+        :type max_concurrency: int or None
+        :param timeout: (optional) Connect and read timeouts in seconds of each attempt, default: client's `timeout`.
+        :type timeout: float or tuple[float, float] or None
+        :param deadline: (optional) Time in seconds the whole batch must complete in, or a shared deadline.
+            Requests not completed in time fail with :class:`DeadlineExceededException`.
+        :type deadline: float or Deadline or None
+        :return: Quote response, or :class:`TESException` if the request failed, for each quote request,
+            in the same order.
+        :rtype: list[QuoteResponse or TESException]
+        """
+        deadline = Deadline.coerce(deadline)
+        return self._map(lambda quote_request: self.quote_one(quote_request, timeout=timeout, deadline=deadline),
+                         quote_requests, max_concurrency)
+
+    def _map(self, fn, items, max_concurrency=None):
+        """Calls the given function for every item in parallel, capturing :class:`TESException`."""
+        items = list(items)
+        if not items:
+            return []
+        max_workers = min(max_concurrency or self.pool_maxsize, len(items))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda item: call_captured(fn, item), items))
+
+    def _imap_unordered(self, fn, items, max_concurrency=None):
+        """Calls the given function for every item in parallel, yielding (item, result or :class:`TESException`)
+        in order of completion.
+
+        No more than `max_concurrency` items are in flight and taken from `items`,
+        so `items` can be a lazy iterable of any length.
+        """
+        max_workers = max_concurrency or self.pool_maxsize
+        items = iter(items)
+        in_flight = {}
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        def submit(n):
+            for item in itertools.islice(items, n):
+                in_flight[executor.submit(call_captured, fn, item)] = item
+
+        try:
+            submit(max_workers)
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                completed = [(in_flight.pop(future), future.result()) for future in done]
+                submit(len(done))
+                for item_result in completed:
+                    yield item_result
+        finally:
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=False)
 
     def create(self, insureds, session_id=None, product=None,
                insurer=None, segments=None, booking_price=None, currency=None,
@@ -161,7 +846,7 @@ class AlfaStrahTESClient:
                issuance_city=None, sport=None, fare_type=None, luggage_type=None,
                fare_code=None, manager_name=None, manager_code=None, begin_date=None,
                end_date=None, external_id=None, opt=None, selling_page=None,
-               acquisition_channel=None):
+               acquisition_channel=None, timeout=None, deadline=None):
         """Creates one or more insurance policies.
 
         :param insureds: List of insured persons.
@@ -220,6 +905,10 @@ class AlfaStrahTESClient:
         :type selling_page: SellingPage or None
         :param acquisition_channel: Acquisition (data collection) channel.
         :type acquisition_channel: AcquisitionChannel or None
+        :param timeout: (optional) Connect and read timeouts in seconds of each attempt, default: client's `timeout`.
+        :type timeout: float or tuple[float, float] or None
+        :param deadline: (optional) Time in seconds the call must complete in, including retries, or a shared deadline.
+        :type deadline: float or Deadline or None
 
         :returns: List of created insurance policies.
         :rtype: CreateResponse
@@ -234,27 +923,60 @@ class AlfaStrahTESClient:
             manager_name=manager_name, manager_code=manager_code, begin_date=begin_date, end_date=end_date,
             external_id=external_id, opt=opt, selling_page=selling_page, acquisition_channel=acquisition_channel
         )
-        resp = self.request('POST', path, data=create_request, resp_cls=CreateResponse)
+        # The API doesn't create a second policy with the same external id, so the call is safe to repeat.
+        resp = self.request('POST', path, data=create_request, resp_cls=CreateResponse,
+                            idempotent=external_id is not None, timeout=timeout, deadline=deadline)
         return resp
 
-    def confirm(self, policy_id, session_id=None):
+    def confirm(self, policy_id, session_id=None, timeout=None, deadline=None):
         """Confirms insurance policy.
 
         :param policy_id: Policy Id, e.g. 21684956.
         :type policy_id: int
         :param session_id: Session id, e.g. '88c70099-8e11-4325-9239-9c027195c069'.
         :type session_id: str or None
+        :param timeout: (optional) Connect and read timeouts in seconds of each attempt, default: client's `timeout`.
+        :type timeout: float or tuple[float, float] or None
+        :param deadline: (optional) Time in seconds the call must complete in, including retries, or a shared deadline.
+        :type deadline: float or Deadline or None
 
         :return: True in case of success.
         :rtype: bool
         """
         path = '/policies/{policy_id}/confirm'.format(policy_id=policy_id)
         confirm_request = ConfirmRequest(session_id=session_id)
-        _ = self.request('PUT', path, data=confirm_request)
+        # Confirming a policy already confirmed by a lost attempt fails instead of returning True.
+        _ = self.request('PUT', path, data=confirm_request, idempotent=False, timeout=timeout,
+                           deadline=deadline)
         return True
 
+    def confirm_many(self, policy_ids, session_id=None, max_concurrency=None, timeout=None, deadline=None):
+        """Confirms several insurance policies in parallel, e.g. all policies of a group booking.
+
+        :param policy_ids: Policy ids, e.g. ``[p.policy_id for p in create_response.policies]``.
+        :type policy_ids: Iterable[int]
+        :param session_id: Session id shared by all the confirmations, e.g. '88c70099-8e11-4325-9239-9c027195c069'.
+        :type session_id: str or None
+        :param max_concurrency: (optional) Maximum number of requests in flight,
+            default: maximum number of connections in the pool.
+        :type max_concurrency: int or None
+        :param timeout: (optional) Connect and read timeouts in seconds of each attempt, default: client's `timeout`.
+        :type timeout: float or tuple[float, float] or None
+        :param deadline: (optional) Time in seconds all the policies must be confirmed in, or a shared deadline.
+        :type deadline: float or Deadline or None
+        :return: (policy id, True or :class:`TESException` if the confirmation failed) for each policy,
+            in the same order.
+        :rtype: list[tuple[int, bool or TESException]]
+        """
+        policy_ids = list(policy_ids)
+        deadline = Deadline.coerce(deadline)
+        outcomes = self._map(
+            lambda policy_id: self.confirm(policy_id, session_id=session_id, timeout=timeout, deadline=deadline),
+            policy_ids, max_concurrency)
+        return list(zip(policy_ids, outcomes))
+
     def cancel(self, policy_id,
-               type=None, is_ext_id=None, local_date_time=None, body=None):
+               type=None, is_ext_id=None, local_date_time=None, body=None, timeout=None, deadline=None):
         """Cancel insurance policy.
 
         :param policy_id: Policy Id, e.g. 21684956.
@@ -269,51 +991,115 @@ class AlfaStrahTESClient:
         :type: datetime.datetime or None
         :param body: Client's application info.
         :type body: Declaration or None
+        :param timeout: (optional) Connect and read timeouts in seconds of each attempt, default: client's `timeout`.
+        :type timeout: float or tuple[float, float] or None
+        :param deadline: (optional) Time in seconds the call must complete in, including retries, or a shared deadline.
+        :type deadline: float or Deadline or None
 
         :return: Cancellation amount.
         :rtype: Amount
         """
-        params = dict()
-        if type is not None:
-            params['type'] = type.name
-        if is_ext_id is not None:
-            params['is_ext_id'] = is_ext_id
-        if local_date_time is not None:
-            params['local_date_time'] = local_date_time.strftime('%Y-%m-%dT%H:%M:%S')
+        params = self.make_cancel_params(type=type, is_ext_id=is_ext_id, local_date_time=local_date_time)
         path = '/policies/{policy_id}'.format(policy_id=policy_id)
-        resp = self.request('DELETE', path, data=body, params=params, resp_cls=Amount)
+        # A repeated cancellation fails instead of returning the cancellation amount.
+        resp = self.request('DELETE', path, data=body, params=params, resp_cls=Amount, idempotent=False,
+                            timeout=timeout, deadline=deadline)
         return resp
 
-    def get_policy(self, policy_id):
+    def cancel_many(self, policy_ids, type=None, is_ext_id=None, local_date_time=None, body=None,
+                    max_concurrency=None, timeout=None, deadline=None):
+        """Cancels several insurance policies in parallel, see :meth:`cancel` for the parameters.
+
+        :param policy_ids: Policy ids.
+        :type policy_ids: Iterable[int or str]
+        :param max_concurrency: (optional) Maximum number of requests in flight,
+            default: maximum number of connections in the pool.
+        :type max_concurrency: int or None
+        :return: (policy id, cancellation amount or :class:`TESException` if the cancellation failed)
+            for each policy, in the same order.
+        :rtype: list[tuple[int or str, Amount or TESException]]
+        """
+        policy_ids = list(policy_ids)
+        deadline = Deadline.coerce(deadline)
+        outcomes = self._map(
+            lambda policy_id: self.cancel(policy_id, type=type, is_ext_id=is_ext_id, local_date_time=local_date_time,
+                                          body=body, timeout=timeout, deadline=deadline),
+            policy_ids, max_concurrency)
+        return list(zip(policy_ids, outcomes))
+
+    def get_policy(self, policy_id, is_ext_id=None, timeout=None, deadline=None):
         """Retrieves insurance policy info by the given id.
 
         :param policy_id: Policy Id, e.g. 21684956.
         :type policy_id: int
+        :param is_ext_id: True if the given `policy_id` is an external identifier, default: false.
+        :type is_ext_id: bool or None
+        :param timeout: (optional) Connect and read timeouts in seconds of each attempt, default: client's `timeout`.
+        :type timeout: float or tuple[float, float] or None
+        :param deadline: (optional) Time in seconds the call must complete in, including retries, or a shared deadline.
+        :type deadline: float or Deadline or None
 
         :return: Policy.
         :rtype: Policy
         """
+        params = {'is_ext_id': is_ext_id} if is_ext_id is not None else None
         path = '/policies/{policy_id}'.format(policy_id=policy_id)
-        policy = self.request('GET', path, resp_cls=Policy)
+        policy = self.request('GET', path, params=params, resp_cls=Policy, timeout=timeout, deadline=deadline,
+                              hedge=True)
         return policy
 
+    def get_policies(self, policy_ids, max_concurrency=None, is_ext_id=None, timeout=None, deadline=None):
+        """Retrieves insurance policies by the given ids in parallel, yielding them as they arrive.
+
+        Policies are fetched over the client's connection pool, no more than `max_concurrency` at a time,
+        and ids are taken from `policy_ids` as they are needed, so memory use doesn't grow with their number.
+
+        :param policy_ids: Policy ids, e.g. a generator reading them from a database.
+        :type policy_ids: Iterable[int or str]
+        :param max_concurrency: (optional) Maximum number of requests in flight,
+            default: maximum number of connections in the pool.
+        :type max_concurrency: int or None
+        :param is_ext_id: True if the given ids are external identifiers, default: false.
+        :type is_ext_id: bool or None
+        :param timeout: (optional) Connect and read timeouts in seconds of each attempt, default: client's `timeout`.
+        :type timeout: float or tuple[float, float] or None
+        :param deadline: (optional) Time in seconds all the policies must be retrieved in, or a shared deadline.
+        :type deadline: float or Deadline or None
+        :return: Iterator of (policy id, policy or :class:`TESException` if the request failed) pairs,
+            in order of completion.
+        :rtype: Iterator[tuple[int or str, Policy or TESException]]
+        """
+        deadline = Deadline.coerce(deadline)
+        return self._imap_unordered(
+            lambda policy_id: self.get_policy(policy_id, is_ext_id=is_ext_id, timeout=timeout, deadline=deadline),
+            policy_ids, max_concurrency)
 
-class MultiJSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, Decimal):
-            return float(o)
-        if isinstance(o, Enum):
-            return o.name
-        if isinstance(o, datetime.datetime):
-            return o.strftime('%Y-%m-%dT%H:%M:%S')
-        if isinstance(o, datetime.date):
-            return o.strftime('%Y-%m-%d')
 
-        if hasattr(o, 'encode') and callable(o.encode):
-            return o.encode()
+def is_connect_error(e):
+    """Returns True if the given :mod:`requests` error means the connection could not be established."""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], 'reason', None) if e.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def succeeded(future):
+    """Returns True if the given completed future of an attempt holds a successful :class:`ApiResult`."""
+    return future.exception() is None and future.result().ok
+
+
+def call_captured(fn, *args, **kwargs):
+    """Calls the given function and returns :class:`TESException` it raised instead of raising it."""
+    try:
+        return fn(*args, **kwargs)
+    except TESException as e:
+        return e
 
-        # Let the base class default raise the TypeError
-        return json.JSONEncoder.default(self, o)
+
+class MultiJSONEncoder(json.JSONEncoder):
+    def default(self, o):
+        # Decimal, Enum, date, datetime and models, see encode_value()
+        return encode_value(o)
 
 
 class MultiJSONDecoder(json.JSONDecoder):
@@ -323,12 +1109,23 @@ class MultiJSONDecoder(json.JSONDecoder):
 
     def decode(self, s, **kwargs):
         obj = json.JSONDecoder.decode(self, s, **kwargs)
+        return decode_response(obj, self.target_type)
+
+
+def decode_response(obj, target_type):
+    """Makes instances of the given class from a parsed JSON API response.
 
-        if isinstance(obj, dict):
-            return self.target_type.decode(obj)
+    :param obj: JSON Python object.
+    :type obj: dict or list or None
+    :param target_type: Class with a static "decode()" method.
+    :type target_type: class
+    :return: Class instance, list of class instances or None.
+    """
+    if isinstance(obj, dict):
+        return target_type.decode(obj)
 
-        if isinstance(obj, list):
-            return [self.target_type.decode(o) for o in obj]
+    if isinstance(obj, list):
+        return [target_type.decode(o) for o in obj]
 
-        # None
-        return obj
+    # None
+    return obj
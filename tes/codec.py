@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+
+"""
+tes.codec
+~~~~~~~~~
+
+This module compiles ``__attrs__`` of model classes into specialized decode and encode functions.
+
+The type of every attribute is inspected once, on the first decode (encode) of the class,
+so subsequent decodes (encodes) don't need any reflection.
+"""
+import datetime
+import functools
+import numbers
+import sys
+import typing
+from decimal import Decimal
+from enum import Enum
+
+string_types = (str,)
+
+SCALAR_TYPES = string_types + (numbers.Number,)
+JSON_SCALAR_TYPES = frozenset(string_types + (int, float, bool, type(None)))
+
+DATE_FORMAT = '%Y-%m-%d'
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+DATE_CACHE_SIZE = 4096
+
+_decoders = {}
+_encoders = {}
+
+
+def get_list_args(tp):
+    """get_list_args: typing.List[int] -> (<class 'int'>,)"""
+    if sys.version_info[:3] >= (3, 7, 0):
+        if isinstance(tp, typing._GenericAlias) and tp.__origin__ == list:
+            return tp.__args__
+    else:
+        if isinstance(tp, typing.GenericMeta) and tp.__origin__ == typing.List:
+            return tp.__args__
+
+    return ()
+
+
+if hasattr(datetime.date, 'fromisoformat'):
+    _date_fromisoformat = datetime.date.fromisoformat
+    _datetime_fromisoformat = datetime.datetime.fromisoformat
+else:
+    def _date_fromisoformat(s):
+        return datetime.date(int(s[0:4]), int(s[5:7]), int(s[8:10]))
+
+    def _datetime_fromisoformat(s):
+        return datetime.datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                                 int(s[11:13]), int(s[14:16]), int(s[17:19]))
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(s):
+    """Parses date in ``DATE_FORMAT``, e.g. '2020-07-01'.
+
+    Strings of the exact format are parsed without :func:`time.strptime`, the rest fall back to it.
+    Results are memoized, dates are immutable.
+
+    :rtype: datetime.date
+    :raises ValueError: If the string doesn't match the format.
+    """
+    if len(s) == 10 and s[4] == '-' and s[7] == '-':
+        try:
+            return _date_fromisoformat(s)
+        except ValueError:
+            pass
+    return datetime.datetime.strptime(s, DATE_FORMAT).date()
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_datetime(s):
+    """Parses datetime in ``DATETIME_FORMAT``, e.g. '2020-07-01T11:20:31', see :func:`parse_date`.
+
+    :rtype: datetime.datetime
+    :raises ValueError: If the string doesn't match the format.
+    """
+    if len(s) == 19 and s[10] == 'T' and s[4] == '-' and s[7] == '-' and s[13] == ':' and s[16] == ':':
+        try:
+            return _datetime_fromisoformat(s)
+        except ValueError:
+            pass
+    return datetime.datetime.strptime(s, DATETIME_FORMAT)
+
+
+def format_date(d):
+    """Formats date in ``DATE_FORMAT``.
+
+    :type d: datetime.date
+    :rtype: str
+    """
+    return '%04d-%02d-%02d' % (d.year, d.month, d.day)
+
+
+def format_datetime(dt):
+    """Formats datetime in ``DATETIME_FORMAT``, microseconds and time zone are dropped.
+
+    :type dt: datetime.datetime
+    :rtype: str
+    """
+    return '%04d-%02d-%02dT%02d:%02d:%02d' % (dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second)
+
+
+def is_model(tp):
+    """Returns True if the given type is a model class, i.e. it has ``__attrs__`` and ``decode()``."""
+    return isinstance(tp, type) and isinstance(getattr(tp, '__attrs__', None), dict) and hasattr(tp, 'decode')
+
+
+def cast_scalar(json_value):
+    if json_value is None or isinstance(json_value, SCALAR_TYPES):
+        return json_value
+    raise NotImplementedError
+
+
+def compile_cast(target_type):
+    """Returns a function that casts a JSON value to the given type.
+
+    Plain types (str, int, bool, etc.) need no cast and None is returned for them.
+
+    :param target_type: Target type, e.g. datetime.date.
+    :return: Cast function or None.
+    """
+    if target_type == Decimal:
+        # JSON parsed with parse_float=Decimal needs no cast.
+        def cast(json_value):
+            if type(json_value) is Decimal or json_value is None:
+                return json_value
+            return Decimal(json_value)
+        return cast
+
+    if target_type == datetime.date or target_type == datetime.datetime:
+        parse = parse_date if target_type == datetime.date else parse_datetime
+
+        def cast(json_value):
+            if isinstance(json_value, string_types):
+                return parse(json_value)
+            return cast_scalar(json_value)
+        return cast
+
+    if isinstance(target_type, type) and issubclass(target_type, Enum):
+        members = target_type.__members__
+
+        def cast(json_value):
+            if isinstance(json_value, string_types):
+                return members[json_value]
+            return cast_scalar(json_value)
+        return cast
+
+    if is_model(target_type):
+        decode = target_type.decode
+
+        def cast(json_value):
+            if json_value is None or isinstance(json_value, SCALAR_TYPES):
+                return json_value
+            return decode(json_value)
+        return cast
+
+    return None
+
+
+def compile_list_cast(item_type):
+    """Returns a function that casts a JSON array to a list of the given type."""
+    item_cast = compile_cast(item_type)
+    if item_cast is None:
+        def cast(json_value):
+            return list(json_value) if json_value is not None else []
+    else:
+        def cast(json_value):
+            return [item_cast(o) for o in json_value] if json_value is not None else []
+    return cast
+
+
+def compile_attr_cast(attr_type):
+    """Returns a function that casts a JSON value to the given attribute type, see :func:`compile_cast`.
+
+    Unlike :func:`compile_cast`, returns a function for plain types too.
+    """
+    type_args = get_list_args(attr_type)
+    if len(type_args):
+        return compile_list_cast(type_args[0])
+    return compile_cast(attr_type) or (lambda json_value: json_value)
+
+
+def compile_decoder(cls):
+    """Compiles ``__attrs__`` of the given model class into a decode function.
+
+    :param cls: Model class.
+    :return: Function that makes a class instance from a dict.
+    """
+    plain = []
+    casts = []
+    for attr_name, attr_type in cls.__attrs__.items():
+        type_args = get_list_args(attr_type)
+        if len(type_args):
+            casts.append((attr_name, compile_list_cast(type_args[0])))
+            continue
+        cast = compile_cast(attr_type)
+        if cast is None:
+            plain.append(attr_name)
+        else:
+            casts.append((attr_name, cast))
+    plain = tuple(plain)
+    casts = tuple(casts)
+
+    def decode(dct):
+        get = dct.get
+        params = {attr_name: get(attr_name) for attr_name in plain}
+        for attr_name, cast in casts:
+            params[attr_name] = cast(get(attr_name))
+        return cls(**params)
+
+    return decode
+
+
+def get_decoder(cls):
+    """Returns the compiled decode function of the given model class.
+
+    The function is compiled on the first call and cached,
+    so changes of ``__attrs__`` after that are not taken into account.
+    """
+    try:
+        return _decoders[cls]
+    except KeyError:
+        decoder = _decoders[cls] = compile_decoder(cls)
+        return decoder
+
+
+def has_attrs(obj):
+    """Returns True if the given object is an instance of a class with ``__attrs__``."""
+    return isinstance(getattr(type(obj), '__attrs__', None), dict)
+
+
+def encode_value(value, keep_decimal=False):
+    """Converts the given value into JSON-ready Python structure.
+
+    Decimal is converted to float, Enum to its name, date and datetime to ISO 8601 string.
+    Model instances are converted by their compiled encoders, other objects by their ``encode()`` method.
+
+    :param keep_decimal: Leave Decimal as is, for backends that write it as an exact JSON number.
+    :type keep_decimal: bool
+    :raises TypeError: If the value can't be converted.
+    """
+    if type(value) in JSON_SCALAR_TYPES:
+        return value
+    if isinstance(value, Decimal):
+        return value if keep_decimal else float(value)
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, datetime.datetime):
+        return format_datetime(value)
+    if isinstance(value, datetime.date):
+        return format_date(value)
+    if isinstance(value, SCALAR_TYPES):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [encode_value(o, keep_decimal) for o in value]
+    if isinstance(value, dict):
+        return {k: encode_value(v, keep_decimal) for k, v in value.items()}
+    if has_attrs(value):
+        return get_encoder(type(value), keep_decimal)(value)
+    if hasattr(value, 'encode') and callable(value.encode):
+        return value.encode()
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+def compile_encode(source_type, keep_decimal=False):
+    """Returns a function that converts a value of the given type into JSON-ready structure.
+
+    Values of unexpected types are handed over to :func:`encode_value`.
+    Plain types (str, int, bool, etc.) need no conversion and None is returned for them.
+
+    :param source_type: Attribute type, e.g. datetime.date.
+    :param keep_decimal: Leave Decimal as is, see :func:`encode_value`.
+    :type keep_decimal: bool
+    :return: Encode function or None.
+    """
+    if keep_decimal:
+        def fallback(value):
+            return encode_value(value, True)
+    else:
+        fallback = encode_value
+
+    type_args = get_list_args(source_type)
+    if len(type_args):
+        item_encode = compile_encode(type_args[0], keep_decimal) or fallback
+
+        def encode(value):
+            if type(value) is list or type(value) is tuple:
+                return [item_encode(o) for o in value]
+            return fallback(value)
+        return encode
+
+    if source_type == Decimal:
+        if keep_decimal:
+            def encode(value):
+                return value if type(value) is Decimal else fallback(value)
+        else:
+            def encode(value):
+                return float(value) if type(value) is Decimal else fallback(value)
+        return encode
+
+    if source_type == datetime.datetime or source_type == datetime.date:
+        format_value = format_datetime if source_type == datetime.datetime else format_date
+
+        def encode(value):
+            return format_value(value) if type(value) is source_type else fallback(value)
+        return encode
+
+    if isinstance(source_type, type) and issubclass(source_type, Enum):
+        def encode(value):
+            return value.name if type(value) is source_type else fallback(value)
+        return encode
+
+    if isinstance(source_type, type) and isinstance(getattr(source_type, '__attrs__', None), dict):
+        # The nested encoder is resolved on first use, models may refer to each other.
+        encoders = []
+
+        def encode(value):
+            if type(value) is source_type:
+                if not encoders:
+                    encoders.append(get_encoder(source_type, keep_decimal))
+                return encoders[0](value)
+            return fallback(value)
+        return encode
+
+    return None
+
+
+def compile_encoder(cls, keep_decimal=False):
+    """Compiles ``__attrs__`` of the given model class into an encode function.
+
+    Attributes that are missing or None are omitted.
+
+    :param cls: Model class.
+    :param keep_decimal: Leave Decimal as is, see :func:`encode_value`.
+    :type keep_decimal: bool
+    :return: Function that converts a class instance into JSON-ready dict.
+    """
+    fields = tuple((attr_name, compile_encode(attr_type, keep_decimal))
+                   for attr_name, attr_type in cls.__attrs__.items())
+
+    def encode(obj):
+        json = {}
+        for attr_name, encode_attr in fields:
+            value = getattr(obj, attr_name, None)
+            if value is None:
+                continue
+            if encode_attr is None:
+                json[attr_name] = value if type(value) in JSON_SCALAR_TYPES else encode_value(value, keep_decimal)
+            else:
+                json[attr_name] = encode_attr(value)
+        return json
+
+    if getattr(cls, '__memoized__', False):
+        return memoize_encoder(encode, keep_decimal)
+    return encode
+
+
+def is_memoized(obj):
+    """Returns True if the given object is an instance of a memoized model variant, see :func:`tes.models.memoized`."""
+    return getattr(type(obj), '__memoized__', False)
+
+
+def is_frozen(obj):
+    """Returns True if the given object is an instance of a frozen model variant, see :func:`tes.models.frozen`."""
+    return getattr(type(obj), '__frozen__', False)
+
+
+def _fragment_deps(obj):
+    """Returns memoized nested models and list attributes the fragment of the given instance depends on.
+
+    :return: (nested models, (list, its items) pairs), or None if a nested model is not memoized,
+        its changes can't be tracked.
+    """
+    children = []
+    lists = []
+    for attr_name in type(obj).__attrs__:
+        value = getattr(obj, attr_name, None)
+        if type(value) is list:
+            lists.append((value, tuple(value)))
+            items = value
+        elif type(value) is tuple:
+            items = value
+        else:
+            items = (value,)
+        for item in items:
+            if is_memoized(item):
+                children.append(item)
+            elif has_attrs(item):
+                return None
+    return children, lists
+
+
+def get_fragment(obj, keep_decimal=False):
+    """Returns the memoized JSON-ready dict of the given instance of a memoized model variant.
+
+    The fragment is valid while neither the instance, its lists nor its nested memoized models were changed
+    after encoding.
+
+    :return: Fragment, or None if the instance wasn't encoded or was changed since.
+    :rtype: dict or None
+    """
+    entry = obj.__dict__.get('_fragments', {}).get(keep_decimal)
+    if entry is None:
+        return None
+    version, fragment, children, lists = entry
+    if version != obj.__dict__.get('_version', 0):
+        return None
+    for value, items in lists:
+        if len(value) != len(items) or any(item is not old for item, old in zip(value, items)):
+            return None
+    # A nested model encoded again since has a new fragment, which is not the one spliced into this fragment.
+    for child, child_fragment in children:
+        if get_fragment(child, keep_decimal) is not child_fragment:
+            return None
+    return fragment
+
+
+def memoize_encoder(encode, keep_decimal=False):
+    """Wraps the given encode function of a memoized model variant, so it reuses the fragment of an instance
+    encoded before, see :func:`get_fragment`.
+
+    Fragments of instances with nested models that are not memoized are not kept.
+    """
+    def encode_memoized(obj):
+        fragment = get_fragment(obj, keep_decimal)
+        if fragment is not None:
+            return fragment
+        version = obj.__dict__.get('_version', 0)
+        fragment = encode(obj)
+        deps = _fragment_deps(obj)
+        if deps is not None:
+            children, lists = deps
+            children = tuple((child, get_fragment(child, keep_decimal)) for child in children)
+            obj.__dict__.setdefault('_fragments', {})[keep_decimal] = (version, fragment, children, tuple(lists))
+        return fragment
+
+    return encode_memoized
+
+
+def get_encoder(cls, keep_decimal=False):
+    """Returns the compiled encode function of the given model class, see :func:`get_decoder`."""
+    key = (cls, keep_decimal)
+    try:
+        return _encoders[key]
+    except KeyError:
+        encoder = _encoders[key] = compile_encoder(cls, keep_decimal)
+        return encoder
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+tes.deadline
+~~~~~~~~~~~~
+
+This module contains the deadline of API calls, shared by retries and batch operations.
+"""
+import numbers
+import time
+
+from .exceptions import DeadlineExceededException
+
+
+class Deadline(object):
+    """Point in time an API call, including all its attempts, must complete by.
+
+    The same deadline can be passed to several calls, e.g. to the calls of a batch,
+    to keep all of them within one latency budget.
+    """
+
+    def __init__(self, timeout, clock=time.monotonic):
+        """Init.
+
+        :param timeout: Time in seconds from now.
+        :type timeout: float
+        :param clock: Function returning current time in seconds.
+        :type clock: callable
+        """
+        self.clock = clock
+        self.expires_at = clock() + timeout
+
+    @classmethod
+    def coerce(cls, deadline):
+        """Returns deadline of the given value: time in seconds from now, deadline or None.
+
+        :type deadline: float or Deadline or None
+        :rtype: Deadline or None
+        """
+        if deadline is None or isinstance(deadline, Deadline):
+            return deadline
+        if isinstance(deadline, numbers.Real):
+            return cls(deadline)
+        raise TypeError('deadline must be a number of seconds or a Deadline, not {}'.format(type(deadline).__name__))
+
+    def remaining(self):
+        """Returns time in seconds left before the deadline, zero if it has passed.
+
+        :rtype: float
+        """
+        return max(0.0, self.expires_at - self.clock())
+
+    @property
+    def expired(self):
+        """True if the deadline has passed."""
+        return self.clock() >= self.expires_at
+
+    def check(self):
+        """Raises :class:`DeadlineExceededException` if the deadline has passed."""
+        if self.expired:
+            raise DeadlineExceededException('Deadline exceeded')
+
+    def cap(self, timeout):
+        """Returns the given connect and read timeouts, cut to the time left before the deadline.
+
+        :param timeout: Connect and read timeouts in seconds.
+        :type timeout: tuple[float, float]
+        :rtype: tuple[float, float]
+        :raises DeadlineExceededException: If the deadline has passed, e.g. while the attempt waited for the rate limiter.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceededException('Deadline exceeded')
+        connect, read = timeout
+        return (min(connect, remaining) if connect is not None else remaining,
+                min(read, remaining) if read is not None else remaining)
@@ -14,3 +14,23 @@ class TESException(IOError):
 
 class AuthErrorException(TESException, ValueError):
     """Authentication failed."""
+
+
+class TransportErrorException(TESException):
+    """The request could not be sent or its response could not be received."""
+
+
+class ConnectErrorException(TransportErrorException):
+    """The connection could not be established, so the request was not sent."""
+
+
+class DeadlineExceededException(TESException, TimeoutError):
+    """The call didn't complete before its deadline."""
+
+
+class CircuitOpenException(TESException):
+    """The call was not sent, because the circuit of its endpoint is open."""
+
+
+class RateLimitExceededException(TESException):
+    """The call was not sent, because it would exceed the client-side rate limit."""
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""
+tes.hedging
+~~~~~~~~~~~
+
+This module contains the hedging policy of latency-sensitive API calls.
+"""
+import math
+import threading
+from collections import deque
+
+
+class HedgingPolicy(object):
+    """Hedging policy: if an attempt hasn't answered within a percentile of recent latencies of its endpoint,
+    a second identical request is sent, and the first response wins.
+
+    Only idempotent read calls are hedged: :meth:`AlfaStrahTESClient.quote`,
+    :meth:`AlfaStrahTESClient.get_policy` and :meth:`AlfaStrahTESClient.get_products`.
+    """
+
+    def __init__(self, percentile=95, min_delay=0.05, max_delay=2.0, window=500, min_samples=20, max_in_flight=10):
+        """Init.
+
+        :param percentile: Percentile of recent latencies after which a hedged request is sent, e.g. 95.
+        :type percentile: float
+        :param min_delay: Minimum delay in seconds before a hedged request.
+        :type min_delay: float
+        :param max_delay: Maximum delay in seconds before a hedged request,
+            also used until there are enough latency samples.
+        :type max_delay: float
+        :param window: Number of recent latencies of each endpoint to keep.
+        :type window: int
+        :param min_samples: Number of latency samples needed to use the percentile.
+        :type min_samples: int
+        :param max_in_flight: Maximum number of hedged requests in flight, a slow attempt is not hedged above it.
+        :type max_in_flight: int
+        """
+        if not 0 < percentile <= 100:
+            raise ValueError('percentile must be in (0, 100]')
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.window = window
+        self.min_samples = min_samples
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.hedges = 0
+        self.wins = 0
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, latency):
+        """Records latency in seconds of a completed attempt of the given endpoint."""
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None:
+                latencies = self._latencies[endpoint] = deque(maxlen=self.window)
+            latencies.append(latency)
+
+    def get_delay(self, endpoint):
+        """Returns delay in seconds before a hedged request of the given endpoint is sent.
+
+        :rtype: float
+        """
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None or len(latencies) < self.min_samples:
+                return self.max_delay
+            latencies = sorted(latencies)
+        # Nearest-rank percentile.
+        rank = max(1, int(math.ceil(self.percentile / 100.0 * len(latencies))))
+        return min(self.max_delay, max(self.min_delay, latencies[rank - 1]))
+
+    def start_hedge(self):
+        """Takes a slot of a hedged request, returns False if `max_in_flight` hedged requests are in flight.
+
+        :rtype: bool
+        """
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                return False
+            self.in_flight += 1
+            return True
+
+    def finish_hedge(self):
+        """Releases the slot of a completed hedged request, see :meth:`start_hedge`."""
+        with self._lock:
+            self.in_flight -= 1
+
+    def record_hedge(self, won):
+        """Records a hedged request, `won` is True if it answered first."""
+        with self._lock:
+            self.hedges += 1
+            if won:
+                self.wins += 1
+
+    @property
+    def stats(self):
+        """Hedging counters.
+
+        :rtype: dict
+        """
+        return {
+            'hedges': self.hedges,
+            'wins': self.wins,
+        }
@@ -6,12 +6,13 @@ tes.models
 This module contains the primary objects.
 """
 import datetime
-import numbers
-import sys
+import threading
 import typing
 from enum import Enum
 from decimal import Decimal
 
+from .codec import compile_attr_cast, get_decoder, get_encoder, get_list_args
+
 PRODUCT_TYPES = ['AIR']
 
 
@@ -155,89 +156,43 @@ class TravelType(Enum):
 class BaseModel(object):
     """Base model."""
 
+    __slots__ = ()
     __attrs__ = {}
 
     def __init__(self, *args, **kwargs):
         pass
 
     def encode(self):
-        """Translates a class instance into a string in JSON format.
+        """Translates a class instance into JSON-ready dict.
+
+        Nested models, enums and dates are converted as well,
+        by the encoder compiled from the class ``__attrs__``, see :func:`tes.codec.get_encoder`.
+        Decimals are left as is, so no precision is lost, the serializers decide how to write them.
 
         :return: JSON representation of a class instance.
-        :rtype: str
+        :rtype: dict
         """
-        json = dict()
-
-        if not hasattr(self, '__attrs__') or not isinstance(self.__attrs__, dict):
-            return json
-
-        for attr in self.__attrs__.keys():
-            if not hasattr(self, attr) or self.__getattribute__(attr) is None:
-                continue
-            if isinstance(self.__getattribute__(attr), Enum):
-                json[attr] = self.__getattribute__(attr).name
-            else:
-                json[attr] = self.__getattribute__(attr)
-
-        return json
+        return get_encoder(type(self), keep_decimal=True)(self)
 
     @classmethod
     def decode(cls, dct):
         """Makes a class instance from the given dict.
 
+        The class ``__attrs__`` are compiled into a specialized decoder on the first call,
+        see :func:`tes.codec.get_decoder`.
+
         :param dct: JSON representation of a class instance.
         :type dct: dict
         :return: Class instance.
         """
-        def cast(json_value, target_type):
-            if json_value is None:
-                return None
-
-            if target_type == Decimal:
-                return Decimal(json_value)
-
-            if isinstance(json_value, bool) or isinstance(json_value, numbers.Number):
-                return json_value
+        return get_decoder(cls)(dct)
 
-            if isinstance(json_value, str if sys.version_info[0] == 3 else basestring):
-                if target_type == datetime.date:
-                    return datetime.datetime.strptime(json_value, '%Y-%m-%d').date()
-                if target_type == datetime.datetime:
-                    return datetime.datetime.strptime(json_value, '%Y-%m-%dT%H:%M:%S')
-                if issubclass(target_type, Enum):
-                    return target_type[json_value]
-                return json_value
 
-            if issubclass(target_type, BaseModel):
-                return target_type.decode(json_value)
-
-            raise NotImplementedError
-
-        def get_list_args(tp):
-            """get_list_args: typing.List[int] -> (<class 'int'>,)"""
-            if sys.version_info[:3] >= (3, 7, 0):
-                if isinstance(tp, typing._GenericAlias) and tp.__origin__ == list:
-                    return tp.__args__
-            else:
-                if isinstance(tp, typing.GenericMeta) and tp.__origin__ == typing.List:
-                    return tp.__args__
-
-            return ()
-
-        params = {}
-        for attr_name, attr_type in cls.__attrs__.items():
-            type_args = get_list_args(attr_type)
-            if len(type_args):
-                params[attr_name] = [cast(o, type_args[0]) for o in dct.get(attr_name, [])]
-            else:
-                params[attr_name] = cast(dct.get(attr_name), attr_type)
-
-        return cls(**params)
-
-
-class ApiRequest:
+class ApiRequest(object):
     """API request base class."""
 
+    __slots__ = ()
+
 
 class ApiProblem(BaseModel):
     """Description of the error that occurred while handling your request."""
@@ -1092,3 +1047,302 @@ class UpdateRequest(ApiRequest):
 
 class UpdateResponse:
     pass
+
+
+_variants = {}
+# Variants under construction in the thread holding _variants_lock, see _make_variant.
+_pending_variants = {}
+_variants_lock = threading.RLock()
+
+
+def _base_model(model_cls):
+    """Returns the model class the given variant was made of, the given class if it is not a variant."""
+    return model_cls.__dict__.get('__model__', model_cls)
+
+
+def _variant_type(tp, variant):
+    """Replaces model classes in the given attribute type with their variants, e.g. List[Risk] -> List[Risk']."""
+    type_args = get_list_args(tp)
+    if len(type_args):
+        return typing.List[_variant_type(type_args[0], variant)]
+    if isinstance(tp, type) and issubclass(tp, BaseModel):
+        return variant(tp)
+    return tp
+
+
+def _make_variant(kind, model_cls, create, complete=None):
+    """Returns the variant of the given kind of a model class, creates it on the first call.
+
+    The variant and the variants of nested models it refers to are published to other threads
+    only when all of them are complete, a half-built class would get an empty codec cached for good.
+
+    :param kind: Kind of the variant, e.g. 'slotted'.
+    :param model_cls: Model class, e.g. :class:`Policy`.
+    :param create: Function that makes the variant class of the given model class, ``__attrs__`` are set later.
+    :param complete: (optional) Function called with the variant class after its ``__attrs__`` are set.
+    :return: Variant class.
+    """
+    key = (kind, model_cls)
+    cls = _variants.get(key)
+    if cls is not None:
+        return cls
+    with _variants_lock:
+        cls = _variants.get(key) or _pending_variants.get(key)
+        if cls is not None:
+            return cls
+        outermost = not _pending_variants
+        try:
+            cls = create(model_cls)
+            # Variants reuse the name of the model class, so pickle can't look them up by name.
+            cls.__variant__ = key
+            cls.__reduce__ = _reduce_variant
+            # Registered before its attributes are resolved, models may refer to each other.
+            _pending_variants[key] = cls
+            variant = _factories[kind]
+            cls.__attrs__ = {name: _variant_type(tp, variant) for name, tp in model_cls.__attrs__.items()}
+            if complete is not None:
+                complete(cls)
+            if outermost:
+                _variants.update(_pending_variants)
+        finally:
+            if outermost:
+                _pending_variants.clear()
+    return cls
+
+
+def _reduce_variant(self):
+    """Pickles an instance of a variant as the chain of variants of its model class and its attributes."""
+    kinds = []
+    model_cls = type(self)
+    while '__variant__' in model_cls.__dict__:
+        kind, model_cls = model_cls.__dict__['__variant__']
+        kinds.append(kind)
+    attrs = {name: getattr(self, name, None) for name in type(self).__attrs__}
+    return _rebuild_variant, (tuple(reversed(kinds)), model_cls, attrs)
+
+
+def _rebuild_variant(kinds, model_cls, attrs):
+    """Makes an instance of a variant pickled by :func:`_reduce_variant`."""
+    for kind in kinds:
+        model_cls = _factories[kind](model_cls)
+    return model_cls(**attrs)
+
+
+def _create_slotted(model_cls):
+    namespace = {k: v for k, v in model_cls.__dict__.items()
+                 if k not in ('__dict__', '__weakref__', '__attrs__', '__variant__')}
+    namespace['__slots__'] = tuple(model_cls.__attrs__)
+    namespace['__model__'] = _base_model(model_cls)
+    bases = tuple(base for base in (BaseModel, ApiRequest) if issubclass(model_cls, base))
+    return type(model_cls.__name__, bases, namespace)
+
+
+def slotted(model_cls):
+    """Returns compact variant of the given model class.
+
+    Instances of the variant keep attributes in ``__slots__`` made of the class ``__attrs__``
+    instead of a per-instance ``__dict__``, which takes several times less memory.
+    Keyword construction, pickling, :meth:`BaseModel.encode` and :meth:`BaseModel.decode` work the same way,
+    nested models are decoded into compact variants as well.
+    Attributes not listed in ``__attrs__`` can't be set, and the variant is not a subclass of the given class.
+
+    :param model_cls: Model class, e.g. :class:`Policy`.
+    :return: Compact model class.
+    """
+    return _make_variant('slotted', model_cls, _create_slotted)
+
+
+class _LazyAttribute(object):
+    """Model attribute cast from raw JSON value on first access.
+
+    The result is stored in the instance ``__dict__``, which takes precedence over this (non-data) descriptor,
+    so subsequent reads are plain attribute lookups.
+    """
+
+    __slots__ = ('name', 'cast')
+
+    def __init__(self, name, cast):
+        self.name = name
+        self.cast = cast
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = self.cast(obj._raw.get(self.name))
+        obj.__dict__[self.name] = value
+        return value
+
+
+def _lazy_decode(cls, dct):
+    obj = cls.__new__(cls)
+    obj._raw = dct
+    return obj
+
+
+def _create_lazy(model_cls):
+    return type(model_cls.__name__, (model_cls,), {
+        '__doc__': model_cls.__doc__, '__module__': model_cls.__module__, '__model__': _base_model(model_cls),
+        'decode': classmethod(_lazy_decode),
+    })
+
+
+def _complete_lazy(cls):
+    for name, tp in cls.__attrs__.items():
+        setattr(cls, name, _LazyAttribute(name, compile_attr_cast(tp)))
+
+
+def lazy(model_cls):
+    """Returns lazy variant of the given model class.
+
+    :meth:`BaseModel.decode` of the variant only keeps the given dict. Every attribute, including nested models,
+    dates and enums, is cast on first access and cached on the instance.
+    The variant is a subclass of the given class, nested models are decoded into lazy variants as well.
+
+    :param model_cls: Model class, e.g. :class:`Policy`.
+    :return: Lazy model class.
+    """
+    return _make_variant('lazy', model_cls, _create_lazy, _complete_lazy)
+
+
+def _memoize_value(value):
+    if type(value) is list:
+        return [_memoize_value(item) for item in value]
+    if isinstance(value, BaseModel):
+        return memoize(value)
+    return value
+
+
+def _memoized_setattr(self, name, value):
+    object.__setattr__(self, name, value)
+    self.__dict__['_version'] = self.__dict__.get('_version', 0) + 1
+
+
+def _memoized_delattr(self, name):
+    object.__delattr__(self, name)
+    self.__dict__['_version'] = self.__dict__.get('_version', 0) + 1
+
+
+def _create_memoized(model_cls):
+    return type(model_cls.__name__, (model_cls,), {
+        '__doc__': model_cls.__doc__, '__module__': model_cls.__module__, '__model__': _base_model(model_cls),
+        '__memoized__': True,
+        '__setattr__': _memoized_setattr, '__delattr__': _memoized_delattr,
+    })
+
+
+def memoized(model_cls):
+    """Returns variant of the given model class that memoizes the encoded JSON fragment of its instances.
+
+    An instance encoded once, e.g. the same :class:`Person` in quote and create requests,
+    is not encoded again: :meth:`BaseModel.encode` and the serializers reuse its JSON-ready dict.
+    Setting an attribute of the instance or of a nested memoized model, or changing a list attribute in place,
+    invalidates the fragment. An instance with a nested model that is not memoized is encoded every time,
+    as changes of the nested model can't be tracked, see :func:`memoize`.
+    The fragment is shared and must not be modified.
+    The variant is a subclass of the given class, nested models are decoded into memoized variants as well.
+
+    :param model_cls: Model class, e.g. :class:`Person`.
+    :return: Memoized model class.
+    """
+    return _make_variant('memoized', model_cls, _create_memoized)
+
+
+def memoize(obj):
+    """Returns memoized copy of the given model instance, see :func:`memoized`.
+
+    Nested models are copied into memoized variants as well, so the fragments of all of them are kept.
+
+    :param obj: Model instance, e.g. :class:`QuoteRequest`.
+    :return: Instance of the memoized variant of the class, the given instance if it is memoized already.
+    """
+    if getattr(type(obj), '__memoized__', False):
+        return obj
+    return memoized(type(obj))(**{name: _memoize_value(getattr(obj, name, None)) for name in type(obj).__attrs__})
+
+
+def _freeze_value(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze_value(item) for item in value)
+    if isinstance(value, BaseModel):
+        return freeze(value)
+    return value
+
+
+def _frozen_setattr(self, name, value):
+    if '_hash' in self.__dict__:
+        raise AttributeError('{} instance is frozen'.format(type(self).__name__))
+    object.__setattr__(self, name, value)
+
+
+def _frozen_delattr(self, name):
+    raise AttributeError('{} instance is frozen'.format(type(self).__name__))
+
+
+def _frozen_eq(self, other):
+    if not getattr(type(other), '__frozen__', False) or other.__model__ is not self.__model__:
+        return NotImplemented
+    return self._hash == other._hash and self._key == other._key
+
+
+def _frozen_ne(self, other):
+    eq = _frozen_eq(self, other)
+    return eq if eq is NotImplemented else not eq
+
+
+def _frozen_hash(self):
+    return self._hash
+
+
+def _frozen_decode(cls, dct):
+    # Lazy decoding of a base variant would skip __init__, the hash needs every attribute anyway.
+    return get_decoder(cls)(dct)
+
+
+def _create_frozen(model_cls):
+    def __init__(self, *args, **kwargs):
+        model_cls.__init__(self, *args, **kwargs)
+        # Attributes of compact variants live in slots, not in the instance __dict__.
+        values = tuple(_freeze_value(getattr(self, name, None)) for name in type(self).__attrs__)
+        for name, value in zip(type(self).__attrs__, values):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, '_key', values)
+        object.__setattr__(self, '_hash', hash((self.__model__, values)))
+
+    return type(model_cls.__name__, (model_cls,), {
+        '__doc__': model_cls.__doc__, '__module__': model_cls.__module__, '__model__': _base_model(model_cls),
+        '__frozen__': True, 'decode': classmethod(_frozen_decode),
+        '__init__': __init__, '__setattr__': _frozen_setattr, '__delattr__': _frozen_delattr,
+        '__eq__': _frozen_eq, '__ne__': _frozen_ne, '__hash__': _frozen_hash,
+    })
+
+
+def frozen(model_cls):
+    """Returns immutable variant of the given model class with structural equality and hashing.
+
+    Instances of the variant are equal if their attributes listed in ``__attrs__`` are equal,
+    so they can be set members and dict keys, e.g. for deduplication of quote requests.
+    Frozen instances of other variants of the same model, e.g. of ``frozen(lazy(Person))``, compare equal as well.
+    Frozen variants are decoded eagerly, even on top of :func:`lazy`.
+    Lists become tuples and nested models are frozen on construction, then the hash is computed once.
+    Setting an attribute raises AttributeError.
+    The variant is a subclass of the given class, nested models are decoded into frozen variants as well.
+
+    :param model_cls: Model class, e.g. :class:`QuoteRequest`.
+    :return: Frozen model class.
+    :raises TypeError: On construction, if an attribute value is not hashable.
+    """
+    return _make_variant('frozen', model_cls, _create_frozen)
+
+
+def freeze(obj):
+    """Returns frozen copy of the given model instance, see :func:`frozen`.
+
+    :param obj: Model instance, e.g. :class:`QuoteRequest`.
+    :return: Instance of the frozen variant of the class, the given instance if it is frozen already.
+    """
+    if getattr(type(obj), '__frozen__', False):
+        return obj
+    return frozen(type(obj))(**{name: getattr(obj, name, None) for name in type(obj).__attrs__})
+
+
+_factories = {'slotted': slotted, 'lazy': lazy, 'memoized': memoized, 'frozen': frozen}
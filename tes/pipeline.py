@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+"""
+tes.pipeline
+~~~~~~~~~~~~
+
+This module contains the quote, create and confirm workflow of insurance policies of one booking.
+"""
+import time
+from contextlib import contextmanager
+
+from .deadline import Deadline
+from .models import CreateRequest, CreateResponse, QuoteRequest, memoize
+
+
+class BasePolicyPipeline(object):
+    """Base class of policy pipelines.
+
+    The quote request is copied into memoized models, see :func:`tes.models.memoize`, so its insureds,
+    segments and other parameters encoded for the quote are reused by the create request,
+    and the session id of the quote response is carried forward to the create and confirm requests.
+    """
+
+    def __init__(self, client, quote_request):
+        """Init.
+
+        :param client: API client.
+        :param quote_request: Quote request of the booking.
+        :type quote_request: QuoteRequest
+        """
+        self.client = client
+        self.quote_request = memoize(quote_request)
+        self.session_id = quote_request.session_id
+        self.quote_response = None
+        self.create_response = None
+        self.timings = {}
+
+    @contextmanager
+    def timed(self, stage):
+        """Records time in seconds spent in the given stage, e.g. 'quote', in `timings`."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.timings[stage] = time.monotonic() - started
+
+    def make_create_request(self, params):
+        """Returns create request, the quote request extended by the given create parameters.
+
+        :param params: Parameters of :class:`CreateRequest` that are not in the quote request, e.g. pnr.
+        :type params: dict
+        :rtype: CreateRequest
+        """
+        attrs = {name: getattr(self.quote_request, name, None) for name in QuoteRequest.__attrs__}
+        if self.session_id is not None:
+            attrs['session_id'] = self.session_id
+        for name, value in params.items():
+            if name not in CreateRequest.__attrs__:
+                raise TypeError('Unexpected create parameter {}'.format(name))
+            if value is not None:
+                attrs[name] = value
+        return CreateRequest(**attrs)
+
+    def set_quote_response(self, quote_response):
+        """Stores the quote response and takes over its session id."""
+        self.quote_response = quote_response
+        if quote_response.session_id is not None:
+            self.session_id = quote_response.session_id
+
+    @property
+    def policy_ids(self):
+        """Ids of the created policies.
+
+        :rtype: list[int]
+        """
+        if self.create_response is None:
+            return []
+        return [policy.policy_id for policy in self.create_response.policies]
+
+
+class PolicyPipeline(BasePolicyPipeline):
+    """Quotes, creates and confirms insurance policies of one booking with :class:`AlfaStrahTESClient`.
+
+    Usage::
+
+        pipeline = PolicyPipeline(client, QuoteRequest(product=product, insureds=insureds, segments=segments))
+        pipeline.quote()
+        outcomes = pipeline.run(pnr='TR097S', customer_email='example@mail.com')
+        pipeline.timings  # {'quote': 0.31, 'create': 0.52, 'confirm': 0.24}
+    """
+
+    def quote(self, timeout=None, deadline=None):
+        """Calculates the cost of the insurance policies, see :meth:`AlfaStrahTESClient.quote_one`.
+
+        :rtype: QuoteResponse
+        """
+        with self.timed('quote'):
+            quote_response = self.client.quote_one(self.quote_request, timeout=timeout, deadline=deadline)
+        self.set_quote_response(quote_response)
+        return quote_response
+
+    def create(self, timeout=None, deadline=None, **params):
+        """Creates the insurance policies in the session of the quote, see :meth:`AlfaStrahTESClient.create`.
+
+        :param params: Parameters of :class:`CreateRequest` that are not in the quote request,
+            e.g. ``pnr='TR097S'``, ``insurer=Person(...)``.
+        :rtype: CreateResponse
+        """
+        create_request = self.make_create_request(params)
+        with self.timed('create'):
+            self.create_response = self.client.request(
+                'POST', '/policies', data=create_request, resp_cls=CreateResponse,
+                idempotent=params.get('external_id') is not None, timeout=timeout, deadline=deadline)
+        return self.create_response
+
+    def confirm(self, max_concurrency=None, timeout=None, deadline=None):
+        """Confirms the created insurance policies in parallel, see :meth:`AlfaStrahTESClient.confirm_many`.
+
+        :return: (policy id, True or :class:`TESException` if the confirmation failed) for each policy.
+        :rtype: list[tuple[int, bool or TESException]]
+        """
+        with self.timed('confirm'):
+            return self.client.confirm_many(self.policy_ids, session_id=self.session_id,
+                                            max_concurrency=max_concurrency, timeout=timeout, deadline=deadline)
+
+    def run(self, max_concurrency=None, timeout=None, deadline=None, **params):
+        """Quotes the insurance policies unless already quoted, then creates and confirms them.
+
+        :param deadline: (optional) Time in seconds the whole pipeline must complete in, or a shared deadline.
+        :type deadline: float or Deadline or None
+        :param params: Parameters of :class:`CreateRequest` that are not in the quote request.
+        :return: Outcome of the confirmation of each policy, see :meth:`confirm`.
+        :rtype: list[tuple[int, bool or TESException]]
+        """
+        deadline = Deadline.coerce(deadline)
+        if self.quote_response is None:
+            self.quote(timeout=timeout, deadline=deadline)
+        self.create(timeout=timeout, deadline=deadline, **params)
+        return self.confirm(max_concurrency=max_concurrency, timeout=timeout, deadline=deadline)
+
+
+class AsyncPolicyPipeline(BasePolicyPipeline):
+    """Coroutine version of :class:`PolicyPipeline` working with :class:`AsyncAlfaStrahTESClient`."""
+
+    async def quote(self, timeout=None, deadline=None):
+        """See :meth:`PolicyPipeline.quote`."""
+        with self.timed('quote'):
+            quote_response = await self.client.quote_one(self.quote_request, timeout=timeout, deadline=deadline)
+        self.set_quote_response(quote_response)
+        return quote_response
+
+    async def create(self, timeout=None, deadline=None, **params):
+        """See :meth:`PolicyPipeline.create`."""
+        create_request = self.make_create_request(params)
+        with self.timed('create'):
+            self.create_response = await self.client.request(
+                'POST', '/policies', data=create_request, resp_cls=CreateResponse,
+                idempotent=params.get('external_id') is not None, timeout=timeout, deadline=deadline)
+        return self.create_response
+
+    async def confirm(self, max_concurrency=None, timeout=None, deadline=None):
+        """See :meth:`PolicyPipeline.confirm`."""
+        with self.timed('confirm'):
+            return await self.client.confirm_many(self.policy_ids, session_id=self.session_id,
+                                                  max_concurrency=max_concurrency, timeout=timeout,
+                                                  deadline=deadline)
+
+    async def run(self, max_concurrency=None, timeout=None, deadline=None, **params):
+        """See :meth:`PolicyPipeline.run`."""
+        deadline = Deadline.coerce(deadline)
+        if self.quote_response is None:
+            await self.quote(timeout=timeout, deadline=deadline)
+        await self.create(timeout=timeout, deadline=deadline, **params)
+        return await self.confirm(max_concurrency=max_concurrency, timeout=timeout, deadline=deadline)
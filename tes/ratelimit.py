@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+"""
+tes.ratelimit
+~~~~~~~~~~~~~
+
+This module contains the client-side rate limiter of API calls.
+"""
+import asyncio
+import threading
+import time
+
+from .exceptions import DeadlineExceededException, RateLimitExceededException
+
+
+class _Bucket(object):
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Returns time in seconds until a token is available."""
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class RateLimiter(object):
+    """Token-bucket rate limiter with a global limit and limits per endpoint, e.g. '/policies/quote'.
+
+    A call takes a token from the global bucket and from the bucket of its endpoint.
+    If there is no token, the call either waits for one up to `timeout` seconds,
+    or fails with :class:`RateLimitExceededException` at once.
+    A call that would wait past its deadline fails with :class:`DeadlineExceededException`.
+    The same limiter can be shared by several sync and async clients.
+    """
+
+    def __init__(self, rate=None, burst=None, endpoint_limits=None, timeout=None, clock=time.monotonic):
+        """Init.
+
+        :param rate: (optional) Global limit, calls per second. No global limit if not specified.
+        :type rate: float or None
+        :param burst: Maximum number of calls made at once, i.e. size of the bucket, default: `rate` but at least 1.
+        :type burst: float or None
+        :param endpoint_limits: (optional) Limits of endpoints, ``{endpoint: rate}`` or ``{endpoint: (rate, burst)}``,
+            e.g. ``{'/policies/quote': 20}``.
+        :type endpoint_limits: dict or None
+        :param timeout: Maximum time in seconds a call waits for a token, zero rejects it at once,
+            None waits as long as needed.
+        :type timeout: float or None
+        :param clock: Function returning current time in seconds.
+        :type clock: callable
+        """
+        self.timeout = timeout
+        self.clock = clock
+        self.acquired = 0
+        self.delayed = 0
+        self.rejected = 0
+        now = clock()
+        self._global = self._make_bucket(rate, burst, now) if rate is not None else None
+        self._buckets = {}
+        for endpoint, limit in (endpoint_limits or {}).items():
+            limit_rate, limit_burst = limit if isinstance(limit, tuple) else (limit, None)
+            self._buckets[endpoint] = self._make_bucket(limit_rate, limit_burst, now)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _make_bucket(rate, burst, now):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        return _Bucket(rate, burst if burst is not None else max(1.0, rate), now)
+
+    def reserve(self, endpoint, timeout=None):
+        """Takes a token for a call of the given endpoint and returns time in seconds to wait before the call.
+
+        :param endpoint: Endpoint, e.g. '/policies/quote'.
+        :type endpoint: str
+        :param timeout: (optional) Time in seconds left before the deadline of the call.
+        :type timeout: float or None
+        :rtype: float
+        :raises RateLimitExceededException: If the call would have to wait longer than the limiter's `timeout`.
+        :raises DeadlineExceededException: If the call would have to wait past its deadline.
+        """
+        with self._lock:
+            now = self.clock()
+            buckets = [bucket for bucket in (self._global, self._buckets.get(endpoint)) if bucket is not None]
+            wait = 0.0
+            for bucket in buckets:
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_time())
+            if timeout is not None and wait > timeout and (self.timeout is None or timeout < self.timeout):
+                self.rejected += 1
+                raise DeadlineExceededException('Deadline exceeded')
+            if self.timeout is not None and wait > self.timeout:
+                self.rejected += 1
+                raise RateLimitExceededException('Rate limit exceeded for {}'.format(endpoint))
+            # A token is taken in advance, so calls waiting for tokens are served in turn.
+            for bucket in buckets:
+                bucket.tokens -= 1
+            self.acquired += 1
+            if wait > 0:
+                self.delayed += 1
+            return wait
+
+    def acquire(self, endpoint, timeout=None):
+        """Waits for a token for a call of the given endpoint, see :meth:`reserve`."""
+        wait = self.reserve(endpoint, timeout)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, endpoint, timeout=None):
+        """Coroutine version of :meth:`acquire`."""
+        wait = self.reserve(endpoint, timeout)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    @property
+    def stats(self):
+        """Limiter counters: calls let through, calls that waited for a token and rejected calls.
+
+        :rtype: dict
+        """
+        return {
+            'acquired': self.acquired,
+            'delayed': self.delayed,
+            'rejected': self.rejected,
+        }
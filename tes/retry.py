@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+tes.retry
+~~~~~~~~~
+
+This module contains the retry policy of API calls.
+"""
+import datetime
+import random
+from email.utils import parsedate_to_datetime
+
+from .exceptions import ConnectErrorException, TransportErrorException
+
+DEFAULT_STATUS_CODES = frozenset([429, 502, 503, 504])
+
+# The request was rejected before it was processed, so it can be repeated even if it is not idempotent.
+NOT_PROCESSED_STATUS_CODES = frozenset([429])
+
+
+class RetryPolicy(object):
+    """Retry policy of API calls: exponential backoff with jitter, honoring the ``Retry-After`` header.
+
+    A call that is not idempotent, e.g. creation of a policy without an external id, is repeated
+    only if it surely wasn't processed: the connection could not be established, or the request
+    was rejected with 429 Too Many Requests.
+    """
+
+    def __init__(self, max_attempts=3, backoff_factor=0.2, max_backoff=10.0, jitter=True,
+                 status_codes=DEFAULT_STATUS_CODES, retry_transport_errors=True,
+                 respect_retry_after=True, max_retry_after=30.0, rand=random.random):
+        """Init.
+
+        :param max_attempts: Maximum number of attempts of a call, including the first one.
+        :type max_attempts: int
+        :param backoff_factor: Delay in seconds before the second attempt, doubled for every next attempt.
+        :type backoff_factor: float
+        :param max_backoff: Maximum delay in seconds between attempts.
+        :type max_backoff: float
+        :param jitter: Pick a random delay between zero and the backoff ("full jitter"),
+            so that clients failed at the same time don't retry at the same time.
+        :type jitter: bool
+        :param status_codes: HTTP status codes of responses to retry.
+        :type status_codes: Iterable[int]
+        :param retry_transport_errors: Retry calls failed with :class:`TransportErrorException`.
+        :type retry_transport_errors: bool
+        :param respect_retry_after: Wait at least for the time given in the ``Retry-After`` response header.
+        :type respect_retry_after: bool
+        :param max_retry_after: Give up instead of waiting, if ``Retry-After`` is longer than this, in seconds.
+        :type max_retry_after: float
+        :param rand: Function returning a random float in [0, 1).
+        :type rand: callable
+        """
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.status_codes = frozenset(status_codes)
+        self.retry_transport_errors = retry_transport_errors
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+        self.rand = rand
+
+    def backoff(self, attempt):
+        """Returns delay in seconds after the given failed attempt, starting from 1."""
+        delay = min(self.max_backoff, self.backoff_factor * 2 ** (attempt - 1))
+        return delay * self.rand() if self.jitter else delay
+
+    def get_delay(self, attempt, idempotent, status_code=None, headers=None, error=None):
+        """Returns delay in seconds before the next attempt, or None if the call must not be repeated.
+
+        :param attempt: Number of the failed attempt, starting from 1.
+        :type attempt: int
+        :param idempotent: The call can be safely repeated after it was processed.
+        :type idempotent: bool
+        :param status_code: HTTP status code of the failed attempt.
+        :type status_code: int or None
+        :param headers: Response headers of the failed attempt.
+        :type headers: Mapping or None
+        :param error: Error the failed attempt raised.
+        :type error: TESException or None
+        :rtype: float or None
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if error is not None:
+            if not self.retry_transport_errors or not isinstance(error, TransportErrorException):
+                return None
+            if not idempotent and not isinstance(error, ConnectErrorException):
+                return None
+            return self.backoff(attempt)
+        if status_code not in self.status_codes:
+            return None
+        if not idempotent and status_code not in NOT_PROCESSED_STATUS_CODES:
+            return None
+        delay = self.backoff(attempt)
+        if self.respect_retry_after and headers:
+            retry_after = parse_retry_after(headers.get('Retry-After'))
+            if retry_after is not None:
+                if retry_after > self.max_retry_after:
+                    return None
+                delay = max(delay, retry_after)
+        return delay
+
+
+def parse_retry_after(value, now=None):
+    """Returns delay in seconds given by the ``Retry-After`` header, either in seconds or as HTTP date.
+
+    :param value: Header value, e.g. '120' or 'Wed, 21 Oct 2015 07:28:00 GMT'.
+    :type value: str or None
+    :param now: Current time, aware datetime, default: now.
+    :type now: datetime.datetime or None
+    :return: Delay in seconds or None, if the value is missing or invalid.
+    :rtype: float or None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    now = now if now is not None else datetime.datetime.now(datetime.timezone.utc)
+    return max(0.0, (date - now).total_seconds())
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+"""
+tes.serializers
+~~~~~~~~~~~~~~~
+
+This module contains JSON backends used to serialize request bodies and parse response bodies.
+
+Values are converted into JSON-ready structures by :func:`tes.codec.encode_value` before they are handed
+over to a backend, so every backend produces the same wire output for Decimal, Enum, date and datetime.
+"""
+import json
+from decimal import Decimal
+from json.encoder import encode_basestring
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+from .codec import encode_value
+
+
+class Serializer(object):
+    """JSON backend."""
+
+    name = None
+
+    def dumps(self, obj):
+        """Serializes the given object.
+
+        :param obj: Model instance or JSON-ready Python structure.
+        :return: Compact UTF-8 encoded JSON.
+        :rtype: bytes
+        """
+        raise NotImplementedError
+
+    def loads(self, s):
+        """Parses the given JSON.
+
+        :param s: JSON document.
+        :type s: bytes or str
+        :return: JSON Python object.
+        :raises ValueError: If the document is not valid JSON.
+        """
+        raise NotImplementedError
+
+
+class StdlibSerializer(Serializer):
+    """JSON backend on top of the standard :mod:`json` module."""
+
+    name = 'json'
+
+    def __init__(self, lossless_decimal=False):
+        """Init.
+
+        :param lossless_decimal: Write Decimal values as exact JSON numbers instead of converting them to float,
+            and parse JSON numbers with a fraction or exponent into Decimal, see :func:`dumps_decimal`.
+        :type lossless_decimal: bool
+        """
+        self.lossless_decimal = lossless_decimal
+
+    def dumps(self, obj):
+        if self.lossless_decimal:
+            return dumps_decimal(encode_value(obj, keep_decimal=True)).encode('utf-8')
+        return json.dumps(encode_value(obj), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, s):
+        if self.lossless_decimal:
+            return json.loads(s, parse_float=Decimal)
+        return json.loads(s)
+
+
+class OrjsonSerializer(Serializer):
+    """JSON backend on top of `orjson <https://github.com/ijl/orjson>`_."""
+
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError('orjson is required for OrjsonSerializer, install it with "pip install tes[orjson]"')
+
+    def dumps(self, obj):
+        return orjson.dumps(encode_value(obj))
+
+    def loads(self, s):
+        return orjson.loads(s)
+
+
+class UjsonSerializer(Serializer):
+    """JSON backend on top of `ujson <https://github.com/ultrajson/ultrajson>`_."""
+
+    name = 'ujson'
+
+    def __init__(self):
+        if ujson is None:
+            raise ImportError('ujson is required for UjsonSerializer, install it with "pip install tes[ujson]"')
+
+    def dumps(self, obj):
+        return ujson.dumps(encode_value(obj), ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+    def loads(self, s):
+        return ujson.loads(s)
+
+
+def dumps_decimal(obj):
+    """Serializes the given JSON-ready structure, writing Decimal values as exact JSON numbers.
+
+    The output is the same as of compact :func:`json.dumps` with ``ensure_ascii=False``,
+    which can't write a number literal other than of int or float.
+
+    :param obj: JSON-ready Python structure that may contain Decimal, see :func:`tes.codec.encode_value`.
+    :rtype: str
+    :raises ValueError: If a Decimal is NaN or infinite.
+    :raises TypeError: If the structure contains an object that is not JSON serializable.
+    """
+    chunks = []
+    _write_json(obj, chunks.append)
+    return ''.join(chunks)
+
+
+def _write_json(o, append):
+    tp = type(o)
+    if tp is str:
+        append(encode_basestring(o))
+    elif tp is dict:
+        append('{')
+        first = True
+        for k, v in o.items():
+            if first:
+                first = False
+            else:
+                append(',')
+            append(encode_basestring(k if isinstance(k, str) else json.dumps(k)))
+            append(':')
+            _write_json(v, append)
+        append('}')
+    elif tp is list or tp is tuple:
+        append('[')
+        first = True
+        for v in o:
+            if first:
+                first = False
+            else:
+                append(',')
+            _write_json(v, append)
+        append(']')
+    elif tp is Decimal:
+        if not o.is_finite():
+            raise ValueError('Out of range Decimal value is not JSON compliant: {}'.format(o))
+        append(str(o))
+    elif o is None:
+        append('null')
+    elif o is True:
+        append('true')
+    elif o is False:
+        append('false')
+    elif tp is int:
+        append(int.__repr__(o))
+    elif tp is float:
+        # NaN and Infinity are written the same way as json.dumps() does.
+        append(float.__repr__(o) if o - o == 0 else json.dumps(o))
+    else:
+        # Subclasses are written as their base types.
+        for base in (str, int, float, Decimal, dict, list, tuple):
+            if isinstance(o, base):
+                _write_json(base(o), append)
+                return
+        raise TypeError('Object of type {} is not JSON serializable'.format(tp.__name__))
+
+
+SERIALIZERS = {
+    StdlibSerializer.name: StdlibSerializer,
+    OrjsonSerializer.name: OrjsonSerializer,
+    UjsonSerializer.name: UjsonSerializer,
+}
+
+
+def get_serializer(serializer=None):
+    """Returns JSON backend.
+
+    :param serializer: Backend or its name, one of ``SERIALIZERS``, e.g. 'orjson'.
+        The standard :mod:`json` backend is used if not specified.
+    :type serializer: Serializer or str or None
+    :rtype: Serializer
+    """
+    if serializer is None:
+        return StdlibSerializer()
+    if isinstance(serializer, Serializer):
+        return serializer
+    try:
+        return SERIALIZERS[serializer]()
+    except KeyError:
+        raise ValueError('Unknown serializer: {}'.format(serializer))
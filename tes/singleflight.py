@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""
+tes.singleflight
+~~~~~~~~~~~~~~~~
+
+This module contains deduplication of identical calls in flight.
+"""
+import asyncio
+import threading
+import time
+
+from .exceptions import DeadlineExceededException
+
+
+class _Call(object):
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Lets only one of concurrent calls with the same key run, the others wait for it and share its outcome.
+
+    The outcome is shared as is: every caller gets the same result object, or the same exception raised.
+    The exception is :class:`DeadlineExceededException` only if the deadline of the caller that made the call
+    has passed, so the others don't take it over: they make the call again within their own time.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout=None):
+        """Returns ``fn()``, or the outcome of the call with the same key already in flight.
+
+        :param key: Call key, e.g. request method, path, params and body.
+        :type key: Hashable
+        :param fn: Function making the call.
+        :type fn: callable
+        :param timeout: (optional) Maximum time in seconds to wait for the call in flight.
+        :type timeout: float or None
+        :raises DeadlineExceededException: If the call in flight didn't complete in time.
+        """
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.calls += 1
+                else:
+                    self.shared += 1
+            if leader:
+                break
+            remaining = max(0.0, expires_at - time.monotonic()) if expires_at is not None else None
+            if not call.done.wait(remaining):
+                raise DeadlineExceededException('Deadline exceeded')
+            if isinstance(call.error, DeadlineExceededException):
+                # The deadline of the caller that made the call has passed, not necessarily this one.
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    @property
+    def stats(self):
+        """Counters: calls made and calls that shared the outcome of a call in flight.
+
+        :rtype: dict
+        """
+        return {
+            'calls': self.calls,
+            'shared': self.shared,
+        }
+
+
+class AsyncSingleFlight(object):
+    """Coroutine version of :class:`SingleFlight`.
+
+    The call runs in its own task, so a caller that is cancelled doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._calls = {}
+
+    async def do(self, key, fn, timeout=None):
+        """Returns ``await fn()``, or the outcome of the call with the same key already in flight.
+
+        See :meth:`SingleFlight.do`.
+        """
+        loop = asyncio.get_event_loop()
+        expires_at = loop.time() + timeout if timeout is not None else None
+        while True:
+            task = self._calls.get(key)
+            leader = task is None or task.done()
+            if leader:
+                task = self._calls[key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda t: self._calls.pop(key, None) if self._calls.get(key) is t else None)
+                self.calls += 1
+            else:
+                self.shared += 1
+            remaining = max(0.0, expires_at - loop.time()) if expires_at is not None else None
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), remaining)
+            except DeadlineExceededException:
+                # The deadline of the caller that made the call has passed, not necessarily this one.
+                if leader:
+                    raise
+            except asyncio.TimeoutError:
+                raise DeadlineExceededException('Deadline exceeded')
+
+    @property
+    def stats(self):
+        """See :attr:`SingleFlight.stats`."""
+        return {
+            'calls': self.calls,
+            'shared': self.shared,
+        }
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+
+import pytest
+
+from .utils import FakeResponse, FakeTransport, read_response
+from tes import AsyncAlfaStrahTESClient
+from tes import InsuranceProduct, Person, PolicyStatus, QuoteRequest, QuoteResponse
+from tes import TESException, AuthErrorException
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestAsyncClient:
+    def test_get_policy(self):
+        transport = FakeTransport([FakeResponse(content=read_response('policies/policy.json'))])
+
+        async def main():
+            async with AsyncAlfaStrahTESClient('key', transport=transport) as client:
+                return await client.get_policy(21684956)
+
+        policy = run(main())
+        assert policy.policy_id == 21684956
+        assert policy.status == PolicyStatus.CONFIRMED
+        assert transport.calls[0][0] == 'GET'
+
+    def test_get_products(self):
+        transport = FakeTransport([FakeResponse(content=read_response('products/products.json'))])
+        client = AsyncAlfaStrahTESClient('key', transport=transport)
+        products = run(client.get_products('AIR'))
+        assert all(isinstance(product, InsuranceProduct) for product in products)
+        assert transport.calls[0][1].endswith('/products/AIR')
+
+    def test_quote_body(self):
+        transport = FakeTransport([FakeResponse(content=b'{"session_id": "s1", "quotes": []}')])
+        client = AsyncAlfaStrahTESClient('key', transport=transport)
+        resp = run(client.quote(product=InsuranceProduct('P1'), insureds=[Person(first_name='Arthur')]))
+        assert isinstance(resp, QuoteResponse)
+        body = json.loads(transport.calls[0][2]['data'])
+        assert body['product']['code'] == 'P1'
+        assert body['insureds'][0]['first_name'] == 'Arthur'
+
+    def test_errors(self):
+        transport = FakeTransport([
+            FakeResponse(401, read_response('errors/401_unauthorized.json')),
+            FakeResponse(500, read_response('errors/500_internal_error.json')),
+        ])
+        client = AsyncAlfaStrahTESClient('key', transport=transport)
+        with pytest.raises(AuthErrorException):
+            run(client.get_products())
+        with pytest.raises(TESException, match='Internal error'):
+            run(client.confirm(21684956))
+
+    def test_concurrent_calls(self):
+        transport = FakeTransport(handler=lambda *args, **kwargs: FakeResponse(content=b'true'))
+        client = AsyncAlfaStrahTESClient('key', transport=transport)
+
+        async def main():
+            return await asyncio.gather(*(client.confirm(i) for i in range(50)))
+
+        assert run(main()) == [True] * 50
+        assert len(transport.calls) == 50
+
+    def test_quote_many(self):
+        def handler(method, url, **kwargs):
+            session_id = json.loads(kwargs['data'])['session_id']
+            if session_id == 'fail':
+                return FakeResponse(500, read_response('errors/500_internal_error.json'))
+            return FakeResponse(content=json.dumps({'session_id': session_id, 'quotes': []}).encode())
+
+        client = AsyncAlfaStrahTESClient('key', transport=FakeTransport(handler=handler))
+        session_ids = ['s1', 'fail', 's2']
+        results = run(client.quote_many([QuoteRequest(session_id=s) for s in session_ids], max_concurrency=2))
+        assert results[0].session_id == 's1'
+        assert isinstance(results[1], TESException)
+        assert results[2].session_id == 's2'
+
+    def test_get_policies(self):
+        def handler(method, url, **kwargs):
+            policy_id = int(url.rsplit('/', 1)[1])
+            if policy_id == 0:
+                return FakeResponse(500, read_response('errors/500_internal_error.json'))
+            policy = json.loads(read_response('policies/policy.json'))
+            policy['policy_id'] = policy_id
+            return FakeResponse(content=json.dumps(policy).encode())
+
+        client = AsyncAlfaStrahTESClient('key', transport=FakeTransport(handler=handler))
+
+        async def main():
+            return {policy_id: policy async for policy_id, policy in client.get_policies(range(20), max_concurrency=3)}
+
+        results = run(main())
+        assert len(results) == 20
+        assert isinstance(results[0], TESException)
+        assert all(results[policy_id].policy_id == policy_id for policy_id in range(1, 20))
+
+    def test_confirm_many(self):
+        def handler(method, url, **kwargs):
+            if '/0/' in url:
+                return FakeResponse(500, read_response('errors/500_internal_error.json'))
+            return FakeResponse(content=b'true')
+
+        client = AsyncAlfaStrahTESClient('key', transport=FakeTransport(handler=handler))
+        outcomes = run(client.confirm_many([1, 0, 2], session_id='s1'))
+        assert [outcome for _, outcome in outcomes][::2] == [True, True]
+        assert isinstance(outcomes[1][1], TESException)
+
+
+class TestAiohttpTransport:
+    def test_connect_timeout(self):
+        aiohttp = pytest.importorskip('aiohttp')
+        if not hasattr(aiohttp, 'ConnectionTimeoutError'):
+            pytest.skip('aiohttp < 3.10 has no ConnectionTimeoutError')
+        from tes.async_client import is_connect_timeout
+        assert is_connect_timeout(aiohttp.ConnectionTimeoutError('Connection timeout to host https://example.com'))
+        assert not is_connect_timeout(aiohttp.SocketTimeoutError('Timeout on reading data from socket'))
+        assert not is_connect_timeout(aiohttp.ServerTimeoutError('Connection timeout to host https://example.com'))
+
+    def test_connect_timeout_by_message(self):
+        aiohttp = pytest.importorskip('aiohttp')
+        if hasattr(aiohttp, 'ConnectionTimeoutError'):
+            pytest.skip('aiohttp >= 3.10 tells connect timeouts apart by type')
+        from tes.async_client import is_connect_timeout
+        assert is_connect_timeout(aiohttp.ServerTimeoutError('Connection timeout to host https://example.com'))
+        assert not is_connect_timeout(aiohttp.ServerTimeoutError('Timeout on reading data from socket'))
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+import pytest
+import requests
+
+from .utils import Clock, FakeResponse, FakeSession, FakeTransport, HangingTransport, error_response, policy_response
+from tes import AlfaStrahTESClient, AsyncAlfaStrahTESClient, CircuitBreaker, CircuitState, RetryPolicy
+from tes import AuthErrorException, CircuitOpenException, DeadlineExceededException, TESException
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, clock=Clock())
+        breaker.record_failure('/policies')
+        breaker.record_success('/policies')
+        breaker.record_failure('/policies')
+        assert breaker.state('/policies') == CircuitState.CLOSED
+        breaker.record_failure('/policies')
+        assert breaker.state('/policies') == CircuitState.OPEN
+        assert breaker.is_open('/policies')
+        assert not breaker.is_open('/products')
+        with pytest.raises(CircuitOpenException):
+            breaker.before_call('/policies')
+        assert breaker.stats['/policies']['rejected'] == 1
+        assert breaker.stats['/policies']['opened'] == 1
+
+    def test_half_open(self):
+        clock = Clock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, clock=clock)
+        breaker.record_failure('/policies')
+        clock.now = 10
+        assert breaker.state('/policies') == CircuitState.HALF_OPEN
+        breaker.before_call('/policies')
+        with pytest.raises(CircuitOpenException):
+            breaker.before_call('/policies')
+        breaker.record_failure('/policies')
+        assert breaker.state('/policies') == CircuitState.OPEN
+        clock.now = 20
+        breaker.before_call('/policies')
+        breaker.record_success('/policies')
+        assert breaker.state('/policies') == CircuitState.CLOSED
+
+    def test_cancelled_trial(self):
+        clock = Clock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, clock=clock)
+        breaker.record_failure('/policies')
+        clock.now = 10
+        breaker.before_call('/policies')
+        breaker.record_cancel('/policies')
+        breaker.before_call('/policies')
+        assert breaker.state('/policies') == CircuitState.HALF_OPEN
+
+
+class TestClientCircuitBreaker:
+    @pytest.mark.parametrize(
+        'path, endpoint', (
+            ('/policies/quote', '/policies/quote'),
+            ('/policies', '/policies'),
+            ('/policies/21684956/confirm', '/policies'),
+            ('/products/AIR', '/products'),
+        ))
+    def test_endpoint(self, path, endpoint):
+        assert AlfaStrahTESClient.get_endpoint(path) == endpoint
+
+    def test_fails_fast(self):
+        session = FakeSession([error_response(), requests.ConnectionError('Connection refused')])
+        breaker = CircuitBreaker(failure_threshold=2)
+        client = AlfaStrahTESClient('key', session=session, circuit_breaker=breaker)
+        for _ in range(2):
+            with pytest.raises(TESException):
+                client.get_policy(21684956)
+        with pytest.raises(CircuitOpenException):
+            client.get_policy(21684956)
+        assert len(session.calls) == 2
+        assert breaker.is_open('/policies')
+        assert not breaker.is_open('/policies/quote')
+
+    def test_client_errors_are_not_failures(self):
+        session = FakeSession([FakeResponse(401, b'{"detail": "Unauthorized"}')] * 2)
+        breaker = CircuitBreaker(failure_threshold=1)
+        client = AlfaStrahTESClient('key', session=session, circuit_breaker=breaker)
+        for _ in range(2):
+            with pytest.raises(AuthErrorException):
+                client.get_policy(21684956)
+        assert breaker.state('/policies') == CircuitState.CLOSED
+
+    def test_stops_retries(self):
+        session = FakeSession([error_response()] * 3)
+        breaker = CircuitBreaker(failure_threshold=2)
+        client = AlfaStrahTESClient('key', session=session, circuit_breaker=breaker,
+                                    retry=RetryPolicy(max_attempts=3, backoff_factor=0))
+        with pytest.raises(CircuitOpenException):
+            client.get_policy(21684956)
+        assert len(session.calls) == 2
+
+    def test_async(self):
+        transport = FakeTransport([error_response(), policy_response()])
+        breaker = CircuitBreaker(failure_threshold=1)
+
+        async def main():
+            client = AsyncAlfaStrahTESClient('key', transport=transport, circuit_breaker=breaker)
+            with pytest.raises(TESException):
+                await client.get_policy(21684956)
+            with pytest.raises(CircuitOpenException):
+                await client.get_policy(21684956)
+
+        asyncio.run(main())
+        assert len(transport.calls) == 1
+
+    def test_deadline_is_not_failure(self):
+        def handler(method, url, **kwargs):
+            time.sleep(kwargs['timeout'][1] + 0.01)
+            raise requests.ReadTimeout('Read timed out')
+
+        breaker = CircuitBreaker(failure_threshold=1)
+        client = AlfaStrahTESClient('key', session=FakeSession(handler=handler), circuit_breaker=breaker)
+        with pytest.raises(DeadlineExceededException):
+            client.get_policy(1, deadline=0.05)
+        assert breaker.state('/policies') == CircuitState.CLOSED
+
+    def test_async_deadline_is_not_failure(self):
+        breaker = CircuitBreaker(failure_threshold=1)
+
+        async def main():
+            client = AsyncAlfaStrahTESClient('key', transport=HangingTransport(), circuit_breaker=breaker)
+            with pytest.raises(DeadlineExceededException):
+                await client.get_policy(21684956, deadline=0.05)
+
+        asyncio.run(main())
+        assert breaker.state('/policies') == CircuitState.CLOSED
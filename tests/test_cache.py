@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import threading
+import time
+
+import pytest
+
+from .utils import Clock, FakeResponse, FakeSession, read_response
+from tes import AlfaStrahTESClient, Deadline, LRUCacheBackend, QuoteCache, TTLCache
+from tes import InsuranceProduct, Person, QuoteRequest, TESException, freeze
+
+
+class TestTTLCache:
+    def test_fresh_value(self):
+        cache = TTLCache(ttl=10, clock=Clock())
+        loads = []
+        assert cache.get('AIR', lambda: loads.append(1) or 'v1') == 'v1'
+        assert cache.get('AIR', lambda: 'v2') == 'v1'
+        assert cache.stats['misses'] == 1
+        assert cache.stats['hits'] == 1
+
+    def test_stale_value_refreshed_in_background(self):
+        clock = Clock()
+        cache = TTLCache(ttl=10, stale_ttl=5, clock=clock)
+        cache.get('AIR', lambda: 'v1')
+        clock.now = 12
+        release = threading.Event()
+        refreshed = threading.Event()
+
+        def loader():
+            release.wait(1)
+            refreshed.set()
+            return 'v2'
+
+        assert cache.get('AIR', loader) == 'v1'
+        assert cache.get('AIR', loader) == 'v1'
+        release.set()
+        assert refreshed.wait(1)
+        for _ in range(100):
+            if cache.stats['refreshes']:
+                break
+            time.sleep(0.01)
+        assert cache.stats['refreshes'] == 1
+        assert cache.get('AIR', loader) == 'v2'
+        assert cache.stats['stale_hits'] == 2
+
+    def test_async_refresh_task_kept(self):
+        clock = Clock()
+        cache = TTLCache(ttl=10, stale_ttl=5, clock=clock)
+
+        async def main():
+            async def loader():
+                await asyncio.sleep(0.01)
+                return 'v2'
+
+            await cache.get_async('AIR', loader)
+            clock.now = 12
+            assert await cache.get_async('AIR', loader) == 'v2'
+            assert len(cache._refresh_tasks) == 1
+            await asyncio.gather(*cache._refresh_tasks)
+            await asyncio.sleep(0)
+            assert not cache._refresh_tasks
+
+        asyncio.run(main())
+        assert cache.stats['refreshes'] == 1
+
+    def test_expired_value(self):
+        clock = Clock()
+        cache = TTLCache(ttl=10, stale_ttl=0, clock=clock)
+        cache.get('AIR', lambda: 'v1')
+        clock.now = 10
+        assert cache.get('AIR', lambda: 'v2') == 'v2'
+        assert cache.stats['misses'] == 2
+
+    def test_invalidate(self):
+        cache = TTLCache(ttl=10, clock=Clock())
+        cache.get(None, lambda: 'all')
+        cache.get('AIR', lambda: 'air')
+        cache.invalidate('AIR')
+        assert cache.get('AIR', lambda: 'air2') == 'air2'
+        cache.invalidate()
+        assert cache.get(None, lambda: 'all2') == 'all2'
+
+
+class TestProductsCache:
+    def test_get_products(self):
+        session = FakeSession(handler=lambda *args, **kwargs: FakeResponse(
+            content=read_response('products/products.json')))
+        client = AlfaStrahTESClient('key', session=session, products_cache=TTLCache(ttl=60))
+        products = client.get_products('AIR')
+        products.pop()
+        assert len(client.get_products('AIR')) == 2
+        client.get_products()
+        assert len(session.calls) == 2
+
+
+    def test_refresh_without_caller_deadline(self):
+        cache_clock = Clock()
+        deadline_clock = Clock()
+        session = FakeSession(handler=lambda *args, **kwargs: FakeResponse(
+            content=read_response('products/products.json')))
+        cache = TTLCache(ttl=10, clock=cache_clock)
+        client = AlfaStrahTESClient('key', session=session, products_cache=cache)
+        client.get_products('AIR')
+        deadline = Deadline(1, clock=deadline_clock)
+        cache_clock.now = 12
+        deadline_clock.now = 2
+        # The stale value is served, the refresh in background doesn't inherit the caller's expired deadline.
+        assert len(client.get_products('AIR', deadline=deadline)) == 2
+        for _ in range(100):
+            if cache.stats['refreshes'] or cache.stats['refresh_errors']:
+                break
+            time.sleep(0.01)
+        assert cache.stats['refreshes'] == 1
+
+
+class TestQuoteCache:
+    def test_canonical_key(self):
+        cache = QuoteCache(ignore_session_id=True)
+        insureds = [Person(first_name='Arthur', birth_date=datetime.date(1979, 5, 22))]
+        key = cache.make_key(QuoteRequest(session_id='s1', insureds=insureds, product=InsuranceProduct('P1')))
+        assert key == cache.make_key(QuoteRequest(session_id='s2', insureds=insureds, product=InsuranceProduct('P1')))
+        assert key != cache.make_key(QuoteRequest(insureds=insureds, product=InsuranceProduct('P2')))
+        assert key != QuoteCache().make_key(QuoteRequest(session_id='s1', insureds=insureds,
+                                                         product=InsuranceProduct('P1')))
+
+    def test_frozen_request_key(self, monkeypatch):
+        cache = QuoteCache(maxsize=1)
+        insureds = [Person(first_name='Arthur', birth_date=datetime.date(1979, 5, 22))]
+        request = freeze(QuoteRequest(insureds=insureds, product=InsuranceProduct('P1')))
+        key = cache.make_key(request)
+        assert key == QuoteCache().make_key(QuoteRequest(insureds=insureds, product=InsuranceProduct('P1')))
+        monkeypatch.setattr(cache, '_make_key', lambda quote_request: pytest.fail('Key computed again'))
+        assert cache.make_key(freeze(QuoteRequest(insureds=insureds, product=InsuranceProduct('P1')))) == key
+
+    def test_lru_backend(self):
+        clock = Clock()
+        backend = LRUCacheBackend(maxsize=2, clock=clock)
+        backend.set('a', b'1', 10)
+        backend.set('b', b'2', 10)
+        assert backend.get('a') == b'1'
+        backend.set('c', b'3', 10)
+        assert backend.get('b') is None
+        assert len(backend) == 2
+        clock.now = 10
+        assert backend.get('a') is None
+
+    def test_quote(self):
+        session = FakeSession(handler=lambda *args, **kwargs: FakeResponse(content=read_response('quote/quote.json')))
+        client = AlfaStrahTESClient('key', session=session, quote_cache=QuoteCache(ttl=60))
+        first = client.quote(product=InsuranceProduct('P1'))
+        second = client.quote(product=InsuranceProduct('P1'))
+        assert len(session.calls) == 1
+        assert first is not second
+        assert second.quotes[0].policies[0].rate[0].value == 390
+        client.quote(product=InsuranceProduct('P2'))
+        assert len(session.calls) == 2
+        assert client.quote_cache.stats == {'hits': 1, 'misses': 2}
+
+    def test_session_id_not_shared(self):
+        session = FakeSession(handler=lambda *args, **kwargs: FakeResponse(content=read_response('quote/quote.json')))
+        client = AlfaStrahTESClient('key', session=session, quote_cache=QuoteCache(ttl=60, ignore_session_id=True))
+        client.quote(session_id='user-A', product=InsuranceProduct('P1'))
+        resp = client.quote(session_id='user-B', product=InsuranceProduct('P1'))
+        assert len(session.calls) == 1
+        assert resp.session_id == 'user-B'
+
+    def test_sessionless_request_not_served_shared_response(self):
+        session = FakeSession(handler=lambda *args, **kwargs: FakeResponse(content=read_response('quote/quote.json')))
+        client = AlfaStrahTESClient('key', session=session, quote_cache=QuoteCache(ttl=60, ignore_session_id=True))
+        client.quote(session_id='user-A', product=InsuranceProduct('P1'))
+        resp = client.quote(product=InsuranceProduct('P1'))
+        assert len(session.calls) == 2
+        assert resp.session_id == '88c70099-8e11-4325-9239-9c027195c069'
+        assert client.quote(session_id='user-B', product=InsuranceProduct('P1')).session_id == 'user-B'
+        assert len(session.calls) == 2
+
+    def test_errors_not_cached(self):
+        session = FakeSession([FakeResponse(500, read_response('errors/500_internal_error.json')),
+                               FakeResponse(content=read_response('quote/quote.json'))])
+        client = AlfaStrahTESClient('key', session=session, quote_cache=QuoteCache(ttl=60))
+        with pytest.raises(TESException):
+            client.quote()
+        assert client.quote().session_id
@@ -1,18 +1,22 @@
 # -*- coding: utf-8 -*-
 import datetime
+import json
 import os
 import random
 import string
+import threading
 
 import pytest
+import requests
 
 from tes import AlfaStrahTESClient
 from tes import (
-    CancellationType, Document, DocumentType, Gender, InsuranceProduct,
-    Person, Point, PolicyStatus, Segment,
+    CancellationType, ConfirmRequest, Document, DocumentType, Gender, InsuranceProduct,
+    Person, Point, PolicyStatus, QuoteRequest, Segment,
     Ticket,
 )
-from tes import TESException
+from tes import TESException, AuthErrorException, TransportErrorException
+from .utils import FakeResponse, FakeSession, read_response
 
 api_key = os.getenv('ALFASTRAH_TES_KEY')
 product_code = os.getenv('ALFASTRAH_TES_PRODUCT_CODE')
@@ -123,3 +127,211 @@ class TestApiIntegration:
             policy = client_connector.get_policy(policy_id)
             assert amount.value == cancel_amount.value
             assert policy.status == PolicyStatus.CANCELLED
+
+
+class TestSession:
+    def test_default_session_is_pooled(self):
+        with AlfaStrahTESClient(api_key, pool_maxsize=32) as client:
+            adapter = client.session.get_adapter(client.api_host)
+            assert adapter._pool_maxsize == 32
+
+    def test_injected_session(self):
+        session = FakeSession([FakeResponse(content=read_response('policies/policy.json'))])
+        with AlfaStrahTESClient('key', session=session) as client:
+            policy = client.get_policy(21684956)
+        assert policy.policy_id == 21684956
+        method, url, kwargs = session.calls[0]
+        assert method == 'GET'
+        assert url.endswith('/policies/21684956')
+        assert kwargs['headers']['X-API-Key'] == 'key'
+        assert not session.closed
+
+    def test_error_response(self):
+        session = FakeSession([FakeResponse(401, read_response('errors/401_unauthorized.json'))])
+        client = AlfaStrahTESClient('key', session=session)
+        with pytest.raises(AuthErrorException):
+            client.get_products()
+        assert client.status_code == 401
+
+    def test_raw_response_kept_on_request(self):
+        policy_json = read_response('policies/policy.json')
+        session = FakeSession([FakeResponse(content=policy_json), FakeResponse(content=policy_json)])
+        client = AlfaStrahTESClient('key', session=session)
+        client.get_policy(21684956)
+        assert client.resp is None
+        client.keep_raw_response = True
+        client.get_policy(21684956)
+        assert client.resp['policy_id'] == 21684956
+
+    @pytest.mark.parametrize('serializer', ['json', 'orjson', 'ujson'])
+    def test_serializer(self, serializer):
+        if serializer != 'json':
+            pytest.importorskip(serializer)
+        session = FakeSession([FakeResponse(content=read_response('products/products.json')),
+                               FakeResponse(content=b'')])
+        client = AlfaStrahTESClient('key', session=session, serializer=serializer)
+        products = client.get_products()
+        assert products[0].code == 'ON_ANTICOVID_AVIA_1'
+        client.confirm(21684956, session_id='s1')
+        assert session.calls[1][2]['data'] == b'{"session_id":"s1"}'
+
+
+class TestApiResult:
+    def test_send(self):
+        session = FakeSession([FakeResponse(500, read_response('errors/500_internal_error.json'))])
+        client = AlfaStrahTESClient('key', session=session, track_last_result=False)
+        result = client.send('PUT', '/policies/1/confirm', data=ConfirmRequest(session_id='s1'))
+        assert not result.ok
+        assert result.status_code == 500
+        assert result.resp['detail'] == 'Internal error'
+        assert result.req == b'{"session_id":"s1"}'
+        assert result.elapsed >= 0
+        with pytest.raises(TESException, match='Internal error'):
+            result.raise_for_error()
+        assert client.status_code is None
+
+    def test_legacy_view(self):
+        session = FakeSession([FakeResponse(content=b''), FakeResponse(content=b'')])
+        client = AlfaStrahTESClient('key', session=session, keep_raw_response=True)
+        client.confirm(21684956, session_id='s1')
+        assert client.req == '{"session_id":"s1"}'
+        assert client.status_code == 200
+        client.req = client.resp = client.status_code = None
+        assert (client.req, client.resp, client.status_code) == (None, None, None)
+        client.confirm(21684956, session_id='s2')
+        assert client.req == '{"session_id":"s2"}'
+        assert client.status_code == 200
+
+    def test_last_result_per_thread(self):
+        def handler(method, url, **kwargs):
+            status_code = 200 if url.endswith('/ok') else 500
+            return FakeResponse(status_code, b'{}')
+
+        client = AlfaStrahTESClient('key', session=FakeSession(handler=handler))
+        barrier = threading.Barrier(2)
+        seen = {}
+
+        def worker(path):
+            try:
+                client.request('GET', path)
+            except TESException:
+                pass
+            barrier.wait()
+            seen[path] = client.status_code
+
+        threads = [threading.Thread(target=worker, args=(path,)) for path in ('/ok', '/fail')]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert seen == {'/ok': 200, '/fail': 500}
+
+
+def quote_handler(method, url, **kwargs):
+    """Replies to quote requests with the session id sent, or fails if there is none."""
+    session_id = json.loads(kwargs['data'])['session_id']
+    if session_id == 'fail':
+        return FakeResponse(500, read_response('errors/500_internal_error.json'))
+    if session_id == 'down':
+        raise requests.ConnectionError('Connection refused')
+    return FakeResponse(content=json.dumps({'session_id': session_id, 'quotes': []}).encode())
+
+
+def policy_handler(method, url, **kwargs):
+    """Replies to policy requests with a policy of the requested id, or fails for id 0."""
+    policy_id = int(url.rsplit('/', 1)[1])
+    if policy_id == 0:
+        return FakeResponse(500, read_response('errors/500_internal_error.json'))
+    policy = json.loads(read_response('policies/policy.json'))
+    policy['policy_id'] = policy_id
+    return FakeResponse(content=json.dumps(policy).encode())
+
+
+class TestBatch:
+    def test_quote_many(self):
+        client = AlfaStrahTESClient('key', session=FakeSession(handler=quote_handler))
+        session_ids = ['s{}'.format(i) for i in range(20)] + ['fail', 'down', 's20']
+        results = client.quote_many([QuoteRequest(session_id=session_id) for session_id in session_ids],
+                                    max_concurrency=4)
+        assert [r.session_id for r in results[:20]] == session_ids[:20]
+        assert isinstance(results[20], TESException)
+        assert isinstance(results[21], TransportErrorException)
+        assert results[22].session_id == 's20'
+
+    def test_quote_many_empty(self):
+        client = AlfaStrahTESClient('key', session=FakeSession())
+        assert client.quote_many([]) == []
+
+    def test_get_policies(self):
+        client = AlfaStrahTESClient('key', session=FakeSession(handler=policy_handler))
+        results = dict(client.get_policies(list(range(1, 30)) + [0], max_concurrency=4))
+        assert len(results) == 30
+        assert all(results[policy_id].policy_id == policy_id for policy_id in range(1, 30))
+        assert isinstance(results[0], TESException)
+
+    def test_get_policies_streaming(self):
+        taken = []
+
+        def policy_ids():
+            for policy_id in range(1, 101):
+                taken.append(policy_id)
+                yield policy_id
+
+        client = AlfaStrahTESClient('key', session=FakeSession(handler=policy_handler))
+        results = client.get_policies(policy_ids(), max_concurrency=5)
+        for consumed, (policy_id, policy) in enumerate(results, 1):
+            assert policy.policy_id == policy_id
+            # No more than 5 in flight, plus completed ones not consumed yet.
+            assert len(taken) <= consumed + 2 * 5
+        assert len(taken) == 100
+
+    def test_get_policies_ext_id(self):
+        session = FakeSession(handler=policy_handler)
+        client = AlfaStrahTESClient('key', session=session)
+        list(client.get_policies([1], is_ext_id=True))
+        assert session.calls[0][2]['params'] == {'is_ext_id': True}
+
+    def test_confirm_many(self):
+        def handler(method, url, **kwargs):
+            if '/0/' in url:
+                return FakeResponse(500, read_response('errors/500_internal_error.json'))
+            return FakeResponse(content=b'true')
+
+        session = FakeSession(handler=handler)
+        client = AlfaStrahTESClient('key', session=session)
+        outcomes = client.confirm_many([1, 0, 2], session_id='s1', max_concurrency=2)
+        assert [policy_id for policy_id, _ in outcomes] == [1, 0, 2]
+        assert outcomes[0][1] is True and outcomes[2][1] is True
+        assert isinstance(outcomes[1][1], TESException)
+        assert all(json.loads(kwargs['data'])['session_id'] == 's1' for _, _, kwargs in session.calls)
+
+    def test_cancel_many(self):
+        def handler(method, url, **kwargs):
+            if url.endswith('/0'):
+                raise requests.ConnectionError('Connection reset')
+            return FakeResponse(content=b'{"value": 100, "currency": "RUB"}')
+
+        session = FakeSession(handler=handler)
+        client = AlfaStrahTESClient('key', session=session)
+        outcomes = client.cancel_many([1, 0], type=CancellationType.TECH_CANCELLATION)
+        assert outcomes[0][1].value == 100
+        assert isinstance(outcomes[1][1], TransportErrorException)
+        assert all(kwargs['params'] == {'type': 'TECH_CANCELLATION'} for _, _, kwargs in session.calls)
+
+
+class TestDecodeModes:
+    def test_compact(self):
+        session = FakeSession([FakeResponse(content=read_response('policies/policy.json'))])
+        client = AlfaStrahTESClient('key', session=session, compact=True)
+        policy = client.get_policy(21684956)
+        assert not hasattr(policy, '__dict__')
+        assert policy.status == PolicyStatus.CONFIRMED
+
+    def test_lazy(self):
+        session = FakeSession([FakeResponse(content=read_response('policies/policy.json'))])
+        client = AlfaStrahTESClient('key', session=session, lazy=True)
+        policy = client.get_policy(21684956)
+        assert 'status' not in vars(policy)
+        assert policy.status == PolicyStatus.CONFIRMED
+        with pytest.raises(ValueError):
+            AlfaStrahTESClient('key', session=session, lazy=True, compact=True)
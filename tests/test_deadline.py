@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+import requests
+
+from .utils import Clock, FakeResponse, FakeSession, HangingTransport, policy_response, read_response
+from tes import AlfaStrahTESClient, AsyncAlfaStrahTESClient, Deadline, RetryPolicy
+from tes import QuoteRequest, TESException, DeadlineExceededException
+
+
+class SteppingClock(Clock):
+    """Clock that moves forward by `step` seconds on every reading."""
+
+    def __init__(self, step):
+        Clock.__init__(self)
+        self.step = step
+
+    def __call__(self):
+        now = self.now
+        self.now += self.step
+        return now
+
+
+class TestDeadline:
+    def test_remaining(self):
+        clock = Clock()
+        deadline = Deadline(2, clock=clock)
+        assert deadline.remaining() == 2
+        clock.now = 1.5
+        assert deadline.remaining() == 0.5
+        assert deadline.cap((10, 60)) == (0.5, 0.5)
+        clock.now = 3
+        assert deadline.remaining() == 0
+        assert deadline.expired
+        with pytest.raises(DeadlineExceededException):
+            deadline.check()
+        with pytest.raises(DeadlineExceededException):
+            deadline.cap((10, 60))
+
+    def test_coerce(self):
+        deadline = Deadline(1)
+        assert Deadline.coerce(deadline) is deadline
+        assert Deadline.coerce(None) is None
+        assert Deadline.coerce(0.5).remaining() <= 0.5
+        with pytest.raises(TypeError):
+            Deadline.coerce('1s')
+
+    def test_is_timeout_error(self):
+        assert issubclass(DeadlineExceededException, TESException)
+        assert issubclass(DeadlineExceededException, TimeoutError)
+
+
+class TestClientTimeout:
+    def test_default_timeout(self):
+        session = FakeSession([policy_response()])
+        AlfaStrahTESClient('key', session=session).get_policy(21684956)
+        assert session.calls[0][2]['timeout'] == (10, 60)
+
+    def test_timeout(self):
+        session = FakeSession([policy_response(), policy_response()])
+        client = AlfaStrahTESClient('key', session=session, timeout=5)
+        client.get_policy(21684956)
+        client.get_policy(21684956, timeout=(1, 2))
+        assert session.calls[0][2]['timeout'] == (5, 5)
+        assert session.calls[1][2]['timeout'] == (1, 2)
+
+    def test_deadline_caps_timeout(self):
+        session = FakeSession([policy_response()])
+        AlfaStrahTESClient('key', session=session).get_policy(21684956, deadline=0.5)
+        connect, read = session.calls[0][2]['timeout']
+        assert 0 < connect <= 0.5
+        assert 0 < read <= 0.5
+
+    def test_deadline_exceeded(self):
+        session = FakeSession([policy_response()])
+        with pytest.raises(DeadlineExceededException):
+            AlfaStrahTESClient('key', session=session).get_policy(21684956, deadline=0)
+        assert not session.calls
+
+    def test_deadline_exceeded_before_request(self):
+        # The deadline passes between the check before the attempt and the computation of its timeouts.
+        session = FakeSession([policy_response()])
+        client = AlfaStrahTESClient('key', session=session)
+        with pytest.raises(DeadlineExceededException):
+            client.get_policy(21684956, deadline=Deadline(1, clock=SteppingClock(0.6)))
+        results = client.quote_many([QuoteRequest()], deadline=Deadline(1, clock=SteppingClock(0.6)))
+        assert isinstance(results[0], DeadlineExceededException)
+        assert not session.calls
+
+    def test_timed_out_at_deadline(self):
+        clock = Clock()
+
+        def handler(method, url, **kwargs):
+            clock.now += kwargs['timeout'][1]
+            raise requests.ReadTimeout('Read timed out')
+
+        client = AlfaStrahTESClient('key', session=FakeSession(handler=handler), retry=RetryPolicy(backoff_factor=0))
+        with pytest.raises(DeadlineExceededException):
+            client.get_policy(21684956, deadline=Deadline(0.5, clock=clock))
+        assert clock.now == 0.5
+
+    def test_no_retry_past_deadline(self):
+        session = FakeSession([FakeResponse(503, b'{"detail": "Gateway error"}'), policy_response()])
+        client = AlfaStrahTESClient('key', session=session, retry=RetryPolicy(backoff_factor=5, jitter=False))
+        with pytest.raises(TESException):
+            client.get_policy(21684956, deadline=1)
+        assert len(session.calls) == 1
+
+    def test_quote_many_shared_deadline(self):
+        session = FakeSession(handler=lambda method, url, **kwargs: FakeResponse(
+            content=read_response('quote/quote.json')))
+        client = AlfaStrahTESClient('key', session=session)
+        results = client.quote_many([QuoteRequest(), QuoteRequest()], deadline=0)
+        assert all(isinstance(result, DeadlineExceededException) for result in results)
+        assert not session.calls
+
+
+class TestAsyncDeadline:
+    def test_attempt_cancelled(self):
+        transport = HangingTransport()
+
+        async def main():
+            client = AsyncAlfaStrahTESClient('key', transport=transport)
+            with pytest.raises(DeadlineExceededException):
+                await client.get_policy(21684956, deadline=0.05)
+
+        asyncio.run(main())
+        assert transport.cancelled
+        assert transport.calls[0][2]['timeout'][1] <= 0.05
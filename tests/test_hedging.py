@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from .utils import FakeResponse, FakeSession, read_response
+from tes import AlfaStrahTESClient, AsyncAlfaStrahTESClient, HedgingPolicy, TESException
+
+
+def slow_first_handler(delay):
+    """Replies to the first request after `delay` seconds, and to the others at once."""
+    lock = threading.Lock()
+    calls = []
+
+    def handler(method, url, **kwargs):
+        with lock:
+            calls.append(url)
+            first = len(calls) == 1
+        if first:
+            time.sleep(delay)
+        return FakeResponse(content=read_response('policies/policy.json'))
+
+    return handler
+
+
+class SlowFirstTransport:
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = []
+        self.cancelled = 0
+
+    async def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        if len(self.calls) == 1:
+            try:
+                await asyncio.sleep(self.delay)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        return FakeResponse(content=read_response('policies/policy.json'))
+
+    async def close(self):
+        pass
+
+
+class TestHedgingPolicy:
+    def test_delay_before_enough_samples(self):
+        policy = HedgingPolicy(max_delay=1.5, min_samples=3)
+        policy.record('/policies', 0.1)
+        assert policy.get_delay('/policies') == 1.5
+
+    def test_percentile(self):
+        policy = HedgingPolicy(percentile=90, min_delay=0.01, min_samples=10)
+        for i in range(1, 11):
+            policy.record('/policies/quote', i / 10.0)
+        assert policy.get_delay('/policies/quote') == 0.9
+        assert policy.get_delay('/products') == policy.max_delay
+
+    def test_bounds(self):
+        policy = HedgingPolicy(min_delay=0.2, max_delay=0.5, min_samples=1)
+        policy.record('/policies', 0.01)
+        assert policy.get_delay('/policies') == 0.2
+        policy.record('/products', 3)
+        assert policy.get_delay('/products') == 0.5
+
+    def test_invalid_percentile(self):
+        with pytest.raises(ValueError):
+            HedgingPolicy(percentile=0)
+
+
+class TestClientHedging:
+    def test_hedged_request_wins(self):
+        session = FakeSession(handler=slow_first_handler(0.5))
+        hedging = HedgingPolicy(max_delay=0.02)
+        with AlfaStrahTESClient('key', session=session, hedging=hedging) as client:
+            started = time.monotonic()
+            assert client.get_policy(21684956).policy_id == 21684956
+            assert time.monotonic() - started < 0.4
+        assert len(session.calls) == 2
+        assert hedging.stats == {'hedges': 1, 'wins': 1}
+        assert client.last_result.status_code == 200
+
+    def test_fast_response_not_hedged(self):
+        session = FakeSession(handler=slow_first_handler(0))
+        hedging = HedgingPolicy(max_delay=1)
+        with AlfaStrahTESClient('key', session=session, hedging=hedging) as client:
+            client.get_policy(21684956)
+        assert len(session.calls) == 1
+        assert hedging.stats['hedges'] == 0
+
+    def test_not_idempotent_call_not_hedged(self):
+        session = FakeSession(handler=slow_first_handler(0.1))
+        with AlfaStrahTESClient('key', session=session, hedging=HedgingPolicy(max_delay=0.01)) as client:
+            client.confirm(21684956)
+            client.cancel(21684956)
+        assert len(session.calls) == 2
+
+    def test_only_successful_hedged_calls_recorded(self):
+        session = FakeSession([
+            FakeResponse(content=b'true'),
+            FakeResponse(503, b'{"detail": "Gateway error"}'),
+            FakeResponse(content=read_response('policies/policy.json')),
+        ])
+        hedging = HedgingPolicy(min_delay=0, max_delay=1, min_samples=1)
+        with AlfaStrahTESClient('key', session=session, hedging=hedging) as client:
+            client.confirm(21684956)
+            with pytest.raises(TESException):
+                client.get_policy(21684956)
+            assert hedging.get_delay('/policies') == 1
+            client.get_policy(21684956)
+        assert hedging.get_delay('/policies') < 1
+
+    def test_queuing_not_hedged(self):
+        def handler(method, url, **kwargs):
+            time.sleep(0.05)
+            return FakeResponse(content=read_response('policies/policy.json'))
+
+        hedging = HedgingPolicy(max_delay=0.12)
+        # 8 calls share 2 workers, so the last ones wait for a worker longer than the hedge delay.
+        with AlfaStrahTESClient('key', session=FakeSession(handler=handler), hedging=hedging, pool_maxsize=1) as client:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(client.get_policy, [21684956] * 8))
+        assert hedging.stats['hedges'] == 0
+
+    def test_more_callers_than_workers(self):
+        def handler(method, url, **kwargs):
+            time.sleep(0.3)
+            return FakeResponse(content=read_response('policies/policy.json'))
+
+        hedging = HedgingPolicy(max_delay=1)
+        with AlfaStrahTESClient('key', session=FakeSession(handler=handler), hedging=hedging, pool_maxsize=1) as client:
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                policies = list(executor.map(lambda _: client.get_policy(21684956, deadline=0.4), range(8)))
+            assert time.monotonic() - started < 0.4
+        assert all(policy.policy_id == 21684956 for policy in policies)
+
+    def test_max_in_flight(self):
+        session = FakeSession(handler=slow_first_handler(0.1))
+        hedging = HedgingPolicy(max_delay=0.01, max_in_flight=1)
+        assert hedging.start_hedge()
+        with AlfaStrahTESClient('key', session=session, hedging=hedging) as client:
+            client.get_policy(21684956)
+        assert len(session.calls) == 1
+        hedging.finish_hedge()
+        assert hedging.stats['hedges'] == 0
+
+    def test_async_loser_cancelled(self):
+        transport = SlowFirstTransport(10)
+        hedging = HedgingPolicy(max_delay=0.02)
+
+        async def main():
+            client = AsyncAlfaStrahTESClient('key', transport=transport, hedging=hedging)
+            policy = await client.get_policy(21684956)
+            await asyncio.sleep(0)
+            return policy
+
+        assert asyncio.run(main()).policy_id == 21684956
+        assert len(transport.calls) == 2
+        assert transport.cancelled == 1
+        assert hedging.stats == {'hedges': 1, 'wins': 1}
+        assert hedging.in_flight == 0
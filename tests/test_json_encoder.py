@@ -5,10 +5,11 @@ from decimal import Decimal
 
 import pytest
 
-from tes import MultiJSONEncoder
+from tes import MultiJSONEncoder, StdlibSerializer, get_serializer
 from tes import (
-    Amount, Risk, RiskType, QuoteRequest,
-    SportKind,
+    Amount, CreateRequest, Gender, Person, Point,
+    Risk, RiskType, QuoteRequest, Segment, SportKind,
+    Ticket,
 )
 
 
@@ -42,3 +43,103 @@ class TestMultiJSONEncoder:
             'dt': datetime.datetime(1970, 1, 1, 7, 40, 0),
         }
         assert '1970-01-01T07:40:00' in json.dumps(dt, cls=MultiJSONEncoder)
+
+    def test_nested_models(self):
+        request = CreateRequest(
+            [Person(first_name='Arthur', gender=Gender.MALE, birth_date=datetime.date(1979, 5, 22),
+                    ticket=Ticket(price=Amount(Decimal('1.5'))))],
+            segments=[Segment(departure=Point(date=datetime.datetime(2020, 8, 1, 10, 15)))],
+        )
+        request_dict = json.loads(json.dumps(request, cls=MultiJSONEncoder))
+        insured = request_dict['insureds'][0]
+        assert insured == {
+            'first_name': 'Arthur', 'gender': 'MALE', 'birth_date': '1979-05-22',
+            'ticket': {'price': {'value': 1.5}}, 'risks': [],
+        }
+        assert request_dict['segments'][0]['departure']['date'] == '2020-08-01T10:15:00'
+        assert 'session_id' not in request_dict
+
+    def test_encode(self):
+        point = Point(date=datetime.date(1970, 1, 1), point='SVO')
+        assert point.encode() == {'date': '1970-01-01', 'point': 'SVO'}
+
+    def test_not_serializable(self):
+        with pytest.raises(TypeError):
+            json.dumps({'o': object()}, cls=MultiJSONEncoder)
+
+
+@pytest.fixture(params=['json', 'json-lossless', 'orjson', 'ujson'])
+def serializer(request):
+    if request.param == 'json-lossless':
+        return StdlibSerializer(lossless_decimal=True)
+    if request.param != 'json':
+        pytest.importorskip(request.param)
+    return get_serializer(request.param)
+
+
+class TestSerializers:
+    def test_decimal(self, serializer):
+        value = 95000
+        price = Amount(Decimal(value), currency='RUB')
+        price_dict = serializer.loads(serializer.dumps(price))
+        assert abs(price_dict['value'] - value) < 1e-08
+
+    def test_enum_attribute(self, serializer):
+        risk = Risk(type=RiskType.RISK_COVID)
+        assert serializer.loads(serializer.dumps(risk))['type'] == 'RISK_COVID'
+
+    def test_enum_list(self, serializer):
+        quote = QuoteRequest(sport=[SportKind.COMMON_SPORT])
+        assert serializer.loads(serializer.dumps(quote))['sport'] == ['COMMON_SPORT']
+
+    def test_date(self, serializer):
+        date_json = serializer.dumps({'date': datetime.date(1970, 1, 1)})
+        assert b'1970-01-01' in date_json
+        assert b'1970-01-01T' not in date_json
+
+    def test_datetime(self, serializer):
+        dt = {
+            'dt': datetime.datetime(1970, 1, 1, 7, 40, 0),
+        }
+        assert b'1970-01-01T07:40:00' in serializer.dumps(dt)
+
+    def test_same_wire_output(self, serializer):
+        request = CreateRequest(
+            [Person(first_name='Федор', gender=Gender.MALE, birth_date=datetime.date(1979, 5, 22),
+                    ticket=Ticket(number='057/1', price=Amount(Decimal('23450.5'), 'RUB')))],
+            segments=[Segment(departure=Point(date=datetime.datetime(2020, 8, 1, 10, 15)), connecting_flight=False)],
+            sport=[SportKind.DANGEROUS_SPORT],
+        )
+        assert serializer.dumps(request) == get_serializer().dumps(request)
+
+    def test_invalid_json(self, serializer):
+        with pytest.raises(ValueError):
+            serializer.loads(b'<html></html>')
+
+
+class TestLosslessDecimal:
+    def test_exact_value(self):
+        serializer = StdlibSerializer(lossless_decimal=True)
+        price = Amount(Decimal('12345678901234567.89'), currency='RUB')
+        assert serializer.dumps(price) == b'{"value":12345678901234567.89,"currency":"RUB"}'
+
+    def test_round_trip(self):
+        serializer = StdlibSerializer(lossless_decimal=True)
+        price = Amount(Decimal('0.10000000000000000001'), currency='RUB')
+        decoded = Amount.decode(serializer.loads(serializer.dumps(price)))
+        assert decoded.value == price.value
+        assert type(decoded.value) is Decimal
+
+    def test_nested_models(self):
+        serializer = StdlibSerializer(lossless_decimal=True)
+        request = CreateRequest(
+            [Person(first_name='Arthur', ticket=Ticket(price=Amount(Decimal('1.10'))))],
+            booking_price=Amount(Decimal('2.20'), 'RUB'),
+        )
+        dct = serializer.loads(serializer.dumps(request))
+        assert dct['insureds'][0]['ticket']['price']['value'] == Decimal('1.10')
+        assert dct['booking_price']['value'] == Decimal('2.20')
+
+    def test_not_finite(self):
+        with pytest.raises(ValueError):
+            StdlibSerializer(lossless_decimal=True).dumps({'value': Decimal('NaN')})
@@ -1,9 +1,24 @@
 # -*- coding: utf-8 -*-
+import datetime
+import pickle
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
 import pytest
 
 from .utils import load_response
+from tes import models
 from tes import (
-    ApiProblem, InsuranceProduct,
+    ApiProblem, BaseModel, Document, DocumentType, Gender, InsuranceProduct, Person,
+    Policy, PolicyStatus, QuoteRequest, QuoteResponse, Risk, StdlibSerializer,
+    lazy, slotted, memoized, memoize, frozen, freeze,
+)
+from tes.codec import (
+    DATE_FORMAT, DATETIME_FORMAT,
+    format_date, format_datetime, parse_date, parse_datetime,
 )
 
 
@@ -26,3 +41,330 @@ class TestAPIResponseHandling:
         resp = load_response(fn)
         insurance_products = [InsuranceProduct(**product) for product in resp]
         assert insurance_products
+
+
+class TestDecode:
+    def test_decode_policy(self):
+        policy = Policy.decode(load_response('policies/policy.json'))
+        assert policy.policy_id == 21684956
+        assert policy.status == PolicyStatus.CONFIRMED
+        assert policy.insured.gender == Gender.MALE
+        assert policy.insured.birth_date == datetime.date(1979, 5, 22)
+        assert policy.insured.ticket.price.value == Decimal(23450.5)
+        assert policy.segments[0].departure.date == datetime.datetime(2020, 8, 1, 10, 15)
+        assert policy.rate[0].value == Decimal(390)
+        assert policy.risks[1].franchise.value == 0
+        assert policy.agent.sub.code == 'WEB'
+        assert policy.resources == ['resource1.pdf']
+        assert policy.sport == []
+        assert policy.cancellation is None
+
+    def test_decode_quote_response(self):
+        resp = QuoteResponse.decode(load_response('quote/quote.json'))
+        policies = resp.quotes[0].policies
+        assert len(policies) == 2
+        assert policies[1].insured.first_name == 'Louisa'
+        assert policies[1].segments[1].arrival.point == 'SVO'
+
+    def test_decode_missing_lists(self):
+        person = Person.decode({'first_name': 'Arthur', 'risks': None})
+        assert person.risks == []
+        assert person.first_name == 'Arthur'
+
+
+class TestEncode:
+    def test_encode(self):
+        policy = Policy.decode(load_response('policies/policy.json'))
+        dct = policy.encode()
+        assert dct['status'] == 'CONFIRMED'
+        assert dct['insured']['birth_date'] == '1979-05-22'
+        assert dct['insured']['ticket']['price']['value'] == Decimal('23450.5')
+        assert type(dct['insured']['ticket']['price']['value']) is Decimal
+
+
+class TestSlotted:
+    def test_decode(self):
+        dct = load_response('policies/policy.json')
+        policy = slotted(Policy).decode(dct)
+        assert not hasattr(policy, '__dict__')
+        assert type(policy.insured) is slotted(Person)
+        assert type(policy.risks[0]) is slotted(Risk)
+        assert policy.insured.birth_date == datetime.date(1979, 5, 22)
+        assert policy.encode() == Policy.decode(dct).encode()
+
+    def test_keyword_construction(self):
+        person = slotted(Person)(first_name='Arthur', gender=Gender.MALE)
+        assert person.risks == []
+        assert person.encode() == {'first_name': 'Arthur', 'gender': 'MALE', 'risks': []}
+        with pytest.raises(AttributeError):
+            person.unknown = 1
+
+    def test_same_class(self):
+        assert slotted(Policy) is slotted(Policy)
+        assert slotted(Policy).__attrs__.keys() == Policy.__attrs__.keys()
+
+
+class TestLazy:
+    def test_decode(self):
+        dct = load_response('policies/policy.json')
+        policy = lazy(Policy).decode(dct)
+        assert isinstance(policy, Policy)
+        assert 'insured' not in vars(policy)
+        assert policy.policy_id == 21684956
+        assert isinstance(policy.insured, lazy(Person))
+        assert policy.insured is policy.insured
+        assert policy.insured.birth_date == datetime.date(1979, 5, 22)
+        assert policy.risks[1].franchise.value == 0
+        assert policy.encode() == Policy.decode(dct).encode()
+
+    def test_set_attribute(self):
+        policy = lazy(Policy).decode(load_response('policies/policy.json'))
+        policy.status = PolicyStatus.CANCELLED
+        assert policy.status == PolicyStatus.CANCELLED
+        assert policy.encode()['status'] == 'CANCELLED'
+
+    def test_missing_attributes(self):
+        person = lazy(Person).decode({})
+        assert person.first_name is None
+        assert person.risks == []
+
+
+class TestMemoized:
+    def make_person(self):
+        document = memoized(Document)(type=DocumentType.PASSPORT, number='1234')
+        return memoized(Person)(first_name='Arthur', birth_date=datetime.date(1979, 5, 22), document=document)
+
+    def test_fragment_reused(self):
+        person = self.make_person()
+        assert isinstance(person, Person)
+        assert person.encode() is person.encode()
+        assert person.encode() == Person(first_name='Arthur', birth_date=datetime.date(1979, 5, 22),
+                                         document=Document(type=DocumentType.PASSPORT, number='1234')).encode()
+
+    def test_set_attribute(self):
+        person = self.make_person()
+        fragment = person.encode()
+        person.first_name = 'Ford'
+        assert person.encode() is not fragment
+        assert person.encode()['first_name'] == 'Ford'
+
+    def test_set_nested_attribute(self):
+        person = self.make_person()
+        request = memoized(QuoteRequest)(insureds=[person])
+        request.encode()
+        person.document.number = '5678'
+        assert request.encode()['insureds'][0]['document']['number'] == '5678'
+
+    def test_set_plain_nested_attribute(self):
+        person = memoized(Person)(first_name='Arthur', document=Document(type=DocumentType.PASSPORT, number='1234'))
+        person.encode()
+        person.document.number = '9999'
+        assert StdlibSerializer().dumps(QuoteRequest(insureds=[person])) == StdlibSerializer().dumps(
+            QuoteRequest(insureds=[Person(first_name='Arthur',
+                                          document=Document(type=DocumentType.PASSPORT, number='9999'))]))
+        document = Document(number='5678')
+        person.document = document
+        assert person.document is document
+        assert person.encode()['document'] == {'number': '5678'}
+        document.number = '2'
+        assert person.encode()['document'] == {'number': '2'}
+
+    def test_change_list_in_place(self):
+        request = memoize(QuoteRequest(insureds=[Person(first_name='Arthur')]))
+        fragment = request.encode()
+        assert request.encode() is fragment
+        request.insureds.append(memoized(Person)(first_name='Ford'))
+        assert [person['first_name'] for person in request.encode()['insureds']] == ['Arthur', 'Ford']
+        request.insureds[0] = memoized(Person)(first_name='Zaphod')
+        assert request.encode()['insureds'][0]['first_name'] == 'Zaphod'
+
+    def test_memoize(self):
+        request = QuoteRequest(product=InsuranceProduct('P1'), insureds=[Person(first_name='Arthur')])
+        copy = memoize(request)
+        assert type(copy) is memoized(QuoteRequest)
+        assert type(copy.insureds[0]) is memoized(Person)
+        assert memoize(copy) is copy
+        assert copy.encode() is copy.encode()
+        assert copy.encode() == request.encode()
+
+    def test_spliced_into_plain_model(self):
+        person = self.make_person()
+        request = QuoteRequest(product=InsuranceProduct('P1'), insureds=[person])
+        assert request.encode()['insureds'][0] is person.encode()
+        assert StdlibSerializer().dumps(request) == StdlibSerializer().dumps(
+            QuoteRequest(product=InsuranceProduct('P1'), insureds=[Person.decode(person.encode())]))
+
+    def test_decode(self):
+        policy = memoized(Policy).decode(load_response('policies/policy.json'))
+        assert type(policy.insured) is memoized(Person)
+        assert memoized(Person) is memoized(Person)
+
+
+class TestFrozen:
+    def make_request(self, first_name='Arthur'):
+        document = Document(type=DocumentType.PASSPORT, number='1234')
+        insureds = [Person(first_name=first_name, birth_date=datetime.date(1979, 5, 22), document=document)]
+        return QuoteRequest(product=InsuranceProduct('P1'), insureds=insureds)
+
+    def test_structural_equality(self):
+        request = freeze(self.make_request())
+        assert request == freeze(self.make_request())
+        assert hash(request) == hash(freeze(self.make_request()))
+        assert request != freeze(self.make_request('Ford'))
+        assert len({request, freeze(self.make_request()), freeze(self.make_request('Ford'))}) == 2
+        assert request != self.make_request()
+
+    def test_nested_frozen(self):
+        request = freeze(self.make_request())
+        assert isinstance(request, QuoteRequest)
+        assert type(request.insureds) is tuple
+        assert type(request.insureds[0]) is frozen(Person)
+        assert freeze(request) is request
+        assert request.encode() == self.make_request().encode()
+
+    def test_set_attribute(self):
+        request = freeze(self.make_request())
+        with pytest.raises(AttributeError):
+            request.currency = 'RUB'
+        with pytest.raises(AttributeError):
+            request.insureds[0].document.number = '5678'
+
+    def test_slotted(self):
+        arthur = freeze(slotted(Person)(first_name='Arthur', risks=[Risk()]))
+        assert arthur != freeze(slotted(Person)(first_name='Ford'))
+        assert arthur == freeze(slotted(Person)(first_name='Arthur', risks=[Risk()]))
+        assert arthur.first_name == 'Arthur'
+        assert type(arthur.risks) is tuple
+        with pytest.raises(AttributeError):
+            arthur.first_name = 'Ford'
+
+    def test_other_variants(self):
+        dct = load_response('policies/policy.json')
+        policy = frozen(Policy).decode(dct)
+        for variant in (lazy, slotted, memoized):
+            other = freeze(variant(Policy).decode(dct))
+            assert other == policy
+            assert hash(other) == hash(policy)
+        assert len({policy, freeze(lazy(Policy).decode(dct)), freeze(Policy.decode(dct))}) == 1
+
+    def test_lazy(self):
+        dct = load_response('policies/policy.json')
+        policy = frozen(lazy(Policy)).decode(dct)
+        assert type(policy.insured) is frozen(lazy(Person))
+        assert policy == frozen(Policy).decode(dct)
+        assert hash(policy) == hash(frozen(Policy).decode(dct))
+        assert freeze(policy) is policy
+        with pytest.raises(AttributeError):
+            policy.status = PolicyStatus.CANCELLED
+
+    def test_decode(self):
+        dct = load_response('policies/policy.json')
+        policy = frozen(Policy).decode(dct)
+        assert type(policy.insured) is frozen(Person)
+        assert type(policy.risks) is tuple
+        assert policy == frozen(Policy).decode(dct)
+        assert policy.encode() == Policy.decode(dct).encode()
+
+
+class TestVariants:
+    @pytest.mark.parametrize('variant', [slotted, lazy, memoized, frozen])
+    def test_concurrent_creation(self, variant, monkeypatch):
+        class Item(BaseModel):
+            __attrs__ = {'name': str}
+
+            def __init__(self, name=None):
+                BaseModel.__init__(self)
+                self.name = name
+
+        class Order(BaseModel):
+            __attrs__ = {'order_id': int, 'items': typing.List[Item]}
+
+            def __init__(self, order_id=None, items=None):
+                BaseModel.__init__(self)
+                self.order_id = order_id
+                self.items = items if items is not None else []
+
+        variant_type = models._variant_type
+
+        def slow_variant_type(tp, variant):
+            time.sleep(0.01)
+            return variant_type(tp, variant)
+
+        # Widens the window between the creation of a variant class and the resolution of its attributes.
+        monkeypatch.setattr(models, '_variant_type', slow_variant_type)
+        dct = {'order_id': 1, 'items': [{'name': 'ticket'}]}
+        barrier = threading.Barrier(8)
+
+        def decode(_):
+            barrier.wait()
+            order = variant(Order).decode(dct)
+            return order.encode(), type(order.items[0])
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            assert list(executor.map(decode, range(8))) == [(dct, variant(Item))] * 8
+
+    @pytest.mark.parametrize('variant', [
+        slotted, lazy, memoized, frozen,
+        lambda model_cls: frozen(slotted(model_cls)),
+    ])
+    def test_pickle(self, variant):
+        dct = load_response('policies/policy.json')
+        policy = variant(Policy).decode(dct)
+        copy = pickle.loads(pickle.dumps(policy))
+        assert type(copy) is type(policy)
+        assert type(copy.insured) is type(policy.insured)
+        assert copy.encode() == Policy.decode(dct).encode()
+
+    def test_pickle_frozen_request(self):
+        request = freeze(QuoteRequest(product=InsuranceProduct('P1'), insureds=[Person(first_name='Arthur')]))
+        copy = pickle.loads(pickle.dumps(request))
+        assert copy == request
+        assert hash(copy) == hash(request)
+
+
+class TestDates:
+    @pytest.mark.parametrize(
+        'value', (
+            datetime.date(1979, 5, 22),
+            datetime.date(2020, 12, 31),
+            datetime.date(2024, 2, 29),
+        ))
+    def test_date_round_trip(self, value):
+        s = format_date(value)
+        assert s == value.strftime(DATE_FORMAT)
+        assert parse_date(s) == value
+
+    @pytest.mark.parametrize(
+        'value', (
+            datetime.datetime(2020, 7, 1, 11, 20, 31),
+            datetime.datetime(1999, 12, 31, 23, 59, 59),
+            datetime.datetime(2021, 1, 1, 0, 0, 0),
+        ))
+    def test_datetime_round_trip(self, value):
+        s = format_datetime(value)
+        assert s == value.strftime(DATETIME_FORMAT)
+        assert parse_datetime(s) == value
+
+    def test_datetime_drops_microseconds(self):
+        assert format_datetime(datetime.datetime(2020, 7, 1, 11, 20, 31, 500)) == '2020-07-01T11:20:31'
+
+    @pytest.mark.parametrize(
+        'parse, s', (
+            (parse_date, '2020-7-1'),
+            (parse_datetime, '2020-07-01T1:2:3'),
+        ))
+    def test_fallback(self, parse, s):
+        fmt = DATE_FORMAT if parse is parse_date else DATETIME_FORMAT
+        expected = datetime.datetime.strptime(s, fmt)
+        assert parse(s) == (expected.date() if parse is parse_date else expected)
+
+    @pytest.mark.parametrize(
+        'parse, s', (
+            (parse_date, '2020-02-30'),
+            (parse_date, '2020-07-01T11:20:31'),
+            (parse_datetime, '2020-07-01'),
+            (parse_datetime, '2020-07-01 11:20:31'),
+        ))
+    def test_invalid(self, parse, s):
+        with pytest.raises(ValueError):
+            parse(s)
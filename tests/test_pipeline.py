@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import json
+
+import pytest
+
+from .utils import FakeResponse, FakeSession, FakeTransport, read_response
+from tes import AlfaStrahTESClient, AsyncAlfaStrahTESClient, AsyncPolicyPipeline, PolicyPipeline
+from tes import CreateRequest, InsuranceProduct, Person, QuoteRequest, QuoteResponse, TESException
+
+SESSION_ID = '88c70099-8e11-4325-9239-9c027195c069'
+
+
+def make_quote_request():
+    insureds = [Person(first_name='Arthur', birth_date=datetime.date(1979, 5, 22)), Person(first_name='Ford')]
+    return QuoteRequest(product=InsuranceProduct('P1'), insureds=insureds)
+
+
+def booking_handler(method, url, **kwargs):
+    if url.endswith('/policies/quote'):
+        return FakeResponse(content=read_response('quote/quote.json'))
+    if url.endswith('/policies'):
+        policy = json.loads(read_response('policies/policy.json'))
+        policies = [dict(policy, policy_id=policy_id) for policy_id in (1, 0)]
+        return FakeResponse(content=json.dumps({'policies': policies}).encode('utf-8'))
+    if '/0/' in url:
+        return FakeResponse(500, read_response('errors/500_internal_error.json'))
+    return FakeResponse(content=b'true')
+
+
+def bodies(calls):
+    return [(url.rsplit('/policies', 1)[1], json.loads(kwargs['data'])) for _, url, kwargs in calls]
+
+
+class TestPolicyPipeline:
+    def test_run(self):
+        session = FakeSession(handler=booking_handler)
+        pipeline = PolicyPipeline(AlfaStrahTESClient('key', session=session), make_quote_request())
+        assert isinstance(pipeline.quote(), QuoteResponse)
+        outcomes = pipeline.run(pnr='TR097S')
+        assert outcomes[0] == (1, True)
+        assert isinstance(dict(outcomes)[0], TESException)
+        assert set(pipeline.timings) == {'quote', 'create', 'confirm'}
+
+        quote, create = bodies(session.calls[:2])
+        assert quote[1]['insureds'] == create[1]['insureds']
+        assert create[1]['session_id'] == SESSION_ID
+        assert create[1]['pnr'] == 'TR097S'
+        assert all(body['session_id'] == SESSION_ID for _, body in bodies(session.calls[2:]))
+
+    def test_run_quotes_once(self):
+        session = FakeSession(handler=booking_handler)
+        pipeline = PolicyPipeline(AlfaStrahTESClient('key', session=session), make_quote_request())
+        pipeline.run()
+        assert sum(url.endswith('/quote') for _, url, _ in session.calls) == 1
+        assert pipeline.policy_ids == [1, 0]
+
+    def test_create_request_reuses_quote_request(self):
+        pipeline = PolicyPipeline(AlfaStrahTESClient('key', session=FakeSession()), make_quote_request())
+        fragment = pipeline.quote_request.insureds[0].encode()
+        create_request = pipeline.make_create_request({'pnr': 'TR097S'})
+        assert isinstance(create_request, CreateRequest)
+        assert create_request.insureds[0] is pipeline.quote_request.insureds[0]
+        assert create_request.encode()['insureds'][0] is fragment
+
+    def test_unexpected_create_parameter(self):
+        pipeline = PolicyPipeline(AlfaStrahTESClient('key', session=FakeSession()), make_quote_request())
+        with pytest.raises(TypeError):
+            pipeline.create(policy_id=1)
+
+    def test_async_run(self):
+        transport = FakeTransport(handler=booking_handler)
+
+        async def main():
+            pipeline = AsyncPolicyPipeline(AsyncAlfaStrahTESClient('key', transport=transport), make_quote_request())
+            return pipeline, await pipeline.run(pnr='TR097S')
+
+        pipeline, outcomes = asyncio.run(main())
+        assert outcomes[0] == (1, True)
+        assert pipeline.session_id == SESSION_ID
+        assert set(pipeline.timings) == {'quote', 'create', 'confirm'}
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from .utils import Clock, FakeSession, FakeTransport, policy_response
+from tes import AlfaStrahTESClient, AsyncAlfaStrahTESClient, RateLimiter
+from tes import DeadlineExceededException, RateLimitExceededException
+
+
+class TestRateLimiter:
+    def test_burst_then_wait(self):
+        limiter = RateLimiter(rate=2, burst=2, clock=Clock())
+        assert limiter.reserve('/policies') == 0
+        assert limiter.reserve('/policies') == 0
+        assert limiter.reserve('/policies') == 0.5
+        assert limiter.reserve('/policies') == 1
+        assert limiter.stats == {'acquired': 4, 'delayed': 2, 'rejected': 0}
+
+    def test_refill(self):
+        clock = Clock()
+        limiter = RateLimiter(rate=1, clock=clock)
+        limiter.reserve('/policies')
+        clock.now = 0.5
+        assert limiter.reserve('/policies') == 0.5
+        clock.now = 10
+        assert limiter.reserve('/policies') == 0
+
+    def test_reject(self):
+        limiter = RateLimiter(rate=1, timeout=0, clock=Clock())
+        limiter.reserve('/policies')
+        with pytest.raises(RateLimitExceededException):
+            limiter.reserve('/policies')
+        assert limiter.stats['rejected'] == 1
+
+    def test_queue_with_timeout(self):
+        limiter = RateLimiter(rate=1, timeout=1.5, clock=Clock())
+        limiter.reserve('/policies')
+        assert limiter.reserve('/policies') == 1
+        with pytest.raises(RateLimitExceededException):
+            limiter.reserve('/policies')
+        with pytest.raises(DeadlineExceededException):
+            limiter.reserve('/products', timeout=0.1)
+
+    def test_endpoint_limits(self):
+        limiter = RateLimiter(endpoint_limits={'/policies/quote': (1, 1)}, timeout=0, clock=Clock())
+        limiter.reserve('/policies/quote')
+        with pytest.raises(RateLimitExceededException):
+            limiter.reserve('/policies/quote')
+        for _ in range(10):
+            assert limiter.reserve('/policies') == 0
+
+    def test_global_and_endpoint_limits(self):
+        limiter = RateLimiter(rate=10, burst=1, endpoint_limits={'/policies/quote': 1}, clock=Clock())
+        limiter.reserve('/policies/quote')
+        assert limiter.reserve('/policies') == 0.1
+        assert limiter.reserve('/policies/quote') == 1
+
+    def test_invalid_rate(self):
+        with pytest.raises(ValueError):
+            RateLimiter(rate=0)
+
+
+class TestClientRateLimiter:
+    def test_reject(self):
+        session = FakeSession([policy_response()])
+        client = AlfaStrahTESClient('key', session=session, rate_limiter=RateLimiter(rate=1, timeout=0))
+        client.get_policy(21684956)
+        with pytest.raises(RateLimitExceededException):
+            client.get_policy(21684956)
+        assert len(session.calls) == 1
+
+    def test_deadline_limits_wait(self):
+        session = FakeSession([policy_response()])
+        client = AlfaStrahTESClient('key', session=session, rate_limiter=RateLimiter(rate=0.1))
+        client.get_policy(21684956)
+        with pytest.raises(DeadlineExceededException):
+            client.get_policy(21684956, deadline=1)
+
+    def test_shared_by_async_client(self):
+        limiter = RateLimiter(rate=100, burst=1)
+        session = FakeSession([policy_response()])
+        transport = FakeTransport([policy_response()])
+
+        async def main():
+            client = AsyncAlfaStrahTESClient('key', transport=transport, rate_limiter=limiter)
+            return await client.get_policy(21684956)
+
+        AlfaStrahTESClient('key', session=session, rate_limiter=limiter).get_policy(21684956)
+        assert asyncio.run(main()).policy_id == 21684956
+        assert limiter.stats['delayed'] == 1
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+
+import pytest
+import requests
+
+from .utils import FakeResponse, FakeSession, FakeTransport, error_response, policy_response
+from tes import AlfaStrahTESClient, AsyncAlfaStrahTESClient, RetryPolicy
+from tes import Person, PolicyStatus
+from tes import TESException, ConnectErrorException, TransportErrorException
+from tes.retry import parse_retry_after
+
+
+def no_wait(**kwargs):
+    return RetryPolicy(backoff_factor=0, **kwargs)
+
+
+class TestRetryPolicy:
+    def test_backoff(self):
+        policy = RetryPolicy(backoff_factor=0.5, max_backoff=3, jitter=False)
+        assert [policy.backoff(attempt) for attempt in (1, 2, 3, 4)] == [0.5, 1, 2, 3]
+
+    def test_jitter(self):
+        policy = RetryPolicy(backoff_factor=1, rand=lambda: 0.25)
+        assert policy.backoff(3) == 1
+
+    def test_max_attempts(self):
+        policy = RetryPolicy(max_attempts=2, jitter=False)
+        assert policy.get_delay(1, True, status_code=503) is not None
+        assert policy.get_delay(2, True, status_code=503) is None
+
+    def test_not_idempotent(self):
+        policy = RetryPolicy(jitter=False)
+        assert policy.get_delay(1, False, status_code=503) is None
+        assert policy.get_delay(1, False, status_code=429) is not None
+        assert policy.get_delay(1, False, error=TransportErrorException('Read timed out')) is None
+        assert policy.get_delay(1, False, error=ConnectErrorException('Connection refused')) is not None
+
+    def test_status_codes(self):
+        policy = RetryPolicy(jitter=False)
+        assert policy.get_delay(1, True, status_code=500) is None
+        assert policy.get_delay(1, True, status_code=400) is None
+
+    def test_retry_after(self):
+        policy = RetryPolicy(backoff_factor=0.1, jitter=False, max_retry_after=10)
+        assert policy.get_delay(1, True, status_code=503, headers={'Retry-After': '2'}) == 2
+        assert policy.get_delay(1, True, status_code=503, headers={'Retry-After': '60'}) is None
+
+    def test_parse_retry_after(self):
+        now = datetime.datetime(2015, 10, 21, 7, 27, 0, tzinfo=datetime.timezone.utc)
+        assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', now=now) == 60
+        assert parse_retry_after('1.5') == 1.5
+        assert parse_retry_after('soon') is None
+        assert parse_retry_after(None) is None
+
+
+class TestClientRetry:
+    def test_get_policy(self):
+        session = FakeSession([error_response(503), error_response(502), policy_response()])
+        client = AlfaStrahTESClient('key', session=session, retry=no_wait())
+        assert client.get_policy(21684956).status == PolicyStatus.CONFIRMED
+        assert len(session.calls) == 3
+        assert client.last_result.attempts == 3
+
+    def test_gives_up(self):
+        session = FakeSession([error_response(503)] * 3)
+        client = AlfaStrahTESClient('key', session=session, retry=no_wait())
+        with pytest.raises(TESException):
+            client.get_policy(21684956)
+        assert client.status_code == 503
+        assert len(session.calls) == 3
+
+    def test_not_retried_by_default(self):
+        session = FakeSession([error_response(503), policy_response()])
+        client = AlfaStrahTESClient('key', session=session)
+        with pytest.raises(TESException):
+            client.get_policy(21684956)
+        assert len(session.calls) == 1
+
+    def test_transport_error(self):
+        session = FakeSession([requests.ReadTimeout('Read timed out'), policy_response()])
+        client = AlfaStrahTESClient('key', session=session, retry=no_wait())
+        assert client.get_policy(21684956).policy_id == 21684956
+
+    def test_create_without_external_id(self):
+        session = FakeSession([error_response(503), FakeResponse(content=b'{"policies": []}')])
+        client = AlfaStrahTESClient('key', session=session, retry=no_wait())
+        with pytest.raises(TESException):
+            client.create([Person(first_name='Arthur')])
+        assert len(session.calls) == 1
+
+    def test_create_with_external_id(self):
+        session = FakeSession([error_response(503), FakeResponse(content=b'{"policies": []}')])
+        client = AlfaStrahTESClient('key', session=session, retry=no_wait())
+        assert client.create([Person(first_name='Arthur')], external_id='FQU/12324264').policies == []
+        assert len(session.calls) == 2
+
+    def test_cancel_connect_error(self):
+        session = FakeSession([requests.ConnectTimeout('Connect timed out'),
+                               FakeResponse(content=b'{"value": 100, "currency": "RUB"}')])
+        client = AlfaStrahTESClient('key', session=session, retry=no_wait())
+        assert client.cancel(21684956).value == 100
+
+    def test_cancel_read_error(self):
+        session = FakeSession([requests.ReadTimeout('Read timed out')])
+        client = AlfaStrahTESClient('key', session=session, retry=no_wait())
+        with pytest.raises(TransportErrorException):
+            client.cancel(21684956)
+        assert len(session.calls) == 1
+
+    def test_confirm_read_error(self):
+        session = FakeSession([requests.ReadTimeout('Read timed out')])
+        client = AlfaStrahTESClient('key', session=session, retry=no_wait())
+        with pytest.raises(TransportErrorException):
+            client.confirm(21684956)
+        assert len(session.calls) == 1
+
+    def test_async(self):
+        transport = FakeTransport([error_response(503), policy_response()])
+
+        async def main():
+            client = AsyncAlfaStrahTESClient('key', transport=transport, retry=no_wait())
+            return await client.get_policy(21684956)
+
+        assert asyncio.run(main()).policy_id == 21684956
+        assert len(transport.calls) == 2
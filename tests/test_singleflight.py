@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from .utils import FakeResponse, FakeSession, read_response
+from tes import AlfaStrahTESClient, AsyncAlfaStrahTESClient, AsyncSingleFlight, SingleFlight
+from tes import DeadlineExceededException, TESException
+
+
+def slow_policy_handler(method, url, **kwargs):
+    time.sleep(0.1)
+    return FakeResponse(content=read_response('policies/policy.json'))
+
+
+class TestSingleFlight:
+    def test_shared_outcome(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return object()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            leader = executor.submit(single_flight.do, 'key', fn)
+            started.wait()
+            followers = [executor.submit(single_flight.do, 'key', fn) for _ in range(3)]
+            results = [leader.result()] + [f.result() for f in followers]
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+        assert single_flight.stats == {'calls': 1, 'shared': 3}
+
+    def test_shared_error(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+
+        def fn():
+            started.set()
+            time.sleep(0.05)
+            raise TESException('Gateway error')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(single_flight.do, 'key', fn)
+            started.wait()
+            follower = executor.submit(single_flight.do, 'key', fn)
+            for future in (leader, follower):
+                with pytest.raises(TESException):
+                    future.result()
+
+    def test_sequential_calls_not_shared(self):
+        single_flight = SingleFlight()
+        assert single_flight.do('key', lambda: 1) == 1
+        assert single_flight.do('key', lambda: 2) == 2
+
+    def test_leader_deadline_not_shared(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+
+        def leader_fn():
+            started.set()
+            time.sleep(0.05)
+            raise DeadlineExceededException('Deadline exceeded')
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            leader = executor.submit(single_flight.do, 'key', leader_fn)
+            started.wait()
+            assert single_flight.do('key', lambda: 2, timeout=5) == 2
+            with pytest.raises(DeadlineExceededException):
+                leader.result()
+        assert single_flight.stats == {'calls': 2, 'shared': 1}
+
+    def test_follower_timeout(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+
+        def fn():
+            started.set()
+            time.sleep(0.2)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(single_flight.do, 'key', fn)
+            started.wait()
+            with pytest.raises(DeadlineExceededException):
+                single_flight.do('key', fn, timeout=0.01)
+
+
+class TestClientSingleFlight:
+    def test_get_policy(self):
+        session = FakeSession(handler=slow_policy_handler)
+        client = AlfaStrahTESClient('key', session=session, single_flight=True)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            policies = list(executor.map(client.get_policy, [21684956] * 4))
+        assert len(session.calls) == 1
+        assert all(policy is policies[0] for policy in policies)
+        assert client.single_flight.stats['shared'] == 3
+
+    def test_different_calls_not_shared(self):
+        session = FakeSession(handler=slow_policy_handler)
+        client = AlfaStrahTESClient('key', session=session, single_flight=True)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(client.get_policy, [21684956, 21684957]))
+        assert len(session.calls) == 2
+
+    def test_not_idempotent_calls_not_shared(self):
+        session = FakeSession(handler=lambda method, url, **kwargs: FakeResponse(content=b'{"policies": []}'))
+        client = AlfaStrahTESClient('key', session=session, single_flight=True)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(lambda _: client.send('POST', '/policies'), range(2)))
+        assert len(session.calls) == 2
+
+
+class SlowPolicyTransport:
+    def __init__(self):
+        self.calls = []
+
+    async def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        await asyncio.sleep(0.05)
+        return FakeResponse(content=read_response('policies/policy.json'))
+
+    async def close(self):
+        pass
+
+
+class TestAsyncSingleFlight:
+    def test_get_policy(self):
+        transport = SlowPolicyTransport()
+
+        async def main():
+            client = AsyncAlfaStrahTESClient('key', transport=transport, single_flight=True)
+            return await asyncio.gather(*(client.get_policy(21684956) for _ in range(4)))
+
+        policies = asyncio.run(main())
+        assert len(transport.calls) == 1
+        assert all(policy is policies[0] for policy in policies)
+
+    def test_cancelled_caller(self):
+        single_flight = AsyncSingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            return 1
+
+        async def main():
+            leader = asyncio.ensure_future(single_flight.do('key', fn))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(single_flight.do('key', fn))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(main()) == 1
+
+    def test_leader_deadline_not_shared(self):
+        single_flight = AsyncSingleFlight()
+
+        async def leader_fn():
+            await asyncio.sleep(0.05)
+            raise DeadlineExceededException('Deadline exceeded')
+
+        async def follower_fn():
+            return 2
+
+        async def main():
+            leader = asyncio.ensure_future(single_flight.do('key', leader_fn))
+            await asyncio.sleep(0)
+            result = await single_flight.do('key', follower_fn, timeout=5)
+            with pytest.raises(DeadlineExceededException):
+                await leader
+            return result
+
+        assert asyncio.run(main()) == 2
+        assert single_flight.stats == {'calls': 2, 'shared': 1}
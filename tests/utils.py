@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import os
 import json
 
@@ -10,3 +11,100 @@ def load_response(resp_fn):
     with open(os.path.join(here, 'test_api_responses', resp_fn), encoding='utf-8') as f:
         resp = json.loads(f.read())
     return resp
+
+
+def read_response(resp_fn):
+    """Returns raw bytes of a response from the given file."""
+    with open(os.path.join(here, 'test_api_responses', resp_fn), 'rb') as f:
+        return f.read()
+
+
+class FakeResponse:
+    """Minimal stand-in for :class:`requests.Response`."""
+
+    def __init__(self, status_code=200, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers if headers is not None else {}
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+
+def policy_response():
+    """Returns response with the policy from policies/policy.json."""
+    return FakeResponse(content=read_response('policies/policy.json'))
+
+
+def error_response(status_code=503, headers=None):
+    """Returns error response with the given status code."""
+    return FakeResponse(status_code, b'{"detail": "Gateway error"}', headers)
+
+
+class Clock:
+    """Manual clock, returns `now` until it is changed."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSession:
+    """Local stand-in for :class:`requests.Session`.
+
+    Replies with the result of `handler(method, url, **kwargs)`, or with the given responses in turn.
+    A response that is an exception is raised.
+    """
+
+    def __init__(self, responses=None, handler=None):
+        self.responses = list(responses or [])
+        self.handler = handler
+        self.calls = []
+        self.closed = False
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        if self.handler is not None:
+            return self.handler(method, url, **kwargs)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        self.closed = True
+
+
+class FakeTransport:
+    """Local stand-in for :class:`tes.AiohttpTransport`, see :class:`FakeSession`."""
+
+    def __init__(self, responses=None, handler=None):
+        self.session = FakeSession(responses, handler)
+        self.calls = self.session.calls
+
+    async def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    async def close(self):
+        self.session.close()
+
+
+class HangingTransport:
+    """Transport whose requests never complete, records whether they were cancelled."""
+
+    def __init__(self):
+        self.calls = []
+        self.cancelled = False
+
+    async def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+    async def close(self):
+        pass